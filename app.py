@@ -26,16 +26,34 @@ import os
 import subprocess
 import traceback
 import re
+import itertools
+import functools
+import uuid
 from datetime import datetime
 
 # Modular Core Imports
 import plotly.express as px
 from core.knowledge_base import KnowledgeBase
+from core.document_store import DocumentStore, DocumentTextMap
+from core.index_snapshots import SnapshotStore
+from core.sharded_index import ShardedIndex, STRATEGIES as SHARD_STRATEGIES, SEARCH_SETTINGS as SHARD_SEARCH_SETTINGS
+from core.index_client import IndexClient
+from core.search_filters import SearchFilter
+from core.threshold_calibration import fallback_threshold
 from core.llm_service import OllamaService
 from core.config_manager import ConfigManager
 from core.identity_manager import IdentityManager
-from utils.ui_components import inject_custom_css, render_header, render_sidebar_branding, render_token_report, get_plotly_template
+from core.context_packer import ContextPacker
+from core.answer_cache import SemanticAnswerCache
+from core.query_profiler import QueryProfiler, ProfileLog, summarize as summarize_profiles
+from core.summarizer import MapReduceSummarizer, BatchSummaryJob
+from core.summary_store import DocumentSummaryStore
+from core.live_indexer import LiveIndexer, shared_watch, current_watch
+from utils.ui_components import inject_custom_css, render_header, render_sidebar_branding, render_token_report, render_query_profile, get_plotly_template
 from utils.file_processor import process_single_file
+from utils.extraction_cache import ExtractionCache
+from utils.file_scanner import DirectoryScanner, ScanManifest, parse_globs
+from utils.vault_watcher import VaultWatcher
 
 # --- PHASE 1: CONFIGURATION & STATE ---
 st.set_page_config(
@@ -78,10 +96,20 @@ if "config" not in st.session_state:
     
     saved_embed = st.session_state.config.get("embedding_model")
     if saved_embed: st.session_state.llm.embedding_model = saved_embed
+
+    # Warm the chat model once per session so the first query doesn't pay the load time.
+    if st.session_state.kb.engine_mode == "Deep Learning":
+        st.session_state.llm.keep_alive = st.session_state.config.get("ollama_keep_alive")
+        st.session_state.llm.num_ctx = st.session_state.config.get("ollama_num_ctx")
+        st.session_state.llm.preload_model()
     
     # --- PROACTIVE COLD-START RECOVERY ---
     # If a previous index exists on disk, we auto-load it on first launch.
-    if os.path.exists("data/index/metadata.json") and not st.session_state.kb.documents_metadata:
+    # The quantization mode decides whether the float matrix is memory-mapped and
+    # which persisted codes are read, so it must be set before this first load.
+    st.session_state.kb.vector_quantization = st.session_state.config.get("vector_quantization")
+    st.session_state.kb.rescore_oversample = st.session_state.config.get("quantization_oversample")
+    if SnapshotStore().exists() and not st.session_state.kb.documents_metadata:
         if st.session_state.kb.load_from_disk():
             st.toast("✅ Persistent Knowledge Loaded", icon="🧬")
 
@@ -89,6 +117,30 @@ elif not hasattr(st.session_state.config, 'get'):
     # Force re-init if the object is stale/broken
     st.session_state.config = ConfigManager()
 
+if "answer_cache" not in st.session_state:
+    # Semantic cache of finished RAG answers (persisted under data/).
+    st.session_state.answer_cache = SemanticAnswerCache(
+        threshold=st.session_state.config.get("answer_cache_threshold"),
+        ttl_hours=st.session_state.config.get("answer_cache_ttl_hours"),
+        max_entries=st.session_state.config.get("answer_cache_max_entries"))
+
+# Rolling JSON-lines log of per-query timings (data/logs/)
+if "profile_log" not in st.session_state or st.session_state.profile_log.path != st.session_state.config.get("query_profile_log"):
+    st.session_state.profile_log = ProfileLog(st.session_state.config.get("query_profile_log"))
+st.session_state.profile_log.max_bytes = int(st.session_state.config.get("query_profile_log_max_mb") * 1_000_000)
+
+if "extraction_cache" not in st.session_state:
+    # Parsed file content keyed by content hash + stat fingerprint (data/.extract_cache/)
+    st.session_state.extraction_cache = ExtractionCache(max_mb=st.session_state.config.get("extraction_cache_mb"))
+st.session_state.extraction_cache.set_budget(st.session_state.config.get("extraction_cache_mb"))
+
+def make_scanner(size_limit=None):
+    """Builds a DirectoryScanner from the current ingestion settings."""
+    cfg = st.session_state.config
+    return DirectoryScanner(include=parse_globs(cfg.get("scan_include")),
+                            exclude=parse_globs(cfg.get("scan_exclude")),
+                            size_limit_mb=size_limit, max_workers=cfg.get("scan_workers"))
+
 # UI State Flags
 if "confirm_clear_err" not in st.session_state: st.session_state.confirm_clear_err = False
 if "is_indexing" not in st.session_state: st.session_state.is_indexing = False
@@ -105,25 +157,191 @@ if not hasattr(st.session_state.kb, 'documents_spatial'):
     st.session_state.kb.documents_spatial = []
 if not hasattr(st.session_state.kb, 'indexing_errors'):
     st.session_state.kb.indexing_errors = []
+if not hasattr(st.session_state.kb, 'extraction_profile'):
+    st.session_state.kb.extraction_profile = {}
+if not hasattr(st.session_state.kb, '_content_parts'):
+    st.session_state.kb._content_parts = {}
+if not hasattr(st.session_state.kb, 'update_lock'):
+    import threading
+    st.session_state.kb.update_lock = threading.RLock()
+if not hasattr(st.session_state.kb, 'doc_store'):
+    # Older sessions hold raw text in a plain dict: move it into the document store
+    st.session_state.kb.doc_store = DocumentStore()
+    legacy_contents = st.session_state.kb.file_contents
+    st.session_state.kb.file_contents = DocumentTextMap(st.session_state.kb.doc_store)
+    st.session_state.kb.file_contents.update(legacy_contents)
+
+if not hasattr(st.session_state.kb, 'loaded_snapshot'):
+    st.session_state.kb.loaded_snapshot = None
+
+st.session_state.kb.pdf_backend = st.session_state.config.get("pdf_backend")
+st.session_state.kb.pdf_workers = st.session_state.config.get("pdf_workers")
+st.session_state.kb.snapshot_retention = st.session_state.config.get("index_snapshot_keep")
+st.session_state.kb.blob_gc_grace_minutes = st.session_state.config.get("document_gc_grace_minutes")
+st.session_state.kb.vector_quantization = st.session_state.config.get("vector_quantization")
+st.session_state.kb.rescore_oversample = st.session_state.config.get("quantization_oversample")
+st.session_state.kb.embedding_reduction = st.session_state.config.get("embedding_reduction")
+st.session_state.kb.embedding_reduced_dim = st.session_state.config.get("embedding_reduced_dim")
+st.session_state.kb.mmr_lambda = st.session_state.config.get("mmr_lambda")
+st.session_state.kb.mmr_candidates = st.session_state.config.get("mmr_candidates")
+st.session_state.kb.merge_adjacent = st.session_state.config.get("merge_adjacent_chunks")
+st.session_state.kb.expansion_mode = st.session_state.config.get("context_expansion")
+st.session_state.kb.expansion_chars = st.session_state.config.get("expansion_window_chars")
+st.session_state.kb.expansion_neighbors = st.session_state.config.get("expansion_neighbors")
+st.session_state.kb.expansion_max_chars = st.session_state.config.get("expansion_max_chars")
+
+# --- SNAPSHOT HOT RELOAD ---
+# Another session (or its watch-mode indexer) may have published a newer index
+# snapshot. Sessions whose index came from disk follow the CURRENT pointer;
+# an unsaved in-memory build (loaded_snapshot None) is never replaced.
+published_snapshot = SnapshotStore().current_id()
+if published_snapshot and st.session_state.kb.loaded_snapshot not in (None, published_snapshot) \
+        and not st.session_state.get("is_indexing", False):
+    if st.session_state.kb.load_from_disk():
+        st.toast(f"🔄 Index updated to snapshot {published_snapshot}", icon="🧬")
+        if "sharded_index" in st.session_state: st.session_state.sharded_index.reload()
 
 # --- INTELLIGENT THRESHOLDING ---
+# 'auto': cutoffs calibrated from the index's own similarity distribution at build
+# time (stored with the snapshot). The dimension-based default covers manual mode
+# and indexes built before calibration existed.
 if "neural_threshold" not in st.session_state:
-    # Set intelligent default based on active model dimensions
-    dims = st.session_state.llm.get_embedding_dimension()
-    if dims <= 384: st.session_state.neural_threshold = 0.25 # Light (minilm)
-    elif dims <= 768: st.session_state.neural_threshold = 0.30 # Standard (nomic)
-    else: st.session_state.neural_threshold = 0.35 # Dense (mxbai/gemma)
+    st.session_state.neural_threshold = fallback_threshold(st.session_state.llm.get_embedding_dimension())
 
 st.session_state.kb.neural_threshold = st.session_state.neural_threshold
+st.session_state.kb.threshold_mode = st.session_state.config.get("similarity_threshold_mode")
+st.session_state.kb.min_results = st.session_state.config.get("similarity_min_results")
+
+# --- SHARDED INDEX ---
+# Optional partitioned copy of the index (data/shards/) searched with a parallel fan-out.
+if "sharded_index" not in st.session_state:
+    st.session_state.sharded_index = ShardedIndex(doc_store=st.session_state.kb.doc_store)
+st.session_state.sharded_index.strategy = st.session_state.config.get("shard_strategy")
+st.session_state.sharded_index.max_chunks = st.session_state.config.get("shard_max_chunks")
+st.session_state.sharded_index.configure(**{k: getattr(st.session_state.kb, k) for k in
+                                            SHARD_SEARCH_SETTINGS})
+
+# --- INDEX SERVER CLIENT ---
+# Retrieval can be delegated to a standalone index server (python -m core.index_server).
+if "index_client" not in st.session_state or st.session_state.index_client.url != st.session_state.config.get("index_server_url"):
+    st.session_state.index_client = IndexClient(st.session_state.config.get("index_server_url"))
+# In auto mode the server applies the calibration stored with its own index
+st.session_state.index_client.neural_threshold = None if st.session_state.kb.threshold_mode == "auto" \
+    else st.session_state.neural_threshold
+st.session_state.index_client.mmr_lambda = st.session_state.kb.mmr_lambda
+st.session_state.index_client.merge_adjacent = st.session_state.kb.merge_adjacent
+st.session_state.index_client.expansion_mode = st.session_state.kb.expansion_mode
 
 if not hasattr(st.session_state.llm, 'model_nickname'):
     st.session_state.llm.model_nickname = st.session_state.llm.model_name
+if not hasattr(st.session_state.llm, 'context_packer'):
+    st.session_state.llm.context_packer = ContextPacker()
+    st.session_state.llm.last_pack_report = {}
+if not hasattr(st.session_state.llm, '_last_prompt_messages'):
+    st.session_state.llm._last_prompt_messages = []
+
+st.session_state.llm.context_packer.token_budget = st.session_state.config.get("context_token_budget")
+st.session_state.llm.keep_alive = st.session_state.config.get("ollama_keep_alive")
+st.session_state.llm.num_ctx = st.session_state.config.get("ollama_num_ctx")
+if not hasattr(st.session_state.llm, 'summarizer'):
+    st.session_state.llm.summarizer = MapReduceSummarizer(st.session_state.llm)
+st.session_state.llm.summarizer.max_workers = st.session_state.config.get("summary_max_workers")
+st.session_state.llm.embed_batching = st.session_state.config.get("embed_batching_enabled")
+st.session_state.llm.embed_batch_max = st.session_state.config.get("embed_batch_max")
+st.session_state.llm.embed_batch_wait_ms = st.session_state.config.get("embed_batch_wait_ms")
 
 if "is_syncing" not in st.session_state: st.session_state.is_syncing = False
 if "is_searching" not in st.session_state: st.session_state.is_searching = False
 if "pending_query" not in st.session_state: st.session_state.pending_query = None
+if "search_scope" not in st.session_state: st.session_state.search_scope = {}
 if "view_level" not in st.session_state: st.session_state.view_level = "Universe"
 if "focus_cluster" not in st.session_state: st.session_state.focus_cluster = None
+if "summary_job" not in st.session_state: st.session_state.summary_job = None
+if "summary_store" not in st.session_state:
+    # Persistent summaries + per-file metadata keyed by content hash (data/summaries.json)
+    st.session_state.summary_store = DocumentSummaryStore()
+
+def watch_roots():
+    """Folders kept fresh by watch mode: the vault plus the user's directory path."""
+    roots = ["vault"] if os.path.isdir("vault") else []
+    user_path = (st.session_state.get("directory_path_input") or "").strip().strip('"').strip("'")
+    if user_path and os.path.isdir(user_path): roots.append(user_path)
+    return roots
+
+def sync_vault_watcher():
+    """Starts, restarts or stops the process-wide VaultWatcher to match the current settings."""
+    cfg = st.session_state.config
+    roots = watch_roots()
+    legacy = st.session_state.pop("vault_watcher", None) # Per-session watcher from before watchers were shared
+    if legacy is not None: legacy.stop()
+    if not cfg.get("watch_mode_enabled"):
+        shared_watch(None)
+        return
+    if "watch_owner" not in st.session_state: st.session_state.watch_owner = uuid.uuid4().hex
+    # Restart when the folders or the settings changed
+    signature = (tuple(roots), cfg.get("scan_include"), cfg.get("scan_exclude"), cfg.get("watch_debounce_seconds"),
+                 cfg.get("watch_poll_seconds"), st.session_state.kb.engine_mode)
+
+    def start_watch():
+        # Bind everything now: the watcher thread cannot read st.session_state.
+        limit = cfg.get("ingestion_size_limit_mb") if cfg.get("ingestion_size_limit_active") else None
+        scanner_factory = functools.partial(DirectoryScanner, include=parse_globs(cfg.get("scan_include")),
+                                            exclude=parse_globs(cfg.get("scan_exclude")),
+                                            size_limit_mb=limit, max_workers=cfg.get("scan_workers"))
+        indexer = LiveIndexer(
+            st.session_state.kb, st.session_state.llm,
+            extraction_cache=st.session_state.extraction_cache if cfg.get("extraction_cache_enabled") else None,
+            summary_store=st.session_state.summary_store, shards=st.session_state.sharded_index)
+        watcher = VaultWatcher(roots, indexer.apply_batch, scanner_factory=scanner_factory,
+                               debounce_s=cfg.get("watch_debounce_seconds"), poll_interval=cfg.get("watch_poll_seconds")).start()
+        return watcher, indexer
+
+    # A session without folders or an index leaves another session's watcher alone
+    if roots and st.session_state.kb.documents_metadata:
+        watcher, indexer = shared_watch(signature, start_watch)
+    else:
+        watcher, indexer = current_watch()
+    if watcher is not None:
+        watcher.hold(st.session_state.watch_owner, st.session_state.is_indexing) # Hold batches while a full build runs
+        if "watch_seen_generation" not in st.session_state: st.session_state.watch_seen_generation = indexer.generation
+
+@st.fragment(run_every=2)
+def render_watch_status():
+    """Shows watch-mode activity and refreshes the app once a batch has been merged."""
+    watcher, indexer = current_watch() # Shared by every session of this process
+    if watcher is None or indexer is None: return
+    last = indexer.history[-1] if indexer.history else None
+    status = f"👁️ Watching {len(watcher.roots)} folder(s) via **{watcher.backend or 'starting'}**"
+    if watcher.pending(): status += f" | {watcher.pending()} pending"
+    if last:
+        status += (f" | Last sync {datetime.fromtimestamp(last['time']).strftime('%H:%M:%S')}: "
+                   f"{last['changed']} changed, {last['removed']} removed ({last['seconds']}s)")
+    st.caption(status)
+    if watcher.last_error: st.caption(f"⚠️ Watch sync failed: {watcher.last_error}")
+    if last and last["errors"]: st.caption(f"⚠️ {len(last['errors'])} file(s) failed to ingest")
+    if indexer.generation != st.session_state.get("watch_seen_generation", 0):
+        st.session_state.watch_seen_generation = indexer.generation
+        st.rerun(scope="app")
+
+@st.fragment(run_every=2)
+def render_batch_summary_status():
+    """Polls the background BatchSummaryJob and posts its results to the chat when done."""
+    job = st.session_state.summary_job
+    if job is None: return
+    done, total = job.progress()
+    if not job.finished:
+        st.progress(done / max(total, 1), text=f"Summarizing {job.current or '...'} ({done}/{total})")
+        if st.button("⏹️ Cancel Batch", key="cancel_batch_summary", use_container_width=True):
+            job.cancel()
+        return
+    for fname, summary in job.results.items():
+        st.session_state.messages.append({"role": "assistant", "content": f"### 📝 {fname} Summary\n{summary}", "type": "summary"})
+    for fname, err in job.errors.items():
+        st.session_state.messages.append({"role": "assistant", "content": f"⚠️ Summary failed for **{fname}**: {err}"})
+    if job.reused:
+        st.toast(f"♻️ {job.reused} summaries served from the summary store", icon="📝")
+    st.session_state.summary_job = None
+    st.rerun()
 
 # --- REMOVED: OLD SYNC HUB ---
 
@@ -178,7 +396,10 @@ with st.sidebar:
     
     if source_list:
         st.markdown("<p class='meta-label' style='margin-top:20px;'>Galaxy Explorer</p>", unsafe_allow_html=True)
-        all_clusters = sorted(list(set(m.get('cluster', 0) for m in source_list)))
+        if hasattr(source_list, 'cluster_ids'):
+            all_clusters = source_list.cluster_ids() or [0] # Cluster index, no per-chunk scan
+        else:
+            all_clusters = sorted(list(set(m.get('cluster', 0) for m in source_list)))
         
         # Universe Reset
         if st.session_state.view_level != "Universe":
@@ -233,19 +454,43 @@ with st.sidebar:
             st.session_state.focus_cluster = None
             st.rerun()
 
+    # 2.4b Watch Mode: keeps the index fresh as files change on disk
+    sync_vault_watcher()
+    render_watch_status()
+
     # 2.5 Knowledge Base Dashboard (Files List)
     if st.session_state.kb.file_contents:
         st.markdown("<p class='meta-label' style='margin-top:20px;'>Active Knowledge Base</p>", unsafe_allow_html=True)
         manifest = st.session_state.kb.get_file_manifest() if hasattr(st.session_state.kb, 'get_file_manifest') else sorted(list(st.session_state.kb.file_contents.keys()))
+        section_chunks = st.session_state.config.get("summary_section_chunks")
+
+        # Batch Summarization: runs the whole manifest on a background thread
+        if engine_choice == "Deep Learning" and ollama_ok:
+            if st.session_state.summary_job is None:
+                if st.button("📚 Summarize All", key="sum_all", help="Summarize every file in the background", use_container_width=True):
+                    # Bind the engines locally: background threads cannot read st.session_state.
+                    job_kb = st.session_state.kb
+                    st.session_state.summary_job = BatchSummaryJob(
+                        job_kb, st.session_state.llm, manifest,
+                        section_resolver=lambda f: job_kb.get_document_sections(f, section_chunks),
+                        summary_store=st.session_state.summary_store).start()
+                    st.rerun()
+            else:
+                render_batch_summary_status()
         
         for fname in manifest:
             # Full path for tooltip if available
             full_path = ""
-            # Search metadata for full path
-            for m in st.session_state.kb.documents_metadata:
-                if m['file'] == fname:
-                    full_path = m.get('full_path', 'No path available')
-                    break
+            chunks = st.session_state.kb.documents_metadata
+            if hasattr(chunks, 'full_path_of'):
+                # File index lookup (O(1)) instead of scanning every chunk per file on each rerun
+                if len(chunks.rows_for_file(fname)):
+                    full_path = chunks.full_path_of(fname, 'No path available')
+            else:
+                for m in chunks:
+                    if m['file'] == fname:
+                        full_path = m.get('full_path', 'No path available')
+                        break
             
             # Parallax scrolling effect on hover
             st.markdown(f"""
@@ -255,12 +500,23 @@ with st.sidebar:
             """, unsafe_allow_html=True)
             
             if engine_choice == "Deep Learning" and ollama_ok:
-                if st.button("📝 Summarize", key=f"sum_{fname}", help=f"LLM Summary for {fname}", use_container_width=True):
-                    with st.spinner("Analyzing..."):
-                        doc_text = st.session_state.kb.get_document_text(fname)
-                        result = st.session_state.llm.summarize_text(doc_text, fname)
-                        st.session_state.messages.append({"role": "assistant", "content": f"### 📝 {fname} Summary\n{result}", "type": "summary"})
-                        st.rerun()
+                # Summary Store: unchanged content + same model => serve the stored brief instantly
+                doc_hash = st.session_state.kb.get_document_hash(fname)
+                stored = st.session_state.summary_store.get_summary(doc_hash, st.session_state.llm.model_name)
+                doc_meta = st.session_state.summary_store.get_metadata(doc_hash)
+                meta_hint = f" • {doc_meta.get('chunks', '?')} chunks, {doc_meta.get('pages', '?')} pages" if doc_meta else ""
+                label = "📝 Summary ✓" if stored else "📝 Summarize"
+                if st.button(label, key=f"sum_{fname}", help=f"LLM Summary for {fname}{meta_hint}", use_container_width=True):
+                    if stored:
+                        result = stored
+                    else:
+                        with st.spinner("Analyzing..."):
+                            sections = st.session_state.kb.get_document_sections(fname, section_chunks)
+                            result, sum_stats = st.session_state.llm.summarize_document(sections, fname)
+                            if "error" not in sum_stats and not sum_stats.get("empty"):
+                                st.session_state.summary_store.put_summary(doc_hash, st.session_state.llm.model_name, fname, result)
+                    st.session_state.messages.append({"role": "assistant", "content": f"### 📝 {fname} Summary\n{result}", "type": "summary"})
+                    st.rerun()
 
 
     st.markdown("""<div style="margin-top: auto; border-top: 1px solid #30363d; padding-top: 20px;">
@@ -283,7 +539,7 @@ if not hasattr(st.session_state.kb, 'get_cluster_topics') or not hasattr(st.sess
                 old_kb = st.session_state.kb
                 new_kb = KnowledgeBase()
                 # Migrate data
-                new_kb.file_contents = getattr(old_kb, 'file_contents', {})
+                new_kb.file_contents.update(getattr(old_kb, 'file_contents', {}))
                 new_kb.documents_metadata = getattr(old_kb, 'documents_metadata', [])
                 new_kb.documents_spatial = getattr(old_kb, 'documents_spatial', [])
                 new_kb.tfidf_matrix = getattr(old_kb, 'tfidf_matrix', None)
@@ -333,8 +589,8 @@ if hasattr(st.session_state.kb, 'ingestion_log') and st.session_state.kb.ingesti
             st.code("\n".join(log['unreachable']), language="text")
         
         if log['skipped']:
-            st.warning("### ⚠️ Unsupported Formats")
-            st.write("These files were ignored because their format is not yet supported (.docx, .pptx, etc).")
+            st.warning("### ⚠️ Skipped Files")
+            st.write("These files were ignored because of the size limit or an unsupported format.")
             st.code("\n".join(log['skipped']), language="text")
 
 # --- PHASE 3 & 4: CATEGORIZED SETTINGS & ANALYTICS ---
@@ -381,27 +637,28 @@ with tab_settings:
                                            key="directory_path_input")
             
             # --- NEW: PROACTIVE PATH VALIDATION ---
+            c_inc, c_exc = st.columns(2)
+            with c_inc:
+                scan_include = st.text_input("Include Globs", st.session_state.config.get("scan_include"),
+                                             placeholder="reports/**, *.pdf",
+                                             help="Comma-separated. Only matching files are indexed (empty = all).")
+                if scan_include != st.session_state.config.get("scan_include"):
+                    st.session_state.config.save({"scan_include": scan_include})
+            with c_exc:
+                scan_exclude = st.text_input("Exclude Globs", st.session_state.config.get("scan_exclude"),
+                                             help="Comma-separated. Matching files and folders are skipped.")
+                if scan_exclude != st.session_state.config.get("scan_exclude"):
+                    st.session_state.config.save({"scan_exclude": scan_exclude})
+
             if st.button("🔍 Test Path Visibility", use_container_width=True):
                 test_p = st.session_state.directory_path_input.strip().strip('"').strip("'")
                 if test_p:
                     if os.path.isdir(test_p):
-                        t_folders, t_files, t_supported, t_unreachable = 0, 0, 0, 0
-                        supported_ext = (".pdf", ".md", ".txt", ".csv", ".xlsx", ".docx", ".pptx")
+                        t_scanner = make_scanner()
                         with st.status(f"Scanning `{test_p}`...", expanded=True):
-                            for r, ds, fs in os.walk(test_p):
-                                t_folders += 1
-                                t_files += len(fs)
-                                for f in fs:
-                                    if f.lower().endswith(supported_ext):
-                                        t_supported += 1
-                                        # Hydration Check (Strict)
-                                        try:
-                                            full_p = os.path.join(r, f)
-                                            with open(full_p, 'rb') as tmp:
-                                                tmp.read(1)
-                                        except Exception:
-                                            t_unreachable += 1
-                                            t_supported -= 1
+                            t_supported = len(t_scanner.scan([test_p]))
+                        t_folders, t_files = t_scanner.stats["folders"], t_scanner.stats["total_files"]
+                        t_unreachable = len(t_scanner.unreachable)
 
                         if t_supported > 0:
                             st.success(f"### ✅ Path Verified\n"
@@ -457,8 +714,10 @@ with tab_settings:
                     import shutil
                     if os.path.exists("data/index"):
                         shutil.rmtree("data/index")
+                        shutil.rmtree(st.session_state.sharded_index.root, ignore_errors=True)
+                        st.session_state.sharded_index.reload()
                         st.session_state.kb.documents_metadata = []
-                        st.session_state.kb.file_contents = {}
+                        st.session_state.kb.file_contents.clear()
                         st.toast("🔥 Persistence Wiped", icon="🗑️")
                         st.rerun()
             with c_load:
@@ -466,9 +725,98 @@ with tab_settings:
                     if st.session_state.kb.load_from_disk():
                         st.toast("🧬 Knowledge Restored", icon="✅")
                         st.rerun()
+            # Snapshot history: every save is a verified, atomically published version
+            snap_store = SnapshotStore(keep=st.session_state.config.get("index_snapshot_keep"))
+            snapshots = snap_store.snapshots()
+            if snapshots:
+                current_snapshot = snap_store.current_id()
+                c_snap, c_keep = st.columns([3, 1])
+                with c_snap:
+                    labels = {m["id"]: f"{m['id']} — {m.get('chunks', '?')} chunks, {m.get('index_model') or 'n/a'}"
+                                       f"{' (current)' if m['id'] == current_snapshot else ''}" for m in snapshots}
+                    chosen = st.selectbox("Index Snapshots", list(labels), format_func=labels.get,
+                                          help="Each save publishes a new snapshot atomically. Roll back to restore an earlier version.")
+                with c_keep:
+                    keep_n = st.number_input("Keep", 1, 20, st.session_state.config.get("index_snapshot_keep"),
+                                             help="Snapshots retained on disk (the current one is always kept).")
+                    if keep_n != st.session_state.config.get("index_snapshot_keep"):
+                        st.session_state.config.save({"index_snapshot_keep": int(keep_n)})
+                if chosen != current_snapshot and st.button("⏪ Roll Back to Selected Snapshot", use_container_width=True):
+                    try:
+                        snap_store.rollback(chosen, st.session_state.kb.doc_store)
+                        if st.session_state.kb.load_from_disk():
+                            st.toast(f"⏪ Rolled back to {chosen}", icon="✅")
+                            st.rerun()
+                        else:
+                            st.error(f"Snapshot {chosen} could not be loaded; see the console for details.")
+                    except ValueError as e:
+                        st.error(str(e))
+            store_stats = st.session_state.kb.doc_store.stats()
+            if store_stats["blobs"]:
+                ratio = store_stats["raw_chars"] / max(1, store_stats["disk_bytes"])
+                st.caption(f"📚 Document store: {store_stats['blobs']} texts, "
+                           f"{store_stats['raw_chars'] / 1e6:.1f}M chars in {store_stats['disk_bytes'] / (1024 * 1024):.1f} MB "
+                           f"(~{ratio:.1f}x compression)")
         else:
             st.info("No persistent index found at data/index/. It will be created after your first successful build.")
 
+        # --- INDEX SHARDING ---
+        st.markdown("---")
+        st.markdown("#### 🧩 Index Shards")
+        sharded = st.session_state.sharded_index
+        c_strat, c_cap = st.columns(2)
+        with c_strat:
+            strategy = st.selectbox("Shard Strategy", SHARD_STRATEGIES,
+                                    index=SHARD_STRATEGIES.index(st.session_state.config.get("shard_strategy")),
+                                    help="Split the index by source folder, ingest batch or size cap. Shards are rebuilt "
+                                         "independently, loaded on demand and searched in parallel.")
+            if strategy != st.session_state.config.get("shard_strategy"):
+                st.session_state.config.save({"shard_strategy": strategy})
+                sharded.strategy = strategy
+        with c_cap:
+            shard_cap = st.number_input("Max Chunks per Shard", 1000, 1000000, st.session_state.config.get("shard_max_chunks"),
+                                        step=1000, disabled=strategy == "none",
+                                        help="Larger groups are split into several shards.")
+            if shard_cap != st.session_state.config.get("shard_max_chunks"):
+                st.session_state.config.save({"shard_max_chunks": int(shard_cap)})
+                sharded.max_chunks = int(shard_cap)
+        if strategy != "none":
+            if st.button("🧩 Sync Shards Now", use_container_width=True, disabled=not st.session_state.kb.documents_metadata):
+                with st.spinner("Partitioning index..."):
+                    report = sharded.sync(st.session_state.kb)
+                st.toast(f"🧩 {len(report['rebuilt'])} shard(s) rebuilt, {len(report['kept'])} unchanged", icon="✅")
+            shard_stats = sharded.stats()
+            if shard_stats:
+                loaded = sum(1 for s in shard_stats if s["loaded"])
+                st.caption(f"🧩 {len(shard_stats)} shards ({loaded} loaded), "
+                           f"{sum(s['chunks'] for s in shard_stats)} chunks — searched on {sharded.max_workers} threads")
+            else:
+                st.caption("Shards are created after the next build (or with Sync Shards Now).")
+
+        # --- INDEX SERVER ---
+        st.markdown("---")
+        st.markdown("#### 🛰️ Index Server")
+        c_srv, c_url = st.columns([1, 2])
+        with c_srv:
+            use_server = st.toggle("Query via Index Server", st.session_state.config.get("index_server_enabled"),
+                                   help="Send research-hub retrieval to a standalone server holding one memory-mapped index "
+                                        "(start it with: python -m core.index_server). Falls back to in-process search if it is down.")
+            if use_server != st.session_state.config.get("index_server_enabled"):
+                st.session_state.config.save({"index_server_enabled": use_server})
+        with c_url:
+            server_url = st.text_input("Server URL", st.session_state.config.get("index_server_url"),
+                                       disabled=not use_server, help="http://host:port or unix:///path/to.sock")
+            if server_url != st.session_state.config.get("index_server_url"):
+                st.session_state.config.save({"index_server_url": server_url})
+        if use_server:
+            server_info = st.session_state.index_client.health(refresh=True)
+            if server_info:
+                server_stats = st.session_state.index_client.stats() or {}
+                st.caption(f"🛰️ Connected: {server_info['chunks']} chunks, snapshot {server_info.get('snapshot') or 'n/a'}, "
+                           f"{server_stats.get('queries', 0)} queries served (mean batch {server_stats.get('mean_batch', 0)})")
+            else:
+                st.warning("Index server not reachable — searches use the in-process index.")
+
         # --- MOVED: INGESTION CONSTRAINTS ---
         st.markdown("---")
         st.markdown("#### 📏 Ingestion Constraints")
@@ -486,6 +834,73 @@ with tab_settings:
         if is_active:
             st.info(f"Note: Files over **{size_mb} MB** will be ignored during the scan.")
 
+        # --- PDF EXTRACTION BACKEND ---
+        st.markdown("---")
+        st.markdown("#### 📄 PDF Extraction")
+        from utils.pdf_extractor import available_backends
+        installed = available_backends()
+        c_be, c_wk = st.columns(2)
+        with c_be:
+            backend_opts = ["auto"] + installed
+            cur_backend = st.session_state.config.get("pdf_backend")
+            pdf_backend = st.selectbox("Parser Backend", backend_opts,
+                                       index=backend_opts.index(cur_backend) if cur_backend in backend_opts else 0,
+                                       help="'auto' picks the fastest installed parser (PyMuPDF > pypdf > PyPDF2).")
+            if pdf_backend != cur_backend:
+                st.session_state.config.save({"pdf_backend": pdf_backend})
+                st.session_state.kb.pdf_backend = pdf_backend
+        with c_wk:
+            pdf_workers = st.number_input("Worker Processes", 0, 32, st.session_state.config.get("pdf_workers"),
+                                          help="Processes used to split large PDFs into page ranges. 0 = auto, 1 = serial.")
+            if pdf_workers != st.session_state.config.get("pdf_workers"):
+                st.session_state.config.save({"pdf_workers": int(pdf_workers)})
+                st.session_state.kb.pdf_workers = int(pdf_workers)
+
+        # --- EXTRACTION CACHE ---
+        st.markdown("---")
+        st.markdown("#### 🗄️ Extraction Cache")
+        x_cache = st.session_state.extraction_cache
+        c_xon, c_xmb, c_xclr = st.columns([1, 1, 1])
+        with c_xon:
+            x_enabled = st.toggle("Reuse Parsed Files", value=st.session_state.config.get("extraction_cache_enabled"),
+                                  help="Skip parsing files whose content is unchanged since the last index build.")
+            if x_enabled != st.session_state.config.get("extraction_cache_enabled"):
+                st.session_state.config.save({"extraction_cache_enabled": x_enabled})
+        with c_xmb:
+            x_mb = st.number_input("Disk Budget (MB)", 16, 65536, st.session_state.config.get("extraction_cache_mb"), step=64,
+                                   help="Least recently used entries are evicted beyond this size.")
+            if x_mb != st.session_state.config.get("extraction_cache_mb"):
+                st.session_state.config.save({"extraction_cache_mb": int(x_mb)})
+                x_cache.set_budget(int(x_mb))
+        with c_xclr:
+            st.caption(f"{len(x_cache)} files | {x_cache.disk_bytes() / (1024 * 1024):.1f} MB")
+            if st.button("🗑️ Clear Cache", use_container_width=True, key="clear_extract_cache"):
+                x_cache.clear()
+                st.rerun()
+
+        # --- WATCH MODE ---
+        st.markdown("---")
+        st.markdown("#### 👁️ Watch Mode")
+        c_won, c_wdb, c_wpoll = st.columns(3)
+        with c_won:
+            w_enabled = st.toggle("Auto-Index Changes", value=st.session_state.config.get("watch_mode_enabled"),
+                                  help="Watch the vault and the directory path; changed files are re-indexed in the background without a full rebuild.")
+            if w_enabled != st.session_state.config.get("watch_mode_enabled"):
+                st.session_state.config.save({"watch_mode_enabled": w_enabled})
+                st.rerun()
+        with c_wdb:
+            w_debounce = st.slider("Debounce (s)", 0.5, 30.0, float(st.session_state.config.get("watch_debounce_seconds")), 0.5,
+                                   help="Quiet period that closes a burst of changes into one update.")
+            if w_debounce != st.session_state.config.get("watch_debounce_seconds"):
+                st.session_state.config.save({"watch_debounce_seconds": w_debounce})
+        with c_wpoll:
+            w_poll = st.number_input("Poll Interval (s)", 1.0, 600.0, float(st.session_state.config.get("watch_poll_seconds")),
+                                     help="Scan interval when inotify is unavailable (non-Linux or network mounts).")
+            if w_poll != st.session_state.config.get("watch_poll_seconds"):
+                st.session_state.config.save({"watch_poll_seconds": w_poll})
+        if w_enabled and not st.session_state.kb.documents_metadata:
+            st.info("Watch mode starts once an index has been built.")
+
 
         
 
@@ -552,11 +967,8 @@ with tab_settings:
                     if new_embed != st.session_state.llm.embedding_model:
                         if st.session_state.llm.set_embedding_model(new_embed):
                             st.session_state.config.save({"embedding_model": new_embed})
-                            # Auto-Scale Threshold based on NEW model dimensions
-                            new_dims = st.session_state.llm.get_embedding_dimension()
-                            if new_dims <= 384: st.session_state.neural_threshold = 0.25
-                            elif new_dims <= 768: st.session_state.neural_threshold = 0.35
-                            else: st.session_state.neural_threshold = 0.45
+                            # Manual fallback for the NEW model (the re-index recalibrates 'auto')
+                            st.session_state.neural_threshold = fallback_threshold(st.session_state.llm.get_embedding_dimension())
                             st.session_state.kb.neural_threshold = st.session_state.neural_threshold
                             
                             st.warning("Embedding engine switched. You MUST re-index the Knowledge Base to synchronize vectors.")
@@ -592,10 +1004,172 @@ with tab_settings:
         st.info(f"🧠 Uses {label} dense vectors for contextual understanding.")
         
         # 3.3.3 Similarity Threshold Tuning
-        st.session_state.neural_threshold = st.slider("Neural Similarity Threshold", 0.05, 0.95, 
-                                                      st.session_state.neural_threshold, 
-                                                      help="Higher = stricter matches. Lower = broad contextual reach. Auto-scales when switching models.")
-        st.session_state.kb.neural_threshold = st.session_state.neural_threshold
+        col_thr, col_auto = st.columns([3, 1])
+        with col_auto:
+            st.markdown("<br>", unsafe_allow_html=True)
+            auto_thr = st.toggle("Auto-Calibrate", st.session_state.config.get("similarity_threshold_mode") == "auto",
+                                 help="Use the cutoff measured from this index's own similarity distribution at build time.")
+            thr_mode = "auto" if auto_thr else "manual"
+            if thr_mode != st.session_state.config.get("similarity_threshold_mode"):
+                st.session_state.config.save({"similarity_threshold_mode": thr_mode})
+                st.session_state.kb.threshold_mode = thr_mode
+        calibrated = st.session_state.kb.calibrated_threshold("neural") if auto_thr else None
+        with col_thr:
+            if calibrated is not None:
+                st.slider("Neural Similarity Threshold", 0.0, 1.0, float(calibrated), disabled=True,
+                          help="Calibrated for this index. Turn off Auto-Calibrate to set it by hand.")
+            else:
+                st.session_state.neural_threshold = st.slider("Neural Similarity Threshold", 0.05, 0.95,
+                                                              st.session_state.neural_threshold,
+                                                              help="Higher = stricter matches. Lower = broad contextual reach. Resets to a model default when switching models.")
+                st.session_state.kb.neural_threshold = st.session_state.neural_threshold
+        profile = (getattr(st.session_state.kb, 'calibration', None) or {}).get("neural")
+        if calibrated is not None and profile:
+            st.caption(f"📏 Calibrated for {profile.get('model')}: unrelated pairs score ≤ {profile['random']['p99']:.2f} (99th pct), "
+                       f"nearest neighbours ~{profile['neighbour']['p50']:.2f} (median).")
+        elif auto_thr:
+            st.caption("📏 No calibration for this index yet; re-index to measure one. Using the manual value.")
+        min_hits = st.number_input("Always Keep Top Hits", 0, 10, st.session_state.config.get("similarity_min_results"),
+                                   help="Best matches passed to the LLM even when none clears the threshold (0 = strict cutoff).")
+        if min_hits != st.session_state.config.get("similarity_min_results"):
+            st.session_state.config.save({"similarity_min_results": int(min_hits)})
+            st.session_state.kb.min_results = int(min_hits)
+
+        # 3.3.3b Vector Quantization (memory vs. exactness)
+        col_vq, col_os = st.columns([2, 1])
+        with col_vq:
+            vq_modes = ["none", "int8", "binary"]
+            vq_mode = st.selectbox("Vector Quantization", vq_modes, index=vq_modes.index(st.session_state.config.get("vector_quantization")),
+                                   help="int8 = 4x smaller first-pass scan, binary = 32x smaller (sign bits). Candidates are always rescored at full precision; with quantization on, full vectors are memory-mapped from disk after a reload.")
+            if vq_mode != st.session_state.config.get("vector_quantization"):
+                st.session_state.config.save({"vector_quantization": vq_mode})
+                st.session_state.kb.vector_quantization = vq_mode
+        with col_os:
+            oversample = st.number_input("Rescore Oversample", 1, 100, st.session_state.config.get("quantization_oversample"),
+                                         help="Candidates rescored exactly per requested result. Raise for binary mode if recall drops.")
+            if oversample != st.session_state.config.get("quantization_oversample"):
+                st.session_state.config.save({"quantization_oversample": int(oversample)})
+                st.session_state.kb.rescore_oversample = int(oversample)
+        quantized = st.session_state.kb._quantized_index() if hasattr(st.session_state.kb, '_quantized_index') else None
+        if quantized is not None:
+            full_mb = len(quantized) * quantized.dim * 4 / (1024 * 1024)
+            st.caption(f"🗜️ {quantized.mode} codes: {quantized.nbytes / (1024 * 1024):.1f} MB in RAM "
+                       f"(float32 would be {full_mb:.1f} MB) for {len(quantized)} vectors.")
+
+        # 3.3.3c Reduced-Dimension Index (applied at the next build)
+        col_red, col_rdim = st.columns([2, 1])
+        with col_red:
+            red_modes = ["none", "truncate", "pca"]
+            red_mode = st.selectbox("Dimension Reduction", red_modes, index=red_modes.index(st.session_state.config.get("embedding_reduction")),
+                                    help="'truncate' keeps the first N dimensions (Matryoshka models such as nomic v1.5 / mxbai). 'pca' fits a projection for any model. Takes effect on the next index build.")
+            if red_mode != st.session_state.config.get("embedding_reduction"):
+                st.session_state.config.save({"embedding_reduction": red_mode})
+                st.session_state.kb.embedding_reduction = red_mode
+        with col_rdim:
+            red_dim = st.number_input("Reduced Dims", 32, 4096, st.session_state.config.get("embedding_reduced_dim"), step=32)
+            if red_dim != st.session_state.config.get("embedding_reduced_dim"):
+                st.session_state.config.save({"embedding_reduced_dim": int(red_dim)})
+                st.session_state.kb.embedding_reduced_dim = int(red_dim)
+        active_projection = getattr(st.session_state.kb, 'projection', None)
+        if active_projection is not None:
+            st.caption(f"📐 Index uses {active_projection.mode} projection: {active_projection.input_dim} → {active_projection.output_dim} dims.")
+
+        # 3.3.3d Result Diversity (MMR + adjacent-chunk merging)
+        col_mmr, col_pool, col_merge = st.columns([2, 1, 1])
+        with col_mmr:
+            mmr_lambda = st.slider("Relevance vs. Diversity (MMR λ)", 0.0, 1.0, float(st.session_state.config.get("mmr_lambda")), step=0.05,
+                                   help="1.0 = plain top-N by similarity. Lower values skip near-duplicate chunks in favour of new information.")
+            if mmr_lambda != st.session_state.config.get("mmr_lambda"):
+                st.session_state.config.save({"mmr_lambda": float(mmr_lambda)})
+                st.session_state.kb.mmr_lambda = float(mmr_lambda)
+        with col_pool:
+            mmr_pool = st.number_input("MMR Candidates ×", 1, 20, st.session_state.config.get("mmr_candidates"), disabled=mmr_lambda >= 1.0,
+                                       help="Candidate pool per wanted result that MMR chooses from.")
+            if mmr_pool != st.session_state.config.get("mmr_candidates"):
+                st.session_state.config.save({"mmr_candidates": int(mmr_pool)})
+                st.session_state.kb.mmr_candidates = int(mmr_pool)
+        with col_merge:
+            merge_adj = st.toggle("Merge Adjacent Chunks", st.session_state.config.get("merge_adjacent_chunks"),
+                                  help="Joins hits that overlap or touch on the same page into one snippet (exact, by stored offsets).")
+            if merge_adj != st.session_state.config.get("merge_adjacent_chunks"):
+                st.session_state.config.save({"merge_adjacent_chunks": merge_adj})
+                st.session_state.kb.merge_adjacent = merge_adj
+
+        # 3.3.3e Context Expansion (match small chunks, answer from their surroundings)
+        col_exp, col_exp_size, col_exp_cap = st.columns([2, 1, 1])
+        exp_modes = ["none", "window", "neighbors", "parent"]
+        with col_exp:
+            exp_mode = st.selectbox("Context Expansion", exp_modes, index=exp_modes.index(st.session_state.config.get("context_expansion")),
+                                    help="Widens each retrieved chunk before it reaches the LLM: a character window, the neighbouring chunks, or the whole page. Search results and scores are unchanged.")
+            if exp_mode != st.session_state.config.get("context_expansion"):
+                st.session_state.config.save({"context_expansion": exp_mode})
+                st.session_state.kb.expansion_mode = exp_mode
+        with col_exp_size:
+            if exp_mode == "neighbors":
+                exp_n = st.number_input("Neighbour Chunks", 1, 5, st.session_state.config.get("expansion_neighbors"),
+                                        help="Chunks added before and after each hit.")
+                if exp_n != st.session_state.config.get("expansion_neighbors"):
+                    st.session_state.config.save({"expansion_neighbors": int(exp_n)})
+                    st.session_state.kb.expansion_neighbors = int(exp_n)
+            else:
+                exp_chars = st.number_input("Window Chars", 100, 4000, st.session_state.config.get("expansion_window_chars"), step=100,
+                                            disabled=exp_mode != "window", help="Characters added on each side of a hit.")
+                if exp_chars != st.session_state.config.get("expansion_window_chars"):
+                    st.session_state.config.save({"expansion_window_chars": int(exp_chars)})
+                    st.session_state.kb.expansion_chars = int(exp_chars)
+        with col_exp_cap:
+            exp_cap = st.number_input("Max Snippet Chars", 500, 16000, st.session_state.config.get("expansion_max_chars"), step=250,
+                                      disabled=exp_mode == "none", help="Cap on one expanded snippet, centred on the matched chunk.")
+            if exp_cap != st.session_state.config.get("expansion_max_chars"):
+                st.session_state.config.save({"expansion_max_chars": int(exp_cap)})
+                st.session_state.kb.expansion_max_chars = int(exp_cap)
+
+        # 3.3.4 Prompt Context Budget
+        ctx_budget = st.slider("Context Token Budget", 500, 16000, st.session_state.config.get("context_token_budget"), step=250,
+                               help="Max estimated tokens for manifest + retrieved snippets + history in each RAG prompt. Smaller = faster first token.")
+        if ctx_budget != st.session_state.config.get("context_token_budget"):
+            st.session_state.config.save({"context_token_budget": ctx_budget})
+            st.session_state.llm.context_packer.token_budget = ctx_budget
+
+        # 3.3.4b Summarization Parallelism
+        sum_workers = st.slider("Summarization Workers", 1, 16, st.session_state.config.get("summary_max_workers"),
+                                help="Concurrent section summaries during map-reduce. Match Ollama's OLLAMA_NUM_PARALLEL.")
+        if sum_workers != st.session_state.config.get("summary_max_workers"):
+            st.session_state.config.save({"summary_max_workers": sum_workers})
+            st.session_state.llm.summarizer.max_workers = sum_workers
+
+        # 3.3.4c Query Embedding Micro-Batching
+        col_eb, col_ebn, col_ebw = st.columns([2, 1, 1])
+        with col_eb:
+            embed_batching = st.toggle("Batch Concurrent Query Embeddings", st.session_state.config.get("embed_batching_enabled"),
+                                       help="Queries embedded at the same moment (several users, the index server) share one Ollama request. A lone query is sent immediately.")
+            if embed_batching != st.session_state.config.get("embed_batching_enabled"):
+                st.session_state.config.save({"embed_batching_enabled": embed_batching})
+                st.session_state.llm.embed_batching = embed_batching
+        with col_ebn:
+            eb_max = st.number_input("Max Batch", 1, 256, st.session_state.config.get("embed_batch_max"), disabled=not embed_batching)
+            if eb_max != st.session_state.config.get("embed_batch_max"):
+                st.session_state.config.save({"embed_batch_max": int(eb_max)})
+        with col_ebw:
+            eb_wait = st.number_input("Max Wait (ms)", 0.0, 100.0, float(st.session_state.config.get("embed_batch_wait_ms")), step=1.0,
+                                      disabled=not embed_batching, help="How long a batch waits to fill while queries arrive concurrently.")
+            if eb_wait != st.session_state.config.get("embed_batch_wait_ms"):
+                st.session_state.config.save({"embed_batch_wait_ms": float(eb_wait)})
+
+        # 3.3.5 Model Residency (Prefix Cache Reuse)
+        col_ka, col_ctx = st.columns(2)
+        with col_ka:
+            keep_alive = st.text_input("Model Keep-Alive", st.session_state.config.get("ollama_keep_alive"),
+                                       help="How long Ollama keeps the model (and its prompt cache) loaded after a request, e.g. '30m', '2h' or '-1' for forever.")
+            if keep_alive != st.session_state.config.get("ollama_keep_alive"):
+                st.session_state.config.save({"ollama_keep_alive": keep_alive})
+                st.session_state.llm.keep_alive = keep_alive
+        with col_ctx:
+            num_ctx = st.number_input("Context Window (num_ctx)", 2048, 131072, st.session_state.config.get("ollama_num_ctx"), step=1024,
+                                      help="Tokens of context Ollama allocates. Changing this reloads the model, so keep it stable.")
+            if num_ctx != st.session_state.config.get("ollama_num_ctx"):
+                st.session_state.config.save({"ollama_num_ctx": int(num_ctx)})
+                st.session_state.llm.num_ctx = int(num_ctx)
 
         
 
@@ -627,6 +1201,48 @@ with tab_settings:
                 st.toast("Neural Cache Purged", icon="🧹")
                 st.rerun()
 
+        # --- SEMANTIC ANSWER CACHE ---
+        st.markdown("#### ⚡ Semantic Answer Cache")
+        answer_cache = st.session_state.answer_cache
+        c_ac_on, c_ac_thr, c_ac_clear = st.columns([1, 2, 1])
+        with c_ac_on:
+            ac_enabled = st.toggle("Reuse Answers", st.session_state.config.get("answer_cache_enabled"),
+                                   help="Serve a stored answer when a near-identical question hits the same index and evidence.")
+            if ac_enabled != st.session_state.config.get("answer_cache_enabled"):
+                st.session_state.config.save({"answer_cache_enabled": ac_enabled})
+        with c_ac_thr:
+            ac_threshold = st.slider("Question Similarity Threshold", 0.80, 1.0, st.session_state.config.get("answer_cache_threshold"), step=0.01,
+                                     disabled=not ac_enabled)
+            if ac_threshold != st.session_state.config.get("answer_cache_threshold"):
+                st.session_state.config.save({"answer_cache_threshold": ac_threshold})
+                answer_cache.threshold = ac_threshold
+        with c_ac_clear:
+            st.markdown("<br>", unsafe_allow_html=True)
+            if st.button("🧹 Clear Answers", use_container_width=True):
+                answer_cache.clear()
+                st.toast("Answer Cache Cleared", icon="🧹")
+        st.write(f"📦 {len(answer_cache)} cached answers • {answer_cache.hits} hits / {answer_cache.misses} misses this session")
+
+        # --- QUERY PROFILING ---
+        st.markdown("#### ⏱️ Query Profiling")
+        c_qp_on, c_qp_mb = st.columns([1, 1])
+        with c_qp_on:
+            qp_enabled = st.toggle("Profile Queries", st.session_state.config.get("query_profiling_enabled"),
+                                   help="Show a timing panel under each answer and append it to the rolling log.")
+            if qp_enabled != st.session_state.config.get("query_profiling_enabled"):
+                st.session_state.config.save({"query_profiling_enabled": qp_enabled})
+        with c_qp_mb:
+            qp_mb = st.number_input("Log Size (MB)", 1, 100, st.session_state.config.get("query_profile_log_max_mb"),
+                                    help="The log rotates to .1/.2/.3 at this size.")
+            if qp_mb != st.session_state.config.get("query_profile_log_max_mb"):
+                st.session_state.config.save({"query_profile_log_max_mb": int(qp_mb)})
+                st.session_state.profile_log.max_bytes = int(qp_mb) * 1_000_000
+        recent_profiles = st.session_state.profile_log.recent(200)
+        if recent_profiles:
+            summary = summarize_profiles(recent_profiles)
+            st.dataframe(pd.DataFrame(summary).T.rename_axis("metric"), use_container_width=True)
+        st.caption(f"📄 {len(recent_profiles)} recent queries in `{st.session_state.profile_log.path}`")
+
 
         # --- NEW: AGENT IDENTITY EDITOR ---
         st.markdown("---")
@@ -681,38 +1297,8 @@ with tab_settings:
         limit_active = st.session_state.config.get("ingestion_size_limit_active")
         limit_mb = st.session_state.config.get("ingestion_size_limit_mb")
         
-        files = []
+        upload_items = []
         skipped_files = []
-        unreachable_files = []
-        supported_ext = (".pdf", ".md", ".txt", ".csv", ".xlsx", ".docx", ".pptx")
-        scan_stats = {"folders": 0, "total_files": 0, "supported_files": 0}
-
-        def gather_files(base_path, target_list, skip_list, unreach_list):
-            base_path = base_path.strip().strip('"').strip("'")
-            if not os.path.exists(base_path): return
-            try:
-                for r, ds, fs in os.walk(base_path):
-                    scan_stats["folders"] += 1
-                    scan_stats["total_files"] += len(fs)
-                    for f in fs:
-                        full_p = os.path.join(r, f)
-                        if limit_active:
-                            try:
-                                f_size_mb = os.path.getsize(full_p) / (1024 * 1024)
-                                if f_size_mb > limit_mb:
-                                    skip_list.append(f"{f} (Large: {f_size_mb:.1f}MB)")
-                                    continue
-                            except Exception: pass
-                        if f.lower().endswith(supported_ext):
-                            try:
-                                with open(full_p, 'rb') as tmp: tmp.read(1)
-                                target_list.append({'obj': full_p, 'name': f, 'full_path': full_p})
-                                scan_stats["supported_files"] += 1
-                            except Exception as e:
-                                unreach_list.append(f"{f} (Hydration Error: {str(e)})")
-            except Exception as e:
-                st.error(f"Directory Scan Error: {str(e)}")
-
         if current_uploaded:
             for f in current_uploaded: 
                 if limit_active:
@@ -720,45 +1306,81 @@ with tab_settings:
                     if f_size_mb > limit_mb:
                         skipped_files.append(f"{f.name} (Large: {f_size_mb:.1f}MB)")
                         continue
-                files.append({'obj': f, 'name': f.name, 'full_path': None})
+                upload_items.append({'obj': f, 'name': f.name, 'full_path': None})
+
+        # Directory sources are scanned in parallel and streamed straight into
+        # extraction, so parsing starts before the scan has finished.
+        scan_roots = []
         if current_path:
             clean_path = current_path.strip().strip('"').strip("'")
-            if os.path.isdir(clean_path): gather_files(clean_path, files, skipped_files, unreachable_files)
-        
+            if os.path.isdir(clean_path): scan_roots.append(clean_path)
         vault_path = "vault"
-        if os.path.exists(vault_path): gather_files(vault_path, files, skipped_files, unreachable_files)
-
-        if files:
-            st.session_state.kb.documents_metadata = []
-            st.session_state.kb.file_contents = {}
-            st.session_state.kb.stop_requested = False 
-            st.session_state.kb.indexing_errors = [] 
+        if os.path.exists(vault_path): scan_roots.append(vault_path)
+        scanner = make_scanner(limit_mb if limit_active else None)
+        sources = itertools.chain(upload_items, scanner.iter_files(scan_roots))
+
+        st.session_state.extraction_cache.reset_stats()
+        use_cache = st.session_state.config.get("extraction_cache_enabled")
+        extraction_cache = st.session_state.extraction_cache if use_cache else None
+        prog = None
+        processed = 0
+
+        for idx, item in enumerate(sources):
+            if idx == 0:
+                # First file found: reset the previous ingestion state
+                st.session_state.kb.documents_metadata = []
+                st.session_state.kb.file_contents.clear()
+                st.session_state.kb._content_parts = {}
+                st.session_state.kb.extraction_profile = {}
+                st.session_state.kb.stop_requested = False 
+                st.session_state.kb.indexing_errors = [] 
+                st.session_state.kb.loaded_snapshot = None # Unsaved build: don't hot-reload over it
+                # Use placeholders at the top
+                prog = prog_placeholder.progress(0)
+                live_err_placeholder = st.empty() # Still keep this near the bottom for details
+
+            if st.session_state.kb.stop_requested: break
+            # The total grows while the scanner is still discovering files
+            total_seen = len(upload_items) + scanner.stats["supported_files"]
+            total_label = f"{total_seen}" if scanner.finished or not scan_roots else f"{total_seen}+"
+            try:
+                process_single_file(item['obj'], st.session_state.kb, item['name'], item['full_path'], cache=extraction_cache)
+            except Exception as e:
+                err_msg = f"{len(st.session_state.kb.indexing_errors) + 1}. {idx + 1}/{total_label} {item['full_path'] or item['name']} - {str(e)}"
+                st.session_state.kb.indexing_errors.append(err_msg)
+            processed += 1
             
-            # Use placeholders at the top
-            prog = prog_placeholder.progress(0)
-            live_err_placeholder = st.empty() # Still keep this near the bottom for details
+            err_count = len(st.session_state.kb.indexing_errors)
+            status_color = "#ef4444" if err_count > 0 else "#2563eb"
+            prog_msg = f"Step 1/2: Ingesting {item['name']} ({idx+1}/{total_label})"
+            if err_count > 0: prog_msg += f" | {err_count} Errors"
             
-            for idx, item in enumerate(files):
-                if st.session_state.kb.stop_requested: break
-                try:
-                    process_single_file(item['obj'], st.session_state.kb, item['name'], item['full_path'])
-                except Exception as e:
-                    err_msg = f"{len(st.session_state.kb.indexing_errors) + 1}. {idx + 1}/{len(files)} {item['full_path'] or item['name']} - {str(e)}"
-                    st.session_state.kb.indexing_errors.append(err_msg)
-                
-                err_count = len(st.session_state.kb.indexing_errors)
-                status_color = "#ef4444" if err_count > 0 else "#2563eb"
-                prog_msg = f"Step 1/2: Ingesting {item['name']} ({idx+1}/{len(files)})"
-                if err_count > 0: prog_msg += f" | {err_count} Errors"
-                
-                status_placeholder.markdown(f"<p style='color:{status_color}; font-size: 14px; font-weight: 600;'>{prog_msg}</p>", unsafe_allow_html=True)
-                prog.progress((idx + 1) / len(files))
+            status_placeholder.markdown(f"<p style='color:{status_color}; font-size: 14px; font-weight: 600;'>{prog_msg}</p>", unsafe_allow_html=True)
+            prog.progress(min((idx + 1) / max(total_seen, 1), 1.0))
+
+        if processed:
+            st.session_state.extraction_cache.flush()
+            # Diff against the previous scan, then make this scan the new baseline
+            scan_manifest = ScanManifest()
+            scan_diff = scan_manifest.diff(scanner.snapshot)
+            if scanner.finished: scan_manifest.save(scanner.snapshot)
+            st.session_state.last_scan_report = {
+                **scanner.stats, "uploads": len(upload_items),
+                "added": len(scan_diff["added"]), "modified": len(scan_diff["modified"]),
+                "removed": len(scan_diff["removed"]), "unchanged": scan_diff["unchanged"]}
+            # Feeds the Knowledge Scoping Report
+            st.session_state.kb.ingestion_log = {"total_found": processed, "skipped": skipped_files + scanner.skipped,
+                                                 "unreachable": scanner.unreachable}
             
             if not st.session_state.kb.stop_requested:
                 status_placeholder.markdown("<p style='color:#8b5cf6; font-size: 14px; font-weight: 600;'>Step 2/2: Building Semantic Galaxy (Vector Core Calculation)...</p>", unsafe_allow_html=True)
                 try:
                     st.session_state.kb.build_index(st.session_state.llm if engine_choice == "Deep Learning" else None)
                     st.session_state.kb.save_to_disk()
+                    if st.session_state.sharded_index.strategy != "none":
+                        status_placeholder.markdown("<p style='color:#8b5cf6; font-size: 14px; font-weight: 600;'>Partitioning index into shards...</p>", unsafe_allow_html=True)
+                        st.session_state.sharded_index.sync(st.session_state.kb)
+                    st.session_state.summary_store.update_metadata(st.session_state.kb.get_document_records())
                 except Exception as e:
                     st.error(f"Vector Core Build Failed: {str(e)}")
             
@@ -768,6 +1390,31 @@ with tab_settings:
             status_placeholder.warning("No files found to index.")
             st.session_state.is_indexing = False
 
+    # Scan Report: what discovery found and how it differs from the previous scan
+    scan_report = st.session_state.get("last_scan_report")
+    if scan_report:
+        st.caption(f"📂 Scan: **{scan_report['supported_files']}** files in {scan_report['folders']} folders "
+                   f"({scan_report['total_files']} seen, {scan_report['uploads']} uploads) | "
+                   f"+{scan_report['added']} new, ~{scan_report['modified']} modified, "
+                   f"-{scan_report['removed']} removed, {scan_report['unchanged']} unchanged")
+
+    # Extraction Cache: how much of the last ingestion skipped parsing
+    x_stats = st.session_state.extraction_cache.stats
+    x_reused = x_stats["stat_hits"] + x_stats["hash_hits"]
+    if x_reused + x_stats["misses"] > 0:
+        st.caption(f"🗄️ Extraction cache: **{x_reused}** reused ({x_stats['stat_hits']} via stat, "
+                   f"{x_stats['hash_hits']} via hash) | **{x_stats['misses']}** parsed | "
+                   f"{x_stats['evicted']} evicted | {st.session_state.extraction_cache.disk_bytes() / (1024 * 1024):.1f} MB on disk")
+
+    # Extraction Profile: per-file parser timings with the slowest pages
+    if getattr(st.session_state.kb, 'extraction_profile', None):
+        with st.expander("⏱️ Extraction Profile", expanded=False):
+            profile_rows = [{"File": f, "Backend": r["backend"], "Pages": r["pages"], "Seconds": r["seconds"],
+                             "Workers": r["workers"], "Cached": r["cached"],
+                             "Slowest Pages": ", ".join(f"p{p} ({sec}s)" for p, sec in r["slowest"])}
+                            for f, r in st.session_state.kb.extraction_profile.items()]
+            st.dataframe(pd.DataFrame(profile_rows).sort_values("Seconds", ascending=False), width="stretch", hide_index=True)
+
     # Persistent Error Report
     if hasattr(st.session_state.kb, 'indexing_errors') and st.session_state.kb.indexing_errors:
 
@@ -825,7 +1472,12 @@ with tab_analytics:
         # Determine Visualization Data
         if st.session_state.view_level == "Universe":
             st.markdown(f"#### 🌌 Universe View ({st.session_state.kb.spatial_granularity})")
-            df = pd.DataFrame(st.session_state.kb.documents_metadata if st.session_state.kb.spatial_granularity == "Segments" else st.session_state.kb.documents_spatial)
+            if st.session_state.kb.spatial_granularity == "Segments":
+                chunks = st.session_state.kb.documents_metadata
+                # ChunkTable builds the frame from its columns; stale sessions still hold a list of dicts
+                df = chunks.to_frame() if hasattr(chunks, 'to_frame') else pd.DataFrame(chunks)
+            else:
+                df = pd.DataFrame(st.session_state.kb.documents_spatial)
             
             # Fetch Global Universe Statistics
             galaxy_stats = st.session_state.kb.get_universe_stats()
@@ -919,7 +1571,26 @@ def render_chat_hub(engine_choice, ollama_ok):
     # Guidance Mode: If the KB is empty, we guide the user instead of searching.
     is_empty_kb = not st.session_state.kb.file_contents
 
-    
+    # 5.0 Search Scope: metadata predicates pushed down into retrieval (only these rows are scored)
+    if not is_empty_kb:
+        scope_now = SearchFilter.coerce(st.session_state.search_scope)
+        with st.expander(f"🎯 Search Scope: {scope_now.describe() if scope_now else 'all documents'}", expanded=False):
+            all_files = st.session_state.kb.get_file_manifest()
+            all_types = sorted({os.path.splitext(f)[1].lower().lstrip(".") for f in all_files} - {""})
+            sc1, sc2 = st.columns(2)
+            with sc1:
+                scope_files = st.multiselect("Files", all_files, default=[f for f in st.session_state.search_scope.get("files", []) if f in all_files])
+                scope_prefix = st.text_input("Path Prefix", value=st.session_state.search_scope.get("path_prefix", ""),
+                                             placeholder="/data/vault/reports", help="Only files whose full path starts with this.")
+            with sc2:
+                scope_types = st.multiselect("Source Types", all_types, default=[t for t in st.session_state.search_scope.get("types", []) if t in all_types])
+                first, last = st.session_state.search_scope.get("pages") or [None, None]
+                pc1, pc2 = st.columns(2)
+                page_from = pc1.number_input("From Page", min_value=0, value=first or 0, help="0 = no lower bound.")
+                page_to = pc2.number_input("To Page", min_value=0, value=last or 0, help="0 = no upper bound.")
+            pages = [int(page_from) or None, int(page_to) or None]
+            st.session_state.search_scope = SearchFilter(scope_files, scope_prefix.strip(), pages, scope_types).to_dict()
+
     with chat_box:
         if is_empty_kb and not st.session_state.messages:
             st.markdown(f"""
@@ -934,6 +1605,10 @@ def render_chat_hub(engine_choice, ollama_ok):
         for msg in st.session_state.messages:
             with st.chat_message(msg["role"]):
                 st.markdown(msg["content"], unsafe_allow_html=True)
+                if msg.get("cached"):
+                    st.caption("⚡ Cached answer")
+                if msg.get("profile"):
+                    render_query_profile(msg["profile"])
                 # Inline Results for Retrieval-only search
                 if msg.get("type") == "results":
                     for fname, chunks in msg["data"].items():
@@ -962,10 +1637,21 @@ def render_chat_hub(engine_choice, ollama_ok):
 
             # --- SEARCH EXECUTION ---
             with st.status("💠 Processing Semantic Hub...", expanded=True) as status:
+                # Index server when enabled and reachable, sharded fan-out when shards exist, else the monolithic index
+                retriever = st.session_state.sharded_index if st.session_state.sharded_index.enabled else st.session_state.kb
+                if st.session_state.config.get("index_server_enabled") and st.session_state.index_client.available:
+                    retriever = st.session_state.index_client
+                scope = SearchFilter.coerce(st.session_state.get("search_scope"))
+                profiling = st.session_state.config.get("query_profiling_enabled")
+                profiler = QueryProfiler(query, engine=engine_choice, retriever=type(retriever).__name__,
+                                         chat_model=st.session_state.llm.model_name,
+                                         embedding_model=st.session_state.llm.embedding_model)
                 if engine_choice == "Deep Learning" and ollama_ok:
                     # 1. RETRIEVAL: Pull 'Ground Truth' from the KnowledgeBase.
                     try:
-                        ctx = st.session_state.kb.get_context_for_query(query, st.session_state.llm) if not is_empty_kb else None
+                        with profiler.stage("retrieval"):
+                            ctx = retriever.get_context_snippets(query, st.session_state.llm, filters=scope) if not is_empty_kb else None
+                        profiler.add(**getattr(retriever, 'last_search_profile', {}), snippets=len(ctx) if isinstance(ctx, list) else None)
                     except ValueError as ve:
                         st.error(str(ve))
                         st.session_state.messages.append({"role": "assistant", "content": f"⚠️ **Search Blocked**: {str(ve)}"})
@@ -977,35 +1663,76 @@ def render_chat_hub(engine_choice, ollama_ok):
                         ctx = "SYSTEM_GUIDANCE_MODE: The user's knowledge base is empty. Instead of searching, guide the user on how to use the 'System Settings' tab to upload files (PDF, CSV, etc.) and build an index. Be encouraging."
 
                     if ctx or is_empty_kb:
+                        # 2b. SEMANTIC CACHE: Same index + same evidence + same question => same answer.
+                        answer_cache = st.session_state.answer_cache
+                        use_cache = st.session_state.config.get("answer_cache_enabled") and not is_empty_kb
+                        q_vec = getattr(retriever, 'last_query_vector', None)
+                        chunk_ids = [r.get('chunk_id') for r in ctx] if isinstance(ctx, list) else []
+                        index_version = getattr(retriever, 'index_version', None)
+                        conversation = answer_cache.conversation_key(st.session_state.messages, query)
+                        cached = answer_cache.lookup(q_vec, index_version, chunk_ids, st.session_state.llm.model_name, conversation) if use_cache else None
+
                         with chat_box:
                             with st.chat_message("assistant"):
-                                # 3. IDENTITY: Load the agent's persona (from AGENT.md).
-                                agent_id_mgr = IdentityManager()
-                                agent_context = agent_id_mgr.load_config()
-                                # 4. MANIFEST: Tell the LLM which files exist for citation support.
-                                manifest = st.session_state.kb.get_file_manifest() if hasattr(st.session_state.kb, 'get_file_manifest') else sorted(list(st.session_state.kb.file_contents.keys()))
-                                
-                                # 5. GENERATION: Stream the RAG-grounded response.
-                                stream = st.session_state.llm.generate_rag_response(query, ctx, st.session_state.messages, 
-                                                                                  agent_context=agent_context, 
-                                                                                  file_manifest=manifest)
-                                full_res = st.write_stream(stream)
-
-                        stats = st.session_state.llm.get_last_stats()
-                        st.session_state.messages.append({"role": "assistant", "content": full_res, "type": "rag", "stats": stats})
+                                if cached:
+                                    full_res = st.write_stream(answer_cache.replay(cached))
+                                else:
+                                    # 3. IDENTITY: Load the agent's persona (from AGENT.md).
+                                    agent_id_mgr = IdentityManager()
+                                    agent_context = agent_id_mgr.load_config()
+                                    # 4. MANIFEST: Tell the LLM which files exist for citation support.
+                                    manifest = st.session_state.kb.get_file_manifest() if hasattr(st.session_state.kb, 'get_file_manifest') else sorted(list(st.session_state.kb.file_contents.keys()))
+                                    
+                                    # 5. GENERATION: Stream the RAG-grounded response.
+                                    stream = st.session_state.llm.generate_rag_response(query, ctx, st.session_state.messages, 
+                                                                                      agent_context=agent_context, 
+                                                                                      file_manifest=manifest)
+                                    full_res = st.write_stream(stream)
+
+                        if cached:
+                            stats = {**cached.get("stats", {}), "cached": True, "cache_similarity": cached["similarity"]}
+                        else:
+                            stats = st.session_state.llm.get_last_stats()
+                            if use_cache and not str(full_res).startswith("⚠️ LLM Error"):
+                                answer_cache.store(query, q_vec, index_version, chunk_ids, st.session_state.llm.model_name, full_res, stats, conversation)
+                        profiler.add(cached=bool(cached), **{k: stats.get(k) for k in (
+                            "input_tokens", "output_tokens", "prompt_chars", "prompt_eval_ms", "load_ms", "ttft_ms",
+                            "eval_ms", "tokens_per_s", "generation_ms", "ollama_total_ms")})
+                        pack_report = getattr(st.session_state.llm, "last_pack_report", {}) if not cached else {}
+                        profiler.add(context_tokens=pack_report.get("packed_tokens"), snippets_kept=pack_report.get("snippets_kept"))
+                        profile = profiler.finish() if profiling else None
+                        if profile: st.session_state.profile_log.append(profile)
+                        st.session_state.messages.append({"role": "assistant", "content": full_res, "type": "rag", "stats": stats,
+                                                          "cached": bool(cached), "profile": profile})
+                        if cached:
+                            st.caption(f"⚡ Cached answer (question similarity {cached['similarity']:.2f}) — no LLM call was made.")
                         # Post-Response Token Analysis
                         render_token_report(stats['input_tokens'], stats['output_tokens'], stats['total_tokens'])
+                        pack = getattr(st.session_state.llm, "last_pack_report", {})
+                        if pack.get("saved_tokens") and not cached:
+                            st.caption(f"🧮 Context packer saved ~{pack['saved_tokens']} tokens "
+                                       f"({pack['snippets_kept']}/{pack['snippets_in']} snippets, "
+                                       f"{pack['manifest_listed']}/{pack['manifest_total']} files listed)")
+                        if stats.get("prompt_eval_ms") is not None and not cached:
+                            st.caption(f"⚡ Prompt eval {stats['prompt_eval_ms']} ms • "
+                                       f"~{stats.get('cached_prefix_tokens', 0)} prefix tokens reused "
+                                       f"(~{stats.get('prompt_eval_saved_ms', 0)} ms saved)")
                     else:
                         st.session_state.messages.append({"role": "assistant", "content": "No context found."})
                 else:
                     # STATISTICAL RETRIEVAL FLOW
-                    res = st.session_state.kb.search(query, top_n=st.session_state.kb.ml_top_n)
+                    with profiler.stage("retrieval"):
+                        res = retriever.search(query, top_n=st.session_state.kb.ml_top_n, filters=scope)
+                    profiler.add(**getattr(retriever, 'last_search_profile', {}), snippets=len(res))
+                    profile = profiler.finish() if profiling else None
+                    if profile: st.session_state.profile_log.append(profile)
                     if res:
                         grouped = {}
                         for r in res: 
                             if r['file'] not in grouped: grouped[r['file']] = []
                             grouped[r['file']].append(r)
-                        st.session_state.messages.append({"role": "assistant", "type": "results", "content": f"Vector correlations for: **{query}**", "data": grouped})
+                        st.session_state.messages.append({"role": "assistant", "type": "results", "content": f"Vector correlations for: **{query}**",
+                                                          "data": grouped, "profile": profile})
                     else: st.session_state.messages.append({"role": "assistant", "content": "No matches found."})
                 
                 status.update(label="Query Complete", state="complete")
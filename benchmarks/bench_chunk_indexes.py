@@ -0,0 +1,142 @@
+"""
+Benchmark — Linear Metadata Scans vs ChunkTable Indexes
+=======================================================
+
+Times the lookups that used to scan every chunk against their indexed
+replacements, on synthetic corpora of growing size:
+
+- **aggregate**: per-file centroids (`_get_aggregated_document_matrix`)
+- **propagate**: document-mode cluster propagation to chunks
+- **topics**: `get_cluster_topics` for every cluster
+- **sidebar**: full-path lookup for every file (one UI rerun)
+
+The legacy column re-implements the pre-index code over a list of dicts.
+When the corpus grows 4x (files grow with it), the legacy timings grow
+~16x (O(files x chunks)) while the indexed ones grow ~4x.
+
+Usage:
+    python benchmarks/bench_chunk_indexes.py --sizes 10000 40000 160000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.chunk_table import ChunkTable  # noqa: E402
+from core.document_store import DocumentStore  # noqa: E402
+from core.knowledge_base import KnowledgeBase  # noqa: E402
+
+CHUNKS_PER_FILE = 40
+CLUSTERS = 5
+DIM = 16
+
+
+def make_records(n_chunks, rng):
+    return [{"text": f"chunk {i}", "file": f"doc{i // CHUNKS_PER_FILE}.md",
+             "full_path": f"/vault/doc{i // CHUNKS_PER_FILE}.md", "page": i % CHUNKS_PER_FILE + 1,
+             "cluster": int(rng.integers(CLUSTERS))} for i in range(n_chunks)]
+
+
+# ----------------------------------------------------------------------
+# Legacy implementations (list of dicts, linear scans)
+# ----------------------------------------------------------------------
+
+def legacy_aggregate(meta, matrix):
+    df = pd.DataFrame(meta)
+    out = []
+    for fname in df['file'].unique():
+        indices = df[df['file'] == fname].index.tolist()
+        out.append(np.mean(matrix[indices], axis=0))
+    return out
+
+
+def legacy_propagate(meta, files):
+    for c_id, fname in enumerate(files):
+        for m in meta:
+            if m['file'] == fname:
+                m['cluster'] = c_id % CLUSTERS
+
+
+def legacy_topics(meta, tfidf):
+    for c in sorted(set(m.get('cluster', 0) for m in meta)):
+        indices = [i for i, m in enumerate(meta) if m.get('cluster') == c]
+        tfidf[indices].sum(axis=0)
+
+
+def legacy_sidebar(meta, files):
+    for fname in files:
+        for m in meta:
+            if m['file'] == fname:
+                m.get('full_path')
+                break
+
+
+# ----------------------------------------------------------------------
+# Indexed implementations (what the KnowledgeBase / UI now run)
+# ----------------------------------------------------------------------
+
+def indexed_propagate(table, files):
+    for c_id, fname in enumerate(files):
+        table.set_clusters(table.rows_for_file(fname), c_id % CLUSTERS)
+
+
+def indexed_topics(kb):
+    for c in kb.documents_metadata.cluster_ids():
+        kb.get_cluster_topics(c)
+
+
+def indexed_sidebar(table, files):
+    for fname in files:
+        table.full_path_of(fname)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def run(n_chunks, store):
+    rng = np.random.default_rng(0)
+    records = make_records(n_chunks, rng)
+    matrix = rng.standard_normal((n_chunks, DIM)).astype(np.float32)
+    files = sorted({r['file'] for r in records})
+
+    kb = KnowledgeBase(engine_mode="Deep Learning", doc_store=store)
+    kb.documents_metadata = ChunkTable.from_records(records)
+    kb.embeddings = matrix
+    kb.tfidf_matrix = matrix
+    kb.vectorizer.get_feature_names_out = lambda: np.array([f"feature{i}" for i in range(DIM)])
+    table = kb.documents_metadata
+
+    legacy = [dict(r) for r in records]
+    return {
+        "aggregate": (timed(legacy_aggregate, legacy, matrix), timed(kb._get_aggregated_document_matrix)),
+        "propagate": (timed(legacy_propagate, legacy, files), timed(indexed_propagate, table, files)),
+        "topics": (timed(legacy_topics, legacy, matrix), timed(indexed_topics, kb)),
+        "sidebar": (timed(legacy_sidebar, legacy, files), timed(indexed_sidebar, table, files)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 40_000, 160_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DocumentStore(os.path.join(tmp, "documents.sqlite"))
+        print(f"{'chunks':>9} {'files':>6}  {'path':<10} {'legacy ms':>11} {'indexed ms':>11} {'speedup':>8}")
+        for n in args.sizes:
+            for name, (old, new) in run(n, store).items():
+                print(f"{n:>9} {n // CHUNKS_PER_FILE:>6}  {name:<10} {old:>11.1f} {new:>11.1f} {old / max(new, 1e-6):>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
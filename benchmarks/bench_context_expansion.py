@@ -0,0 +1,82 @@
+"""
+Benchmark — Small-Chunk Matching with Context Expansion
+=======================================================
+
+Each synthetic document hides one answer sentence right *after* the sentence
+a query describes, so the best-matching chunk often stops before the answer.
+For every expansion mode it reports:
+
+- **answer found**: share of queries whose context contains the answer sentence
+- **tokens**: estimated context tokens of the formatted snippets
+- **expand ms**: time spent expanding the hits (search time excluded)
+
+Usage:
+    python benchmarks/bench_context_expansion.py --docs 300 --top-k 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core.knowledge_base as knowledge_base  # noqa: E402
+from core.context_packer import estimate_tokens, format_snippet  # noqa: E402
+from core.document_store import DocumentStore  # noqa: E402
+from core.knowledge_base import KnowledgeBase  # noqa: E402
+
+
+class _PlainLemmatizer:
+    def lemmatize(self, word, pos=None):
+        return word
+
+
+def build(tmp, docs, rng):
+    knowledge_base.WordNetLemmatizer = _PlainLemmatizer # Keeps the benchmark free of NLTK corpora
+    kb = KnowledgeBase(engine_mode="Machine Learning", chunk_size=300, overlap_size=50,
+                       doc_store=DocumentStore(os.path.join(tmp, "documents.sqlite")))
+    filler = [f"filler{i}" for i in range(500)]
+    questions = []
+    for d in range(docs):
+        sentences = [" ".join(rng.choice(filler, 12)) + "." for _ in range(30)]
+        at = int(rng.integers(2, 27))
+        sentences[at] = f"The project codename{d} was reviewed by the steering board."
+        sentences[at + 1] = f"Its approved budget is answer{d} credits."
+        kb.process_text(f"doc{d}.md", " ".join(sentences), 1, f"/bench/doc{d}.md")
+        questions.append((f"project codename{d} steering board", f"answer{d}"))
+    kb.finalize_documents()
+    kb.build_index()
+    return kb, questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=4)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        kb, questions = build(tmp, args.docs, rng)
+        picked = [questions[i] for i in rng.choice(len(questions), min(args.queries, len(questions)), replace=False)]
+        hits = [(kb.search(q, None, top_n=args.top_k), answer) for q, answer in picked]
+        print(f"{len(kb.documents_metadata)} chunks from {args.docs} docs, {len(picked)} queries, top-{args.top_k}\n")
+        print(f"{'mode':<12} {'answer found':>13} {'tokens':>8} {'expand ms':>10}")
+        for mode in ("none", "window", "neighbors", "parent"):
+            found, tokens, ms = [], [], []
+            for results, answer in hits:
+                start = time.perf_counter()
+                context = kb.expand_results([dict(r) for r in results], mode)
+                ms.append((time.perf_counter() - start) * 1000)
+                found.append(any(answer in r["text"] for r in context))
+                tokens.append(sum(estimate_tokens(format_snippet(r)) for r in context))
+            print(f"{mode:<12} {np.mean(found):>12.0%} {np.mean(tokens):>8.0f} {np.mean(ms):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
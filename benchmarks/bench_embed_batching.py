@@ -0,0 +1,113 @@
+"""
+Benchmark — Direct vs Micro-Batched Query Embeddings
+====================================================
+
+Simulates N users embedding queries at the same time and compares:
+
+- **direct**: every query is its own embedding request (the old `embed_text`)
+- **batched**: queries go through the `EmbeddingBatcher`, which merges
+  concurrent ones into a single request
+
+By default the embedding server is simulated: a request costs a fixed
+overhead plus a small per-text cost, and requests are processed one at a
+time (Ollama's default `OLLAMA_NUM_PARALLEL=1` behaviour for one model).
+Pass `--ollama MODEL` to measure against a running Ollama instead.
+
+Reported: throughput (queries/s), mean and p99 latency per query, and how
+many requests reached the server.
+
+Usage:
+    python benchmarks/bench_embed_batching.py --users 1 4 16 32
+    python benchmarks/bench_embed_batching.py --ollama nomic-embed-text --users 1 8
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.embedding_batcher import EmbeddingBatcher  # noqa: E402
+
+
+class SimulatedServer:
+    """Serial embedding endpoint: `overhead_ms` per request + `per_text_ms` per text."""
+
+    def __init__(self, overhead_ms, per_text_ms, dim=768):
+        self.overhead_ms, self.per_text_ms, self.dim = overhead_ms, per_text_ms, dim
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def embed_many(self, model, texts):
+        with self._lock:
+            self.requests += 1
+            time.sleep((self.overhead_ms + self.per_text_ms * len(texts)) / 1000)
+        return [[0.0] * self.dim for _ in texts]
+
+
+class OllamaServer:
+    """Real Ollama, counting requests."""
+
+    def __init__(self):
+        import ollama
+        self.ollama, self.requests = ollama, 0
+
+    def embed_many(self, model, texts):
+        self.requests += 1
+        return self.ollama.embed(model=model, input=texts).get("embeddings", [])
+
+
+def run(users, queries_each, embed_one):
+    """`users` threads each embedding `queries_each` queries back to back; returns latencies (ms) and wall time."""
+    latencies, lock = [], threading.Lock()
+
+    def user(u):
+        mine = []
+        for q in range(queries_each):
+            start = time.perf_counter()
+            embed_one(f"user {u} question {q} about quarterly revenue")
+            mine.append((time.perf_counter() - start) * 1000)
+        with lock: latencies.extend(mine)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(users)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return np.array(latencies), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--queries", type=int, default=20, help="Queries per user.")
+    parser.add_argument("--overhead-ms", type=float, default=25.0, help="Simulated per-request cost.")
+    parser.add_argument("--per-text-ms", type=float, default=2.0, help="Simulated per-text cost.")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--ollama", metavar="MODEL", help="Use a running Ollama with this embedding model.")
+    args = parser.parse_args()
+    model = args.ollama or "simulated"
+
+    def make_server():
+        return OllamaServer() if args.ollama else SimulatedServer(args.overhead_ms, args.per_text_ms)
+
+    print(f"{'users':>5}  {'mode':<8} {'q/s':>8} {'mean ms':>9} {'p99 ms':>9} {'requests':>9}")
+    for users in args.users:
+        for mode in ("direct", "batched"):
+            server = make_server()
+            if mode == "direct":
+                embed_one = lambda text: server.embed_many(model, [text])[0]
+            else:
+                batcher = EmbeddingBatcher(server.embed_many, args.max_batch, args.max_wait_ms)
+                embed_one = lambda text: batcher.embed(model, text)
+            latencies, wall = run(users, args.queries, embed_one)
+            print(f"{users:>5}  {mode:<8} {len(latencies) / wall:>8.1f} {latencies.mean():>9.1f} "
+                  f"{np.percentile(latencies, 99):>9.1f} {server.requests:>9}")
+
+
+if __name__ == "__main__":
+    main()
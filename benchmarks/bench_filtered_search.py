@@ -0,0 +1,111 @@
+"""
+Benchmark — Global vs Scoped (Filter Pushdown) Neural Search
+============================================================
+
+Builds a synthetic index of many small files (with paths, types and pages)
+and times the same queries:
+
+- **global**: `KnowledgeBase.search` over every row
+- **post-filter**: global search for a deep candidate list, then keep the
+  rows in scope (what scoping cost before pushdown; it can also miss hits)
+- **pushdown**: `KnowledgeBase.search(..., filters=...)`, which resolves the
+  scope to rows first and scores only those
+
+Pushdown results are checked against a brute-force scan of the scoped rows.
+
+Usage:
+    python benchmarks/bench_filtered_search.py --chunks 200000 --dim 768 --quantization none int8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.chunk_table import ChunkTable  # noqa: E402
+from core.document_store import DocumentStore  # noqa: E402
+from core.knowledge_base import KnowledgeBase  # noqa: E402
+
+CHUNKS_PER_FILE = 40
+TYPES = ("pdf", "md", "txt", "csv", "docx")
+
+
+def build(tmp, chunks, dim):
+    rng = np.random.default_rng(0)
+    kb = KnowledgeBase(engine_mode="Deep Learning", doc_store=DocumentStore(os.path.join(tmp, "documents.sqlite")))
+    records = []
+    for i in range(chunks):
+        f = i // CHUNKS_PER_FILE
+        name = f"doc{f}.{TYPES[f % len(TYPES)]}"
+        records.append({"text": f"chunk topic{i % 64}", "file": name, "full_path": f"/vault/team{f % 20}/{name}",
+                        "page": (i % CHUNKS_PER_FILE) // 4 + 1})
+    kb.documents_metadata = ChunkTable.from_records(records)
+    kb.embeddings = rng.standard_normal((chunks, dim)).astype(np.float32)
+    kb.index_embedding_model = "bench-embed"
+    kb.neural_threshold = -1.0
+    return kb
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    out = [fn(q) for q in queries]
+    return (time.perf_counter() - start) * 1000 / len(queries), out
+
+
+def brute(kb, rows, q, k):
+    vecs = kb.embeddings[rows]
+    sims = vecs @ q / (np.linalg.norm(vecs, axis=1) * np.linalg.norm(q) + 1e-9)
+    return np.sort(sims)[::-1][:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--post-filter-depth", type=int, default=1000, help="Candidates fetched before post-filtering.")
+    parser.add_argument("--quantization", nargs="+", default=["none", "int8"], choices=["none", "int8", "binary"])
+    args = parser.parse_args()
+
+    queries = np.random.default_rng(1).standard_normal((args.queries, args.dim)).astype(np.float32)
+    scopes = {
+        "one file": {"files": [f"doc7.{TYPES[7 % len(TYPES)]}"]},
+        "folder (5%)": {"path_prefix": "/vault/team3/"},
+        "type (20%)": {"types": ["pdf"]},
+        "type + pages": {"types": ["pdf"], "pages": [1, 2]},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        kb = build(tmp, args.chunks, args.dim)
+        print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, top-{args.top_k}")
+        for mode in args.quantization:
+            kb.vector_quantization = mode
+            kb.search("warmup", None, top_n=args.top_k, query_vector=queries[0]) # Builds codes / norms
+            base_ms, _ = timed(lambda q: kb.search("", None, top_n=args.top_k, query_vector=q), queries)
+            print(f"\nquantization={mode}   global: {base_ms:.2f} ms/query")
+            print(f"{'scope':<14} {'rows':>8} {'post-filter':>12} {'found':>6} {'pushdown':>10} {'vs global':>10} {'exact':>6}")
+            for label, scope in scopes.items():
+                rows = kb.filter_rows(scope)
+                in_scope = set(rows.tolist())
+
+                def post(q):
+                    hits = kb.search("", None, top_n=args.post_filter_depth, query_vector=q)
+                    return [r for r in hits if r['chunk_id'] in in_scope][:args.top_k]
+
+                post_ms, post_res = timed(post, queries)
+                push_ms, push_res = timed(lambda q: kb.search("", None, top_n=args.top_k, query_vector=q, filters=scope), queries)
+                found = np.mean([len(r) for r in post_res])
+                exact = mode != "none" or all(np.allclose([r['score'] for r in res], brute(kb, rows, q, args.top_k), atol=1e-4)
+                                              for res, q in zip(push_res, queries))
+                print(f"{label:<14} {len(rows):>8} {post_ms:>10.2f}ms {found:>6.1f} {push_ms:>8.2f}ms "
+                      f"{base_ms / push_ms:>9.1f}x {str(exact):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark — Full-Precision vs int8 / Binary Quantized Neural Search
+===================================================================
+
+Builds a synthetic clustered embedding corpus and compares:
+
+- **float32**: the exact scan `_search_neural` performs without quantization
+- **int8** / **binary**: `QuantizedIndex` first pass + exact rescoring
+
+Reported per mode: memory held in RAM for scanning, mean latency per query,
+and recall@k against the exact float32 ranking.
+
+Usage:
+    python benchmarks/bench_quantization.py --chunks 200000 --dim 1024
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.quantization import QuantizedIndex  # noqa: E402
+
+
+def make_corpus(n, dim, clusters, rng):
+    """Gaussian clusters on the unit sphere (roughly how topic embeddings spread)."""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=n)
+    vecs = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vecs
+
+
+def exact_top(matrix, norms, q, k):
+    sims = matrix @ q / (norms * np.linalg.norm(q) + 1e-9)
+    top = np.argpartition(-sims, k - 1)[:k]
+    return top[np.argsort(-sims[top])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, nargs="+", default=[4, 10, 25])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = make_corpus(args.chunks, args.dim, clusters=64, rng=rng)
+    queries = matrix[rng.integers(args.chunks, size=args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    k = args.top_k
+
+    # Full precision baseline (norms precomputed, as a fair lower bound)
+    norms = np.linalg.norm(matrix, axis=1)
+    start = time.perf_counter()
+    truth = [exact_top(matrix, norms, q, k) for q in queries]
+    base_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+    print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, recall@{k}\n")
+    print(f"{'mode':<18} {'scan RAM MB':>12} {'ms/query':>10} {'recall':>8}")
+    print(f"{'float32 (exact)':<18} {matrix.nbytes / 2**20:>12.1f} {base_ms:>10.2f} {1.0:>8.3f}")
+
+    for mode in ("int8", "binary"):
+        start = time.perf_counter()
+        index = QuantizedIndex.build(matrix, mode)
+        build_s = time.perf_counter() - start
+        for oversample in args.oversample:
+            hits = 0
+            start = time.perf_counter()
+            for q, expected in zip(queries, truth):
+                rows, _ = index.search(matrix, q, k, oversample)
+                hits += len(set(rows[:k].tolist()) & set(expected.tolist()))
+            ms = (time.perf_counter() - start) * 1000 / args.queries
+            label = f"{mode} (x{oversample})"
+            print(f"{label:<18} {index.nbytes / 2**20:>12.1f} {ms:>10.2f} {hits / (k * args.queries):>8.3f}")
+        print(f"{'':<18} built in {build_s:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark — Context Diversity with MMR and Adjacent-Chunk Merging
+================================================================
+
+Indexes synthetic documents with the sliding-window chunker and a
+bag-of-words embedder (overlapping windows share words, so neighbouring
+chunks get near-duplicate vectors, as with a real embedding model). For each
+query it reports, per retrieval setting:
+
+- **tokens**: estimated context tokens of the formatted snippets
+- **distinct/token**: distinct page characters covered per context token
+  (overlapping windows count once)
+- **docs**: distinct documents represented in the context
+- **ms**: search latency
+
+Usage:
+    python benchmarks/bench_result_diversity.py --docs 200 --top-k 8
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core.knowledge_base as knowledge_base  # noqa: E402
+from core.context_packer import estimate_tokens, format_snippet  # noqa: E402
+from core.document_store import DocumentStore  # noqa: E402
+from core.knowledge_base import KnowledgeBase  # noqa: E402
+
+DIM = 256
+
+
+class BagOfWordsEmbedder:
+    """Sum of per-word random vectors: chunks sharing words get similar embeddings."""
+    embedding_model = "bench-bow"
+
+    def __init__(self):
+        self._words = {}
+
+    def _word(self, w):
+        if w not in self._words:
+            seed = int(hashlib.md5(w.encode()).hexdigest()[:8], 16)
+            self._words[w] = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+        return self._words[w]
+
+    def embed_text(self, text):
+        return np.sum([self._word(w) for w in text.split()] or [np.zeros(DIM, np.float32)], axis=0).tolist()
+
+    def embed_batch(self, texts):
+        return [self.embed_text(t) for t in texts]
+
+
+class _PlainLemmatizer:
+    def lemmatize(self, word, pos=None):
+        return word
+
+
+def build(tmp, docs, rng):
+    knowledge_base.WordNetLemmatizer = _PlainLemmatizer # Keeps the benchmark free of NLTK corpora
+    kb = KnowledgeBase(chunk_size=400, overlap_size=120, doc_store=DocumentStore(os.path.join(tmp, "documents.sqlite")))
+    vocab = [f"term{i}" for i in range(3000)]
+    for d in range(docs):
+        topic = rng.choice(vocab, 40)
+        words = [rng.choice(topic) if rng.random() < 0.6 else rng.choice(vocab) for _ in range(600)]
+        kb.process_text(f"doc{d}.md", " ".join(words), 1, f"/bench/doc{d}.md")
+    kb.finalize_documents()
+    texts = kb.documents_metadata.texts
+    kb.embeddings = np.array(BagOfWordsEmbedder().embed_batch(texts), dtype=np.float32)
+    kb.index_embedding_model = BagOfWordsEmbedder.embedding_model
+    kb.neural_threshold = -1.0
+    return kb
+
+
+def coverage(results):
+    """Distinct (src, offset) characters covered by the results."""
+    spans = {}
+    for r in results:
+        spans.setdefault(r.get("src"), []).append((r["start"], r["end"]))
+    covered = 0
+    for ranges in spans.values():
+        ranges.sort()
+        end = -1
+        for s, e in ranges:
+            covered += max(0, e - max(s, end))
+            end = max(end, e)
+    return covered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--top-k", type=int, default=8)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        kb = build(tmp, args.docs, rng)
+        embedder = BagOfWordsEmbedder()
+        # Queries are windows of existing chunks, so their neighbours score high too
+        queries = [np.array(embedder.embed_text(" ".join(kb.documents_metadata.texts[i].split()[10:40])))
+                   for i in rng.choice(len(kb.documents_metadata), args.queries, replace=False)]
+        print(f"{len(kb.documents_metadata)} chunks from {args.docs} docs, {args.queries} queries, top-{args.top_k}\n")
+        print(f"{'setting':<26} {'tokens':>8} {'distinct/token':>15} {'docs':>6} {'ms':>7}")
+        settings = [("plain top-k", 1.0, False), ("merge adjacent", 1.0, True),
+                    ("MMR λ=0.7", 0.7, False), ("MMR λ=0.5 + merge", 0.5, True)]
+        for label, lam, merge in settings:
+            tokens, distinct, files, ms = [], [], [], []
+            for q in queries:
+                start = time.perf_counter()
+                res = kb.search("", None, top_n=args.top_k, query_vector=q, mmr_lambda=lam, merge_adjacent=merge)
+                ms.append((time.perf_counter() - start) * 1000)
+                tok = sum(estimate_tokens(format_snippet(r)) for r in res)
+                tokens.append(tok)
+                distinct.append(coverage(res) / max(1, tok))
+                files.append(len({r["file"] for r in res}))
+            print(f"{label:<26} {np.mean(tokens):>8.0f} {np.mean(distinct):>15.2f} {np.mean(files):>6.1f} {np.mean(ms):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark — Monolithic vs Sharded (Parallel Fan-Out) Neural Search
+==================================================================
+
+Builds a synthetic embedding index, partitions it with `ShardedIndex` into
+1, 2, 4, ... size-capped shards and times the same queries against:
+
+- **monolithic**: `KnowledgeBase.search` (one scan on one core)
+- **sharded**: `ShardedIndex.search` (one scan per shard on a thread pool,
+  merged by a top-k heap)
+
+Results are checked to be identical to the monolithic ranking.
+
+Usage:
+    python benchmarks/bench_sharded_search.py --chunks 400000 --dim 768 --shards 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.chunk_table import ChunkTable  # noqa: E402
+from core.document_store import DocumentStore  # noqa: E402
+from core.knowledge_base import KnowledgeBase  # noqa: E402
+from core.sharded_index import ShardedIndex  # noqa: E402
+
+CHUNKS_PER_FILE = 50
+
+
+class FixedQuery:
+    """Stands in for OllamaService: returns pre-made query vectors in turn."""
+    embedding_model = "bench-embed"
+
+    def __init__(self, queries):
+        self.queries, self.i = queries, 0
+
+    def embed_text(self, text):
+        self.i += 1
+        return self.queries[(self.i - 1) % len(self.queries)]
+
+
+def timed_queries(index, llm, n, top_k):
+    start = time.perf_counter()
+    results = [index.search(f"q{i}", llm, top_n=top_k) for i in range(n)]
+    return (time.perf_counter() - start) * 1000 / n, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        kb = KnowledgeBase(engine_mode="Deep Learning", doc_store=DocumentStore(os.path.join(tmp, "documents.sqlite")))
+        kb.documents_metadata = ChunkTable.from_records(
+            [{"text": f"chunk topic{i % 64}", "file": f"doc{i // CHUNKS_PER_FILE}.md", "page": 1} for i in range(args.chunks)])
+        kb.embeddings = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+        kb.index_embedding_model = FixedQuery.embedding_model
+        kb.neural_threshold = -1.0
+
+        base_ms, truth = timed_queries(kb, FixedQuery(queries), args.queries, args.top_k)
+        print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, top-{args.top_k}\n")
+        print(f"{'index':<16} {'ms/query':>10} {'speedup':>8} {'same top-k':>11}")
+        print(f"{'monolithic':<16} {base_ms:>10.2f} {1.0:>7.1f}x {'-':>11}")
+
+        for n in args.shards:
+            sharded = ShardedIndex(root=os.path.join(tmp, f"shards{n}"), doc_store=kb.doc_store, strategy="size",
+                                   max_chunks=-(-args.chunks // n))
+            sharded.configure(neural_threshold=-1.0)
+            sharded.sync(kb)
+            sharded.search("warmup", FixedQuery(queries), top_n=args.top_k) # Loads every shard
+            ms, got = timed_queries(sharded, FixedQuery(queries), args.queries, args.top_k)
+            same = all([r['score'] for r in a] == [r['score'] for r in b] for a, b in zip(truth, got))
+            label = f"{len(sharded.stats())} shard(s)"
+            print(f"{label:<16} {ms:>10.2f} {base_ms / ms:>7.1f}x {str(same):>11}")
+
+
+if __name__ == "__main__":
+    main()
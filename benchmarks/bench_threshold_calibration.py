@@ -0,0 +1,76 @@
+"""
+Benchmark — Fixed vs Calibrated Relevance Thresholds
+====================================================
+
+Simulates embedding models whose similarity scales differ (an isotropic
+space, and spaces where every vector shares a common direction, as with
+nomic / mxbai). Each corpus has topic clusters; queries are a topic centre
+plus noise. Per model it reports the dimension-based fixed cutoff and two
+calibrations: probed with the chunks themselves, and with query-like probes
+(a chunk plus the extra noise of a short text, standing in for the embedded
+excerpts of `text_queries`):
+
+- **related**: results above the cutoff per query that are from the query's topic
+- **unrelated**: results above the cutoff from other topics (prompt flooding)
+- plus the time to calibrate the index
+
+Usage:
+    python benchmarks/bench_threshold_calibration.py --chunks 50000 --dim 768
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.quantization import normalize_rows  # noqa: E402
+from core.threshold_calibration import NEIGHBOUR_PROBES, calibrate, fallback_threshold  # noqa: E402
+
+
+def corpus(chunks, dim, topics, offset, rng):
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    labels = rng.integers(0, topics, chunks)
+    vectors = centres[labels] + 1.2 * rng.standard_normal((chunks, dim)).astype(np.float32)
+    return vectors + offset, centres, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.chunks} chunks x {args.dim} dims, {args.topics} topics, {args.queries} queries\n")
+    print(f"{'model':<22} {'cutoff':<14} {'value':>6} {'related':>8} {'unrelated':>10} {'calib s':>8}")
+    for name, shift in (("isotropic", 0.0), ("shared direction", 1.0), ("strong shared dir.", 3.0)):
+        rng = np.random.default_rng(0)
+        offset = shift * np.ones(args.dim, dtype=np.float32) * np.sqrt(2.0) # Per-dimension shift
+        vectors, centres, labels = corpus(args.chunks, args.dim, args.topics, offset, rng)
+        start = time.perf_counter()
+        by_chunks = calibrate(vectors)
+        seconds = time.perf_counter() - start
+        sources = np.sort(rng.choice(args.chunks, NEIGHBOUR_PROBES, replace=False))
+        probes = vectors[sources] + 0.9 * rng.standard_normal((len(sources), args.dim)).astype(np.float32)
+        by_queries = calibrate(vectors, queries=probes, sources=sources)
+        unit = normalize_rows(vectors)
+        topics = rng.integers(0, args.topics, args.queries)
+        queries = normalize_rows(centres[topics] + offset + 1.5 * rng.standard_normal((args.queries, args.dim)).astype(np.float32))
+        sims = unit @ queries.T # (chunks, queries)
+        same = labels[:, None] == topics[None, :]
+        for label, cutoff in (("fixed (dims)", fallback_threshold(args.dim)), ("calib. chunks", by_chunks["threshold"]),
+                              ("calib. queries", by_queries["threshold"])):
+            above = sims > cutoff
+            related = (above & same).sum(axis=0).mean()
+            unrelated = (above & ~same).sum(axis=0).mean()
+            print(f"{name:<22} {label:<14} {cutoff:>6.3f} {related:>8.1f} {unrelated:>10.1f} "
+                  f"{seconds if label == 'calib. chunks' else 0:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Load Test — Index Server Throughput and Tail Latency
+====================================================
+
+Fires queries at an index server from concurrent client threads for a fixed
+duration and reports throughput (QPS), latency percentiles and the server's
+mean batch size.
+
+Two modes:
+
+- **--url**: test a running server (`python -m core.index_server`). Queries
+  are random vectors of the served dimension unless `--text` is given.
+- **--synthetic N**: build an N-chunk synthetic index in a temp directory,
+  start servers in-process and compare `--max-batch` against an unbatched
+  server (max batch 1). Clients share the process with the server here;
+  run against `--url` for numbers free of that contention.
+
+Usage:
+    python benchmarks/load_test_index_server.py --synthetic 200000 --dim 768 --clients 16
+    python benchmarks/load_test_index_server.py --url http://127.0.0.1:8765 --text "quarterly revenue"
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.chunk_table import ChunkTable  # noqa: E402
+from core.document_store import DocumentStore  # noqa: E402
+from core.index_client import IndexClient  # noqa: E402
+from core.index_server import IndexServer  # noqa: E402
+from core.knowledge_base import KnowledgeBase  # noqa: E402
+
+
+def run_load(url, clients, duration, top_k, dim=None, text=None):
+    """Runs `clients` threads for `duration` seconds; returns (latencies in ms, errors)."""
+    latencies, errors, lock = [], [0], threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(seed):
+        client = IndexClient(url, timeout=60)
+        rng = np.random.default_rng(seed)
+        mine = []
+        while time.perf_counter() < stop_at:
+            vector = None if text else rng.standard_normal(dim).astype(np.float32)
+            start = time.perf_counter()
+            try:
+                client.search(text or "", top_n=top_k, query_vector=vector)
+                mine.append((time.perf_counter() - start) * 1000)
+            except ValueError:
+                with lock: errors[0] += 1
+        client.close()
+        with lock: latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return np.array(latencies), errors[0]
+
+
+def report(label, latencies, errors, duration, stats):
+    if not len(latencies):
+        print(f"{label:<18} no successful requests ({errors} errors)")
+        return
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{label:<18} {len(latencies) / duration:>8.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} "
+          f"{(stats or {}).get('mean_batch', 0):>10} {errors:>7}")
+
+
+def start_server(index_dir, doc_store, max_batch, max_wait_ms):
+    """Runs an IndexServer on a free port in a background thread; returns its URL."""
+    server = IndexServer(index_dir, llm=None, max_batch=max_batch, max_wait_ms=max_wait_ms, reload_seconds=0,
+                         doc_store=doc_store)
+    server.kb.neural_threshold = -1.0
+    if not server.load(): raise SystemExit(f"Could not load the synthetic index from {index_dir}")
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(server.serve(port=0, ready=ready)), daemon=True).start()
+    ready.wait(30)
+    host, port = server.address
+    return f"http://{host}:{port}"
+
+
+def build_synthetic(root, chunks, dim):
+    rng = np.random.default_rng(0)
+    kb = KnowledgeBase(engine_mode="Deep Learning", doc_store=DocumentStore(os.path.join(root, "documents.sqlite")))
+    kb.documents_metadata = ChunkTable.from_records(
+        [{"text": f"chunk topic{i % 64}", "file": f"doc{i // 50}.md", "page": 1} for i in range(chunks)])
+    kb.embeddings = rng.standard_normal((chunks, dim)).astype(np.float32)
+    kb.index_embedding_model = "synthetic"
+    kb.index_embedding_dimension = dim
+    kb.save_to_disk(os.path.join(root, "index"))
+    return os.path.join(root, "index"), kb.doc_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Running server to test.")
+    parser.add_argument("--synthetic", type=int, metavar="CHUNKS", help="Build a synthetic index and serve it in-process.")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--text", help="Send this text query (server embeds it) instead of random vectors.")
+    args = parser.parse_args()
+    if not args.url and not args.synthetic: parser.error("Give --url or --synthetic.")
+
+    header = f"{'server':<18} {'QPS':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mean batch':>10} {'errors':>7}"
+    if args.url:
+        info = IndexClient(args.url).health(refresh=True)
+        if not info: raise SystemExit(f"No index server at {args.url}")
+        print(f"{info['chunks']} chunks, query dim {info.get('query_dim')}, {args.clients} clients, {args.duration:.0f}s\n")
+        print(header)
+        latencies, errors = run_load(args.url, args.clients, args.duration, args.top_k, info.get("query_dim"), args.text)
+        report(args.url, latencies, errors, args.duration, IndexClient(args.url).stats())
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir, doc_store = build_synthetic(tmp, args.synthetic, args.dim)
+        print(f"{args.synthetic} chunks x {args.dim} dims, {args.clients} clients, {args.duration:.0f}s per run\n")
+        print(header)
+        for label, max_batch in (("unbatched", 1), (f"batched (<= {args.max_batch})", args.max_batch)):
+            url = start_server(index_dir, doc_store, max_batch, args.max_wait_ms)
+            latencies, errors = run_load(url, args.clients, args.duration, args.top_k, args.dim)
+            report(label, latencies, errors, args.duration, IndexClient(url).stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Semantic Answer Cache — Instant Replies for Repeated Questions
+==============================================================
+
+Architecture Rationale:
+-----------------------
+Analysts tend to ask the same questions again ("What are the key risks in the
+Q3 report?"), often with slightly different wording. Each repetition normally
+costs a full LLM generation, which takes seconds to minutes on local hardware.
+
+This cache stores finished RAG answers and serves them again when a new query
+is *semantically* equivalent to a previous one. An entry only matches when:
+1. **Same Index**: The KnowledgeBase `index_version` is unchanged (no re-index).
+2. **Same Evidence**: Retrieval returned exactly the same chunk ids.
+3. **Same Model**: The answer was generated by the active chat model.
+4. **Same Conversation**: The recent chat turns sent with the prompt hash the same.
+5. **Same Meaning**: Cosine similarity of the query embeddings ≥ threshold.
+
+Conditions 1-4 guarantee the LLM would have seen an identical context, so
+condition 5 only has to decide whether the *question* is the same.
+
+Eviction:
+- **TTL**: Entries older than `ttl_hours` are discarded.
+- **LRU**: When `max_entries` is exceeded, the least recently served entry goes first.
+
+Storage Note:
+Vectors are persisted as base64-encoded float32 bytes rather than JSON number
+lists, which keeps `data/.answer_cache.json` roughly 5x smaller.
+
+Concurrency Note:
+Every Streamlit session holds its own cache object over the same file.
+`save()` never writes its in-memory copy over the file: under a lock file
+(`utils/file_lock.py`) it re-reads the file, applies only the entries this
+session added or served since its last save, evicts over the merged set
+(LRU by each entry's `used` time) and replaces the file atomically. Lookups
+pick up answers saved by other sessions when the file changes. Saves are
+debounced to one per `save_interval_s`; pending entries go out with the next
+lookup or store after the interval.
+"""
+
+import base64
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.file_lock import file_lock, read_json, write_json_atomic
+
+
+class SemanticAnswerCache:
+    """LRU/TTL cache of RAG answers keyed by query-embedding similarity."""
+
+    def __init__(self, path="data/.answer_cache.json", threshold=0.95, ttl_hours=72, max_entries=500, save_interval_s=5.0):
+        """
+        Args:
+            path (str): JSON file used for persistence between sessions.
+            threshold (float): Minimum cosine similarity for a query to count as a repeat.
+            ttl_hours (float): Maximum age of an entry before it expires.
+            max_entries (int): Capacity before least-recently-used entries are evicted.
+            save_interval_s (float): Minimum spacing between two writes of the file.
+        """
+        self.path = path
+        self.threshold = threshold
+        self.ttl_hours = ttl_hours
+        self.max_entries = max_entries
+        self.save_interval_s = save_interval_s
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = set() # Keys added or served since the last save
+        self._mtime = None # File mtime the in-memory entries reflect
+        self._last_save = 0.0
+        self._load()
+
+    # ------------------------------------------------------------------
+    # 1. PERSISTENCE
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _encode_vec(vec):
+        return base64.b64encode(np.asarray(vec, dtype=np.float32).tobytes()).decode("ascii")
+
+    @staticmethod
+    def _decode_vec(blob):
+        return np.frombuffer(base64.b64decode(blob), dtype=np.float32)
+
+    def _read_disk(self):
+        """Entries currently on disk, in LRU order (vectors decoded)."""
+        entries = OrderedDict()
+        self._mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        for key, entry in (read_json(self.path, {}) or {}).get("entries", []):
+            entry["vector"] = self._decode_vec(entry["vector"])
+            entries[key] = entry
+        return entries
+
+    def _merge(self, disk):
+        """Applies this session's unsaved entries on top of the on-disk ones."""
+        for key in self._pending:
+            if key in self._entries: disk[key] = self._entries[key]
+        return OrderedDict(sorted(disk.items(), key=lambda kv: kv[1].get("used", kv[1]["created"])))
+
+    def _load(self):
+        """Restores entries from disk, skipping expired ones."""
+        try:
+            self._entries = self._merge(self._read_disk())
+            self._evict()
+        except Exception as e:
+            print(f"Answer cache load error: {e}")
+            self._entries = OrderedDict()
+
+    def _refresh(self):
+        """Reloads when another session has saved since this one last read the file."""
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if mtime != self._mtime: self._load()
+
+    def save(self):
+        """Merges this session's new entries into the file (in LRU order)."""
+        try:
+            with file_lock(self.path):
+                self._entries = self._merge(self._read_disk())
+                self._evict() # Capacity covers every session's entries
+                entries = [[k, {**e, "vector": self._encode_vec(e["vector"])}] for k, e in self._entries.items()]
+                write_json_atomic(self.path, {"entries": entries})
+                self._mtime = os.path.getmtime(self.path)
+            self._pending = set()
+            self._last_save = time.time()
+            return True
+        except Exception as e:
+            print(f"Answer cache save error: {e}")
+            return False
+
+    def _save_debounced(self):
+        """Saves pending entries unless the file was written less than `save_interval_s` ago."""
+        if self._pending and time.time() - self._last_save >= self.save_interval_s:
+            self.save()
+
+    def clear(self):
+        """Drops all entries (every session's) from memory and disk."""
+        self._entries = OrderedDict()
+        self._pending = set()
+        self.hits = self.misses = 0
+        with file_lock(self.path):
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        self._mtime = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # 2. EVICTION (TTL + LRU)
+    # ------------------------------------------------------------------
+
+    def _evict(self):
+        """Removes expired entries, then trims to capacity from the LRU end."""
+        cutoff = time.time() - self.ttl_hours * 3600
+        for key in [k for k, e in self._entries.items() if e["created"] < cutoff]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # 3. LOOKUP & STORE
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def conversation_key(chat_history, query="", turns=5):
+        """
+        Hash of the chat turns that go into the prompt alongside the query.
+
+        Mirrors the history cleaning in `OllamaService._build_rag_messages`
+        (HTML stripped, the pending query dropped) and the packer's five-turn
+        cap, so two threads only share answers when the LLM saw the same turns.
+
+        Returns:
+            str: '' for a fresh conversation, otherwise a short digest.
+        """
+        history = []
+        for msg in chat_history or []:
+            if msg.get("role") not in ("user", "assistant"): continue
+            content = re.sub(r'<[^>]+>', '', str(msg.get("content", ""))).strip()
+            if content: history.append(f"{msg['role']}:{content}")
+        if history and history[-1] == f"user:{query.strip()}":
+            history.pop()
+        if not history: return ""
+        return hashlib.md5("\n".join(history[-turns:]).encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _scope_key(index_version, chunk_ids, model_name, conversation=""):
+        """The exact-match part of the key: same index, same evidence, same model, same recent turns."""
+        return f"{index_version}|{model_name}|{conversation}|{','.join(str(c) for c in sorted(chunk_ids))}"
+
+    def lookup(self, query_vec, index_version, chunk_ids, model_name, conversation=""):
+        """
+        Finds a cached answer for a semantically equivalent query.
+
+        Args:
+            query_vec (array-like): Embedding of the incoming query.
+            index_version (str): `KnowledgeBase.index_version` at query time.
+            chunk_ids (list[int]): Ids of the chunks retrieval returned.
+            model_name (str): Active chat model.
+            conversation (str): `conversation_key` of the chat history sent with the query.
+
+        Returns:
+            dict | None: The cached entry (with 'answer', 'stats', 'similarity') or None.
+        """
+        if query_vec is None or not index_version: return None
+        self._save_debounced()
+        self._refresh()
+        self._evict()
+        scope = self._scope_key(index_version, chunk_ids, model_name, conversation)
+        candidates = [(k, e) for k, e in self._entries.items() if e["scope"] == scope]
+        if not candidates:
+            self.misses += 1
+            return None
+
+        # Vectorized cosine similarity against every candidate in the same scope
+        q = np.asarray(query_vec, dtype=np.float32)
+        matrix = np.stack([e["vector"] for _, e in candidates])
+        sims = matrix @ q / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(q) + 1e-9)
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        key, entry = candidates[best]
+        self._entries.move_to_end(key) # Mark as most recently used
+        entry["hits"] = entry.get("hits", 0) + 1
+        entry["used"] = time.time()
+        self._pending.add(key)
+        self.hits += 1
+        return {**entry, "similarity": round(float(sims[best]), 4)}
+
+    def store(self, query, query_vec, index_version, chunk_ids, model_name, answer, stats=None, conversation=""):
+        """Adds a freshly generated answer to the cache and persists it (debounced)."""
+        if query_vec is None or not index_version or not answer: return
+        scope = self._scope_key(index_version, chunk_ids, model_name, conversation)
+        key = f"{scope}|{query.strip().lower()}"
+        self._entries[key] = {
+            "query": query,
+            "scope": scope,
+            "vector": np.asarray(query_vec, dtype=np.float32),
+            "answer": answer,
+            "stats": stats or {},
+            "created": time.time(),
+            "used": time.time(),
+            "hits": 0
+        }
+        self._entries.move_to_end(key)
+        self._pending.add(key)
+        self._evict()
+        self._save_debounced()
+
+    @staticmethod
+    def replay(entry, words_per_chunk=8):
+        """
+        Streams a cached answer back in small word groups so the UI renders it
+        exactly like a live generation (just much faster).
+        """
+        words = entry["answer"].split(" ")
+        for i in range(0, len(words), words_per_chunk):
+            chunk = " ".join(words[i:i + words_per_chunk])
+            yield chunk + (" " if i + words_per_chunk < len(words) else "")
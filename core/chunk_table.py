@@ -0,0 +1,460 @@
+"""
+Chunk Table — Columnar Storage for Chunk Metadata
+=================================================
+
+Architecture Rationale:
+-----------------------
+`documents_metadata` used to be a Python list with one dict per chunk:
+`{'text', 'file', 'full_path', 'page', 'x', 'y', 'z', 'cluster', ...}`. Each
+of those dicts carries its own hash table and key pointers (~1 KB per chunk
+before any text), and the same filename/path string references are repeated
+for every chunk. At a million chunks that is gigabytes of bookkeeping, and
+every "which chunks belong to file X / cluster Y?" question was a linear scan.
+
+The table stores the same information column by column:
+1. **NumPy Columns**: file id, path id, page, x/y/z, cluster and text
+   offsets are typed arrays (4-8 bytes per value instead of a boxed object).
+2. **Interning**: Filenames, paths and document-store hashes are stored once
+   and referenced by integer id.
+3. **Indexes**: `rows_for_file()` and `rows_for_cluster()` are answered from
+   lazily built file -> rows and cluster -> rows maps, rebuilt only after
+   the underlying column changes.
+4. **Compatible Views**: Indexing or iterating the table yields
+   `ChunkRecord` views (`__slots__`, two fields) that behave like the old
+   dicts — `m['file']`, `m.get('cluster')`, `m['x'] = ...`, `m.copy()` —
+   so the UI and older call sites keep working unchanged.
+
+Developer Note:
+Keys outside the fixed schema (rare) are kept in a sparse per-row dict, so
+arbitrary metadata still round-trips through `to_records()`.
+"""
+
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ("text", "file", "full_path", "page", "x", "y", "z", "cluster", "src", "start", "end")
+_COORDS = ("x", "y", "z")
+_NO_ID = -1
+
+
+class _Column:
+    """Growable NumPy array (amortized O(1) append by capacity doubling)."""
+
+    __slots__ = ("data", "size", "fill")
+
+    def __init__(self, dtype, fill, capacity=64):
+        self.data = np.full(capacity, fill, dtype=dtype)
+        self.size = 0
+        self.fill = fill
+
+    def _reserve(self, n):
+        if n <= len(self.data): return
+        grown = np.full(max(n, 2 * len(self.data)), self.fill, dtype=self.data.dtype)
+        grown[:self.size] = self.data[:self.size]
+        self.data = grown
+
+    def append(self, value):
+        self._reserve(self.size + 1)
+        self.data[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        self._reserve(self.size + len(values))
+        self.data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    @property
+    def values(self):
+        """Live view of the filled part (valid until the next append)."""
+        return self.data[:self.size]
+
+
+class ChunkRecord(Mapping):
+    """A dict-like view of one row of a ChunkTable. Writes go to the table."""
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._table.get_value(self._row, key)
+
+    def __setitem__(self, key, value):
+        self._table.set_value(self._row, key, value)
+
+    def __iter__(self):
+        return iter(self._table.keys_of(self._row))
+
+    def __len__(self):
+        return len(self._table.keys_of(self._row))
+
+    def __contains__(self, key):
+        return self._table.get_value(self._row, key, None) is not None
+
+    def copy(self):
+        """Detached plain dict (what `documents_metadata[i].copy()` used to return)."""
+        return self._table.record(self._row)
+
+    def __repr__(self):
+        return f"ChunkRecord({self.copy()!r})"
+
+
+class ChunkTable(Sequence):
+    """Columnar replacement for the list-of-dicts chunk metadata."""
+
+    def __init__(self):
+        self.texts = []                     # Python strings; the only per-row objects
+        self.files, self._file_ids = [], {} # Interned filenames
+        self.paths, self._path_ids = [], {} # Interned full paths
+        self.sources, self._src_ids = [], {} # Interned DocumentStore hashes
+        self._file = _Column(np.int32, _NO_ID)
+        self._path = _Column(np.int32, _NO_ID)
+        self._page = _Column(np.int32, _NO_ID)
+        self._x = _Column(np.float32, np.nan)
+        self._y = _Column(np.float32, np.nan)
+        self._z = _Column(np.float32, np.nan)
+        self._cluster = _Column(np.int32, _NO_ID)
+        self._src = _Column(np.int32, _NO_ID)
+        self._start = _Column(np.int32, _NO_ID)
+        self._end = _Column(np.int32, _NO_ID)
+        self._page_labels = {} # row -> non-integer page label (e.g. 'Rows 1-100')
+        self._extra = {}       # row -> {key: value} for keys outside FIELDS
+        self._file_index = None    # file id -> row array (rebuilt lazily)
+        self._cluster_index = None # cluster id -> row array (rebuilt lazily)
+        self._src_index = None     # stored page id -> row array (rebuilt lazily)
+
+    @classmethod
+    def from_records(cls, records):
+        """Builds a table from dicts (or another table / any iterable of mappings)."""
+        table = cls()
+        table.extend(records)
+        return table
+
+    # ------------------------------------------------------------------
+    # 1. INTERNING
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _intern(value, values, ids):
+        if value is None: return _NO_ID
+        i = ids.get(value)
+        if i is None:
+            i = ids[value] = len(values)
+            values.append(value)
+        return i
+
+    def file_id(self, filename):
+        """Interned id of a filename, or -1 if no chunk belongs to it."""
+        return self._file_ids.get(filename, _NO_ID)
+
+    # ------------------------------------------------------------------
+    # 2. WRITES
+    # ------------------------------------------------------------------
+
+    def append(self, record):
+        row = len(self.texts)
+        self.texts.append(record.get("text"))
+        self._file.append(self._intern(record.get("file"), self.files, self._file_ids))
+        self._path.append(self._intern(record.get("full_path"), self.paths, self._path_ids))
+        self._set_page(row, record.get("page"), append=True)
+        for key, col in zip(_COORDS, (self._x, self._y, self._z)):
+            value = record.get(key)
+            col.append(np.nan if value is None else value)
+        cluster = record.get("cluster")
+        self._cluster.append(_NO_ID if cluster is None else cluster)
+        self._src.append(self._intern(record.get("src"), self.sources, self._src_ids))
+        self._start.append(record.get("start", _NO_ID))
+        self._end.append(record.get("end", _NO_ID))
+        extra = {k: v for k, v in record.items() if k not in FIELDS}
+        if extra: self._extra[row] = extra
+        self._file_index = self._cluster_index = self._src_index = None
+
+    def extend(self, records):
+        if isinstance(records, ChunkTable):
+            self._extend_table(records)
+            return
+        for record in records:
+            self.append(record)
+
+    def _extend_table(self, other):
+        """Appends another table column-wise, re-mapping its interned ids onto ours."""
+        offset = len(self)
+        remap = lambda values, own, ids: np.array(
+            [self._intern(v, own, ids) for v in values] + [_NO_ID], dtype=np.int32)
+        file_map = remap(other.files, self.files, self._file_ids)
+        path_map = remap(other.paths, self.paths, self._path_ids)
+        src_map = remap(other.sources, self.sources, self._src_ids)
+        self.texts.extend(other.texts)
+        # Index -1 picks the trailing _NO_ID, so unset ids stay unset
+        self._file.extend(file_map[other._file.values])
+        self._path.extend(path_map[other._path.values])
+        self._src.extend(src_map[other._src.values])
+        for name in ("_page", "_x", "_y", "_z", "_cluster", "_start", "_end"):
+            getattr(self, name).extend(getattr(other, name).values)
+        for row, label in other._page_labels.items(): self._page_labels[offset + row] = label
+        for row, extra in other._extra.items(): self._extra[offset + row] = dict(extra)
+        self._file_index = self._cluster_index = self._src_index = None
+
+    def _set_page(self, row, page, append=False):
+        is_int = isinstance(page, (int, np.integer)) and not isinstance(page, bool) and 0 <= page < 2**31
+        if append: self._page.append(page if is_int else _NO_ID)
+        else: self._page.data[row] = page if is_int else _NO_ID
+        if is_int: self._page_labels.pop(row, None)
+        else: self._page_labels[row] = page
+
+    def set_value(self, row, key, value):
+        if key == "text": self.texts[row] = value
+        elif key == "file":
+            self._file.data[row] = self._intern(value, self.files, self._file_ids)
+            self._file_index = None
+        elif key == "full_path": self._path.data[row] = self._intern(value, self.paths, self._path_ids)
+        elif key == "page": self._set_page(row, value)
+        elif key in _COORDS: self._coord(key).data[row] = np.nan if value is None else value
+        elif key == "cluster":
+            self._cluster.data[row] = _NO_ID if value is None else value
+            self._cluster_index = None
+        elif key == "src":
+            self._src.data[row] = self._intern(value, self.sources, self._src_ids)
+            self._src_index = None
+        elif key == "start":
+            self._start.data[row] = value
+            self._src_index = None
+        elif key == "end":
+            self._end.data[row] = value
+            self._src_index = None
+        else: self._extra.setdefault(row, {})[key] = value
+
+    def set_clusters(self, rows, cluster_id):
+        """Vectorized cluster assignment (e.g. propagating a document's cluster to its chunks)."""
+        self._cluster.values[rows] = cluster_id
+        self._cluster_index = None
+
+    def set_coords(self, coords, clusters=None):
+        """Writes (n, 3) coordinates (and optionally cluster ids) for every row at once."""
+        coords = np.round(np.asarray(coords, dtype=np.float64), 4)
+        self._x.values[:] = coords[:, 0]
+        self._y.values[:] = coords[:, 1]
+        self._z.values[:] = coords[:, 2]
+        if clusters is not None:
+            self._cluster.values[:] = clusters
+            self._cluster_index = None
+
+    def take(self, rows):
+        """New table holding only `rows` (in the given order); columns are copied, not re-parsed."""
+        rows = np.asarray(rows, dtype=np.int64)
+        table = ChunkTable()
+        table.texts = [self.texts[r] for r in rows]
+        table.files, table._file_ids = list(self.files), dict(self._file_ids)
+        table.paths, table._path_ids = list(self.paths), dict(self._path_ids)
+        table.sources, table._src_ids = list(self.sources), dict(self._src_ids)
+        for name in ("_file", "_path", "_page", "_x", "_y", "_z", "_cluster", "_src", "_start", "_end"):
+            getattr(table, name).extend(getattr(self, name).values[rows])
+        for new_row, old_row in enumerate(rows.tolist()):
+            if old_row in self._page_labels: table._page_labels[new_row] = self._page_labels[old_row]
+            if old_row in self._extra: table._extra[new_row] = dict(self._extra[old_row])
+        return table
+
+    # ------------------------------------------------------------------
+    # 3. READS
+    # ------------------------------------------------------------------
+
+    def _coord(self, key):
+        return {"x": self._x, "y": self._y, "z": self._z}[key]
+
+    def get_value(self, row, key, default=KeyError):
+        if key == "text": value = self.texts[row]
+        elif key == "file": value = self._lookup(self.files, self._file.data[row])
+        elif key == "full_path": value = self._lookup(self.paths, self._path.data[row])
+        elif key == "page": value = self._page_labels[row] if row in self._page_labels else int(self._page.data[row])
+        elif key in _COORDS:
+            v = self._coord(key).data[row]
+            value = None if np.isnan(v) else round(float(v), 4)
+        elif key == "cluster":
+            v = self._cluster.data[row]
+            value = None if v == _NO_ID else int(v)
+        elif key == "src": value = self._lookup(self.sources, self._src.data[row])
+        elif key in ("start", "end"):
+            v = (self._start if key == "start" else self._end).data[row]
+            value = None if v == _NO_ID else int(v)
+        else: value = self._extra.get(row, {}).get(key)
+        if value is None:
+            if default is KeyError: raise KeyError(key)
+            return default
+        return value
+
+    @staticmethod
+    def _lookup(values, i):
+        return None if i == _NO_ID else values[i]
+
+    def keys_of(self, row):
+        keys = [k for k in FIELDS if self.get_value(row, k, None) is not None]
+        return keys + list(self._extra.get(row, {}))
+
+    def record(self, row):
+        """One row as a plain dict."""
+        return {k: self.get_value(row, k) for k in self.keys_of(row)}
+
+    def to_records(self, omit_stored_text=False):
+        """
+        All rows as plain dicts (JSON-serializable).
+
+        Args:
+            omit_stored_text (bool): Drop 'text' from rows that point into the
+                DocumentStore (they can be sliced back out on load).
+        """
+        records = [self.record(i) for i in range(len(self))]
+        if omit_stored_text:
+            for r in records:
+                if 'src' in r: r.pop('text', None)
+        return records
+
+    def to_frame(self):
+        """Builds a DataFrame straight from the columns (no per-row dicts)."""
+        n = len(self)
+        if not n: return pd.DataFrame()
+        pages = self._page.values.astype(object)
+        for row, label in self._page_labels.items(): pages[row] = label
+        file_names = np.array(self.files + [None], dtype=object)
+        path_names = np.array(self.paths + [None], dtype=object)
+        frame = {
+            "text": self.texts,
+            "file": file_names[self._file.values],
+            "full_path": path_names[self._path.values],
+            "page": pages,
+        }
+        for key in _COORDS:
+            frame[key] = np.round(self._coord(key).values.astype(np.float64), 4)
+        frame["cluster"] = pd.array(np.where(self._cluster.values == _NO_ID, None, self._cluster.values), dtype="Int64")
+        return pd.DataFrame(frame)
+
+    @property
+    def file_ids(self):
+        return self._file.values
+
+    @property
+    def clusters(self):
+        return self._cluster.values
+
+    # ------------------------------------------------------------------
+    # 4. INDEXES
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _group(ids):
+        """Groups row numbers by id with one stable sort: {id: rows}."""
+        if not len(ids): return {}
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        cuts = np.flatnonzero(np.diff(sorted_ids)) + 1
+        return {int(g[0]): rows for g, rows in zip(np.split(sorted_ids, cuts), np.split(order, cuts))}
+
+    def rows_for_file(self, filename):
+        """Row numbers of a file's chunks, in document order."""
+        if self._file_index is None: self._file_index = self._group(self._file.values)
+        return self._file_index.get(self.file_id(filename), np.empty(0, dtype=np.int64))
+
+    def rows_for_files(self, filenames):
+        """Sorted row numbers of every chunk of `filenames` (one vectorized pass when many files are selected)."""
+        ids = [i for i in (self.file_id(f) for f in filenames) if i != _NO_ID]
+        if not ids: return np.empty(0, dtype=np.int64)
+        if len(ids) <= 32:
+            return np.sort(np.concatenate([self.rows_for_file(self.files[i]) for i in ids])).astype(np.int64)
+        return np.flatnonzero(np.isin(self._file.values, ids)).astype(np.int64)
+
+    def rows_for_cluster(self, cluster_id):
+        """Row numbers of every chunk in a cluster."""
+        if self._cluster_index is None: self._cluster_index = self._group(self._cluster.values)
+        return self._cluster_index.get(int(cluster_id), np.empty(0, dtype=np.int64))
+
+    def file_names(self):
+        """Filenames with at least one chunk, in first-seen order."""
+        if self._file_index is None: self._file_index = self._group(self._file.values)
+        return [self.files[i] for i in sorted(self._file_index, key=lambda i: self._file_index[i][0]) if i != _NO_ID]
+
+    def cluster_ids(self):
+        """Sorted distinct cluster ids (unassigned rows excluded)."""
+        if self._cluster_index is None: self._cluster_index = self._group(self._cluster.values)
+        return sorted(c for c in self._cluster_index if c != _NO_ID)
+
+    def chunk_counts(self):
+        """{filename: number of chunks} from one bincount over the file ids."""
+        ids = self._file.values
+        counts = np.bincount(ids[ids != _NO_ID], minlength=len(self.files))
+        return {self.files[i]: int(n) for i, n in enumerate(counts) if n}
+
+    def _pages(self, rows):
+        """Page values of `rows`: (integer pages array, list of non-integer labels)."""
+        labels = [self._page_labels[r] for r in rows.tolist() if r in self._page_labels] if self._page_labels else []
+        pages = self._page.values[rows]
+        return pages[pages != _NO_ID], labels
+
+    def max_page(self, rows):
+        """Highest page among `rows` (labels such as 'Rows 1-100' compare as strings)."""
+        pages, labels = self._pages(rows)
+        if labels: return max([str(p) for p in pages.tolist()] + [str(l) for l in labels])
+        return int(pages.max()) if len(pages) else None
+
+    def distinct_pages(self, rows):
+        """Number of distinct pages among `rows`."""
+        pages, labels = self._pages(rows)
+        return len(set(str(p) for p in np.unique(pages).tolist()) | set(str(l) for l in labels))
+
+    def chunk_bounds(self, src):
+        """
+        Sorted (starts, ends) character offsets of every chunk cut from stored page `src`.
+
+        This is the chunk-adjacency index: a chunk's neighbours are the
+        entries just before and after its own start. The page -> rows map is
+        built once (lazily); identical pages share a `src` hash and produce
+        identical offsets, so duplicates collapse.
+        """
+        if getattr(self, "_src_index", None) is None: self._src_index = self._group(self._src.values)
+        src_id = self._src_ids.get(src)
+        rows = self._src_index.get(src_id) if src_id is not None else None
+        if rows is None: return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        bounds = np.unique(np.stack([self._start.values[rows], self._end.values[rows]], axis=1), axis=0) # Sorted by start
+        return bounds[:, 0], bounds[:, 1]
+
+    def rows_in_page_range(self, rows, first=None, last=None):
+        """The subset of `rows` whose integer page lies in [first, last] (labelled rows never match)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        pages = self._page.values[rows]
+        keep = pages != _NO_ID
+        if first is not None: keep &= pages >= int(first)
+        if last is not None: keep &= pages <= int(last)
+        return rows[keep]
+
+    def full_path_of(self, filename, default=None):
+        """Full path recorded for a file's first chunk."""
+        rows = self.rows_for_file(filename)
+        if not len(rows): return default
+        return self.get_value(int(rows[0]), "full_path", default)
+
+    # ------------------------------------------------------------------
+    # 5. SEQUENCE PROTOCOL
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [ChunkRecord(self, r) for r in range(*i.indices(len(self)))]
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError("chunk index out of range")
+        return ChunkRecord(self, i)
+
+    def __iter__(self):
+        for r in range(len(self)):
+            yield ChunkRecord(self, r)
+
+    def nbytes(self):
+        """Approximate memory held by the columns (excluding chunk text)."""
+        cols = (self._file, self._path, self._page, self._x, self._y, self._z,
+                self._cluster, self._src, self._start, self._end)
+        return sum(c.data.nbytes for c in cols)
@@ -31,7 +31,51 @@ class ConfigManager:
         "ingestion_size_limit_mb": 50,
         "ingestion_size_limit_active": False,
         "chat_model": "gemma4:e4b",
-        "embedding_model": "mxbai-embed-large"
+        "embedding_model": "mxbai-embed-large",
+        "context_token_budget": 3000,
+        "ollama_keep_alive": "30m",
+        "ollama_num_ctx": 8192,
+        "answer_cache_enabled": True,
+        "answer_cache_threshold": 0.95,
+        "answer_cache_ttl_hours": 72,
+        "answer_cache_max_entries": 500,
+        "summary_max_workers": 4,
+        "summary_section_chunks": 10,
+        "pdf_backend": "auto",
+        "pdf_workers": 0,
+        "extraction_cache_enabled": True,
+        "extraction_cache_mb": 512,
+        "scan_include": "",
+        "scan_exclude": ".git, node_modules, __pycache__, ~$*",
+        "scan_workers": 8,
+        "watch_mode_enabled": False,
+        "watch_debounce_seconds": 2.0,
+        "watch_poll_seconds": 5.0,
+        "index_snapshot_keep": 3,
+        "document_gc_grace_minutes": 60,
+        "vector_quantization": "none",
+        "quantization_oversample": 10,
+        "embedding_reduction": "none",
+        "embedding_reduced_dim": 256,
+        "shard_strategy": "none",
+        "shard_max_chunks": 20000,
+        "index_server_enabled": False,
+        "index_server_url": "http://127.0.0.1:8765",
+        "embed_batching_enabled": True,
+        "embed_batch_max": 16,
+        "embed_batch_wait_ms": 5.0,
+        "mmr_lambda": 1.0,
+        "mmr_candidates": 4,
+        "merge_adjacent_chunks": True,
+        "context_expansion": "none",
+        "expansion_window_chars": 600,
+        "expansion_neighbors": 1,
+        "expansion_max_chars": 2400,
+        "similarity_threshold_mode": "auto",
+        "similarity_min_results": 2,
+        "query_profiling_enabled": True,
+        "query_profile_log": "data/logs/query_profile.jsonl",
+        "query_profile_log_max_mb": 5
     }
     
     def __init__(self, config_path="data/settings.json"):
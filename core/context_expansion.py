@@ -0,0 +1,120 @@
+"""
+Context Expansion — Small-Chunk Matching, Large-Context Answering
+=================================================================
+
+Architecture Rationale:
+-----------------------
+Small chunks embed precisely (one idea per vector) but answer poorly: a
+600-character window often cuts the sentence that holds the actual answer.
+Making the chunks bigger would blur the embedding index. Instead we keep
+matching on small chunks and widen each *hit* before it is sent to the LLM:
+
+1. **window**: `expansion_chars` characters on each side of the hit.
+2. **neighbors**: the `expansion_neighbors` chunks before and after the hit,
+   found through the chunk-adjacency index (`ChunkTable.chunk_bounds`:
+   sorted chunk offsets per stored page) with one binary search.
+3. **parent**: the whole stored page (the hit's parent section).
+
+Every expansion is capped at `expansion_max_chars` around the hit, snapped
+to sentence (or at least word) boundaries, and cut from the page text kept
+in the DocumentStore, so the index itself never stores the larger context.
+Overlapping expansions of neighbouring hits are then merged
+(`merge_adjacent_chunks`), so no page text is sent twice.
+
+Developer Note:
+Chunk offsets point into the *cleaned* page text (the form that was
+chunked), so that is the text expansions are cut from. Results keep the
+matched chunk in `match_text`.
+"""
+
+import numpy as np
+
+from core.result_diversity import merge_adjacent_chunks
+
+MODES = ("none", "window", "neighbors", "parent")
+_SENTENCE_ENDS = (". ", "! ", "? ")
+
+
+def _snap(page, lo, hi, start, end):
+    """Shrinks [lo, hi) to sentence boundaries (else word boundaries) without cutting into the hit."""
+    if 0 < lo < start: # The page start is already a boundary
+        cuts = [c for c in (page.find(mark, max(0, lo - 2), start) for mark in _SENTENCE_ENDS) if c != -1]
+        if cuts: lo = min(cuts) + 2 # First sentence that starts inside the span
+        else:
+            space = page.find(" ", lo - 1, start)
+            if space != -1: lo = space + 1
+    if end < hi < len(page):
+        cut = max(page.rfind(mark, end, hi) for mark in _SENTENCE_ENDS)
+        if cut != -1: hi = cut + 1 # Last sentence that ends inside the span
+        else:
+            space = page.rfind(" ", end, hi + 1)
+            if space != -1: hi = space
+    return lo, hi
+
+
+def expand_span(page, start, end, mode, chars=600, neighbors=1, max_chars=2400, bounds=None):
+    """
+    Character range [lo, hi) of `page` that an expanded hit covers.
+
+    Args:
+        page (str): The stored page text the chunk offsets refer to.
+        start, end (int): The matched chunk's offsets.
+        mode (str): One of MODES.
+        chars (int): Characters added on each side ('window').
+        neighbors (int): Chunks added on each side ('neighbors').
+        max_chars (int): Cap on the expanded length (centred on the hit).
+        bounds (tuple): (starts, ends) from `ChunkTable.chunk_bounds` ('neighbors').
+    """
+    if mode == "window":
+        lo, hi = start - chars, end + chars
+    elif mode == "neighbors" and bounds is not None and len(bounds[0]):
+        starts, ends = bounds
+        i = int(np.searchsorted(starts, start))
+        j = int(np.searchsorted(starts, end, side="left")) - 1 # Last chunk starting inside the hit
+        lo = int(starts[max(0, i - neighbors)])
+        hi = int(ends[min(len(ends) - 1, max(i, j) + neighbors)])
+    elif mode == "parent":
+        lo, hi = 0, len(page)
+    else:
+        return start, end
+    lo, hi = max(0, min(lo, start)), min(len(page), max(hi, end))
+
+    if max_chars and hi - lo > max_chars:
+        # Keep the hit in the middle of the allowed span; room unused on one side goes to the other
+        room = max(0, max_chars - (end - start))
+        capped_lo = max(lo, start - room // 2)
+        hi = min(hi, end + room - (start - capped_lo))
+        lo = min(max(lo, min(capped_lo, hi - max_chars)), start)
+    return _snap(page, lo, hi, start, end) if mode != "neighbors" else (lo, hi)
+
+
+def expand_results(results, page_of, bounds_of, mode, chars=600, neighbors=1, max_chars=2400, dedupe=True):
+    """
+    Widens each hit to its window / neighbours / parent page.
+
+    Args:
+        results (list[dict]): Search results (best first) with src/start/end offsets.
+        page_of (callable): src hash -> stored page text (None if unavailable).
+        bounds_of (callable): src hash -> (starts, ends) chunk offsets.
+        mode (str): One of MODES ('none' returns the results unchanged).
+        dedupe (bool): Merge overlapping expansions of the same page.
+
+    Returns:
+        list[dict]: Expanded results; results without offsets pass through unchanged.
+    """
+    if mode not in MODES or mode == "none" or not results: return results
+    pages, expanded = {}, []
+    for r in results:
+        src, start, end = r.get("src"), r.get("start"), r.get("end")
+        if src is None or start is None or end is None or start < 0:
+            expanded.append(r)
+            continue
+        if src not in pages: pages[src] = page_of(src)
+        page = pages[src]
+        if not page or page[start:end] != r.get("text"):
+            expanded.append(r) # Offsets do not describe this text (e.g. the store was rebuilt)
+            continue
+        bounds = bounds_of(src) if mode == "neighbors" else None
+        lo, hi = expand_span(page, start, end, mode, chars, neighbors, max_chars, bounds)
+        expanded.append(dict(r, text=page[lo:hi], start=lo, end=hi, match_text=r["text"]))
+    return merge_adjacent_chunks(expanded) if dedupe else expanded
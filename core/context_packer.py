@@ -0,0 +1,277 @@
+"""
+Context Packer — Token-Budgeted Prompt Assembly
+===============================================
+
+Architecture Rationale:
+-----------------------
+Every token placed in the system prompt must be evaluated by the LLM before it
+can emit its first word ("prompt evaluation"). On large vaults the naive prompt
+(full file manifest + every retrieved snippet + five turns of history) grows
+without bound, and time-to-first-token grows with it.
+
+The ContextPacker sits between retrieval (`KnowledgeBase`) and generation
+(`OllamaService`). It treats the prompt as a fixed-size container and decides
+what earns a place in it:
+1. **Manifest**: Listed in full when small; collapsed into a per-extension
+   summary when the vault is large.
+2. **History**: Most recent turns first, oldest dropped when over budget.
+3. **Snippets**: Highest-scoring first, with duplicate and overlapping
+   sliding-window chunks merged so the same sentence is never paid for twice.
+
+Unused manifest/history budget 'rolls over' to the snippets, because retrieved
+evidence is the most valuable content for grounding.
+
+Theory Note: Token Estimation
+-----------------------------
+We do not ship a tokenizer for every Ollama model. For English prose, BPE
+tokenizers average roughly 4 characters per token, which is accurate enough
+for budgeting (we only need to be in the right ballpark, not exact).
+"""
+
+import hashlib
+import os
+
+# Characters-per-token heuristic used for budgeting (see Theory Note above).
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Approximates the token count of a string using the chars/token heuristic."""
+    if not text: return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def format_snippet(snippet):
+    """
+    Renders a retrieval result as a labeled context block for the LLM.
+
+    Args:
+        snippet (dict): A search result with 'file', 'page', 'full_path' and 'text'.
+
+    Returns:
+        str: The snippet with its '[Source: ...]' citation header.
+    """
+    if snippet.get("file") is None:
+        return f"{snippet['text']}\n"
+    return f"[Source: {snippet['file']} P{snippet.get('page', '?')} | Full Path: {snippet.get('full_path') or 'N/A'}]\n{snippet['text']}\n"
+
+
+class ContextPacker:
+    """
+    Fits manifest, retrieved snippets and chat history into a token budget.
+    """
+
+    def __init__(self, token_budget=3000, manifest_share=0.15, history_share=0.25,
+                 min_snippet_tokens=48):
+        """
+        Configures the budget split between the three prompt components.
+
+        Args:
+            token_budget (int): Total estimated tokens allowed for packed context.
+            manifest_share (float): Max fraction of the budget spent on the file manifest.
+            history_share (float): Max fraction of the budget spent on chat history.
+            min_snippet_tokens (int): Smallest truncated snippet worth including.
+        """
+        self.token_budget = token_budget
+        self.manifest_share = manifest_share
+        self.history_share = history_share
+        self.min_snippet_tokens = min_snippet_tokens
+
+    # ------------------------------------------------------------------
+    # 1. MANIFEST
+    # ------------------------------------------------------------------
+
+    def pack_manifest(self, file_manifest, budget):
+        """
+        Lists the manifest in full if it fits, otherwise collapses the tail.
+
+        Developer Note:
+        The output only depends on the manifest itself (never on the query), so
+        the same vault always produces the same manifest string. This keeps the
+        system prompt byte-identical between turns.
+
+        Returns:
+            tuple: (manifest_str, files_listed)
+        """
+        if not file_manifest: return "", 0
+        full = ", ".join(file_manifest)
+        if estimate_tokens(full) <= budget:
+            return full, len(file_manifest)
+
+        # Reserve room for the '(+N more: ...)' tail before listing names
+        ext_counts = {}
+        for f in file_manifest:
+            ext = os.path.splitext(f)[1].lower() or "no extension"
+            ext_counts[ext] = ext_counts.get(ext, 0) + 1
+        ext_summary = ", ".join(f"{n} {ext}" for ext, n in sorted(ext_counts.items(), key=lambda kv: -kv[1]))
+        tail_reserve = estimate_tokens(f" (+{len(file_manifest)} more: {ext_summary})")
+
+        listed, used = [], 0
+        for f in file_manifest:
+            cost = estimate_tokens(f + ", ")
+            if used + cost > budget - tail_reserve: break
+            listed.append(f)
+            used += cost
+
+        remaining = file_manifest[len(listed):]
+        rem_counts = {}
+        for f in remaining:
+            ext = os.path.splitext(f)[1].lower() or "no extension"
+            rem_counts[ext] = rem_counts.get(ext, 0) + 1
+        rem_summary = ", ".join(f"{n} {ext}" for ext, n in sorted(rem_counts.items(), key=lambda kv: -kv[1]))
+
+        head = ", ".join(listed)
+        sep = ", " if head else ""
+        return f"{head}{sep}(+{len(remaining)} more: {rem_summary})", len(listed)
+
+    # ------------------------------------------------------------------
+    # 2. HISTORY
+    # ------------------------------------------------------------------
+
+    def pack_history(self, history, budget, max_turns=5):
+        """
+        Keeps the most recent turns that fit within the budget.
+
+        Args:
+            history (list[dict]): Cleaned {'role', 'content'} messages, oldest first.
+            budget (int): Token allowance for history.
+            max_turns (int): Hard cap on the number of messages retained.
+
+        Returns:
+            list[dict]: Retained messages in chronological order.
+        """
+        kept, used = [], 0
+        for msg in reversed(history[-max_turns:]):
+            cost = estimate_tokens(msg["content"])
+            if used + cost <= budget:
+                kept.append(msg)
+                used += cost
+            elif not kept and budget > self.min_snippet_tokens:
+                # Always keep at least the latest turn, truncated if necessary
+                kept.append({"role": msg["role"], "content": msg["content"][:budget * CHARS_PER_TOKEN] + "…"})
+                break
+            else:
+                break
+        return list(reversed(kept))
+
+    # ------------------------------------------------------------------
+    # 3. SNIPPETS (Deduplication & Greedy Fill)
+    # ------------------------------------------------------------------
+
+    def dedupe_snippets(self, snippets):
+        """
+        Removes duplicate chunks and merges overlapping sliding-window neighbours.
+
+        Theory Note: Overlap Merging
+        ----------------------------
+        Sliding-window chunking repeats `overlap_size` characters between
+        consecutive chunks. When two retrieved chunks come from the same file
+        and page, we look for the start of one inside the other; if the tail of
+        A equals the head of B, they are stitched into a single snippet.
+
+        Returns:
+            tuple: (deduplicated snippets, number of snippets merged or dropped)
+        """
+        seen, unique = set(), []
+        for s in snippets:
+            h = hashlib.md5(s["text"].encode("utf-8")).hexdigest()
+            if h in seen: continue
+            seen.add(h)
+            unique.append(dict(s))
+
+        merged = []
+        for s in unique:
+            absorbed = False
+            for m in merged:
+                if m.get("file") is None or m.get("file") != s.get("file") or m.get("page") != s.get("page"):
+                    continue
+                stitched = self._stitch(m["text"], s["text"])
+                if stitched is not None:
+                    m["text"] = stitched
+                    m["score"] = max(m.get("score", 0), s.get("score", 0))
+                    absorbed = True
+                    break
+            if not absorbed:
+                merged.append(s)
+
+        return merged, len(snippets) - len(merged)
+
+    @staticmethod
+    def _stitch(a, b, probe_len=40):
+        """Returns the union of two overlapping strings, or None if they don't overlap."""
+        if b in a: return a
+        if a in b: return b
+        for first, second in ((a, b), (b, a)):
+            probe = second[:probe_len]
+            idx = first.find(probe)
+            if len(probe) == probe_len and idx >= 0 and second.startswith(first[idx:]):
+                return first + second[len(first) - idx:]
+        return None
+
+    def pack_snippets(self, snippets, budget):
+        """Greedily fills the budget with the highest-scoring snippets."""
+        ordered = sorted(snippets, key=lambda s: s.get("score", 0), reverse=True)
+        kept, used = [], 0
+        for s in ordered:
+            block = format_snippet(s)
+            cost = estimate_tokens(block)
+            if used + cost <= budget:
+                kept.append(s)
+                used += cost
+            else:
+                remaining = budget - used - estimate_tokens(format_snippet({**s, "text": ""}))
+                if remaining >= self.min_snippet_tokens:
+                    kept.append({**s, "text": s["text"][:remaining * CHARS_PER_TOKEN] + "…"})
+                break
+        return kept
+
+    # ------------------------------------------------------------------
+    # 4. ORCHESTRATION
+    # ------------------------------------------------------------------
+
+    def pack(self, snippets, file_manifest=None, history=None):
+        """
+        Packs all three prompt components into the token budget.
+
+        Args:
+            snippets (list[dict] | str): Retrieval results, or a pre-rendered context block.
+            file_manifest (list[str]): All filenames in the Knowledge Base.
+            history (list[dict]): Cleaned chat messages, oldest first.
+
+        Returns:
+            dict: {'context', 'manifest', 'history', 'report'} where 'report'
+            quantifies how many tokens were saved versus the unpacked prompt.
+        """
+        if isinstance(snippets, str):
+            snippets = [{"file": None, "text": snippets, "score": 1.0}] if snippets else []
+        snippets = snippets or []
+        file_manifest = file_manifest or []
+        history = history or []
+
+        # Baseline: what the unpacked prompt would have cost
+        raw_tokens = (estimate_tokens(", ".join(file_manifest))
+                      + sum(estimate_tokens(format_snippet(s)) for s in snippets)
+                      + sum(estimate_tokens(m["content"]) for m in history[-5:]))
+
+        manifest_str, listed = self.pack_manifest(file_manifest, int(self.token_budget * self.manifest_share))
+        packed_history = self.pack_history(history, int(self.token_budget * self.history_share))
+
+        # Rollover: whatever manifest/history didn't use goes to the evidence
+        used = estimate_tokens(manifest_str) + sum(estimate_tokens(m["content"]) for m in packed_history)
+        unique, n_merged = self.dedupe_snippets(snippets)
+        packed_snippets = self.pack_snippets(unique, max(0, self.token_budget - used))
+        context = "\n".join(format_snippet(s) for s in packed_snippets)
+
+        packed_tokens = used + estimate_tokens(context)
+        report = {
+            "raw_tokens": raw_tokens,
+            "packed_tokens": packed_tokens,
+            "saved_tokens": max(0, raw_tokens - packed_tokens),
+            "snippets_in": len(snippets),
+            "snippets_kept": len(packed_snippets),
+            "snippets_merged": n_merged,
+            "manifest_listed": listed,
+            "manifest_total": len(file_manifest),
+            "history_kept": len(packed_history)
+        }
+        return {"context": context, "manifest": manifest_str, "history": packed_history, "report": report}
@@ -0,0 +1,224 @@
+"""
+Document Store — Content-Addressed, Compressed Raw Text on Disk
+===============================================================
+
+Architecture Rationale:
+-----------------------
+The KnowledgeBase used to keep the full raw text of every file in the
+`file_contents` dict, and `save_to_disk` wrote that dict into `metadata.json`
+next to every chunk's text — the corpus was held in RAM and stored twice.
+
+This store moves raw text out of memory and out of the JSON:
+1. **Content Addressing**: Each text is stored once under the SHA-1 of its
+   UTF-8 bytes (the same fingerprint `get_document_hash` always used, so
+   summary-store keys stay valid). Identical files are stored once.
+2. **Compression**: Blobs are zlib-compressed inside a single SQLite file
+   (`data/documents.sqlite`) — standard library only, atomic writes, and safe
+   to share between the UI thread and watch-mode workers.
+3. **Lazy Reads**: `DocumentTextMap` is a drop-in replacement for the old
+   dict. It only keeps `filename -> hash` in memory and decompresses a text
+   when someone actually reads it (summaries, document records). A small
+   LRU keeps recently read texts warm.
+
+Shared Store Note:
+Every session and the watch-mode indexer write to the same file. A blob
+that is not yet referenced by any snapshot may belong to another session's
+build in progress, so `gc` only collects unreferenced blobs that nobody has
+written (or re-written) for `grace_s` seconds.
+
+Chunk Offsets:
+Chunks are substrings of their page's *cleaned* text, which is also stored
+here. Persisted chunk metadata therefore carries `(src, start, end)` instead
+of a second copy of its text; `load_from_disk` slices the text back out.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+def text_hash(text):
+    """SHA-1 of the UTF-8 bytes; the store's content address."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class DocumentStore:
+    """SQLite-backed, zlib-compressed text blobs keyed by content hash."""
+
+    def __init__(self, path="data/documents.sqlite", cache_chars=16_000_000, level=6):
+        """
+        Args:
+            path (str): SQLite database file.
+            cache_chars (int): Characters of decompressed text kept in the LRU.
+            level (int): zlib compression level (1 = fastest, 9 = smallest).
+        """
+        self.path = path
+        self.level = level
+        self.cache_chars = cache_chars
+        self._cache = OrderedDict()
+        self._cached_chars = 0
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # One shared connection; the lock serializes access across threads.
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, chars INTEGER, data BLOB)")
+            columns = [r[1] for r in self._conn.execute("PRAGMA table_info(blobs)")]
+            if "written" not in columns: # Stores from before the GC grace period
+                self._conn.execute("ALTER TABLE blobs ADD COLUMN written REAL")
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # 1. READ / WRITE
+    # ------------------------------------------------------------------
+
+    def put(self, text, commit=True):
+        """
+        Stores a text (no-op if already present) and returns its hash.
+
+        Pass `commit=False` when writing many blobs in a row (e.g. one per
+        page) and call `commit()` once afterwards; a SQLite commit is a disk
+        sync, so committing per page would dominate ingestion time.
+        """
+        h = text_hash(text)
+        now = time.time()
+        with self._lock:
+            # Re-writing an existing blob refreshes its timestamp, so `gc` spares it for a while
+            touched = self._conn.execute("UPDATE blobs SET written = ? WHERE hash = ?", (now, h)).rowcount
+            if not touched:
+                self._conn.execute("INSERT OR IGNORE INTO blobs (hash, chars, data, written) VALUES (?, ?, ?, ?)",
+                                   (h, len(text), zlib.compress(text.encode('utf-8'), self.level), now))
+            if commit: self._conn.commit()
+            if h not in self._cache: self._remember(h, text)
+        return h
+
+    def commit(self):
+        """Makes pending `put(commit=False)` writes durable and visible to other connections."""
+        with self._lock:
+            self._conn.commit()
+
+    def get(self, h, default=None):
+        """Returns the text for a hash (decompressing on a cache miss)."""
+        with self._lock:
+            if h in self._cache:
+                self._cache.move_to_end(h)
+                return self._cache[h]
+            row = self._conn.execute("SELECT data FROM blobs WHERE hash = ?", (h,)).fetchone()
+            if row is None: return default
+            text = zlib.decompress(row[0]).decode('utf-8')
+            self._remember(h, text)
+            return text
+
+    def chars(self, h):
+        """Length of a stored text without decompressing it."""
+        with self._lock:
+            if h in self._cache: return len(self._cache[h])
+            row = self._conn.execute("SELECT chars FROM blobs WHERE hash = ?", (h,)).fetchone()
+        return row[0] if row else 0
+
+    def missing(self, hashes):
+        """The subset of `hashes` with no stored text."""
+        wanted = list(set(hashes))
+        found = set()
+        with self._lock:
+            for i in range(0, len(wanted), 500): # Stay under SQLite's bound-parameter limit
+                part = wanted[i:i + 500]
+                found.update(r[0] for r in self._conn.execute(
+                    f"SELECT hash FROM blobs WHERE hash IN ({','.join('?' * len(part))})", part))
+        return set(wanted) - found
+
+    def _remember(self, h, text):
+        if len(text) > self.cache_chars: return
+        self._cache[h] = text
+        self._cached_chars += len(text)
+        while self._cached_chars > self.cache_chars:
+            _, old = self._cache.popitem(last=False)
+            self._cached_chars -= len(old)
+
+    # ------------------------------------------------------------------
+    # 2. MAINTENANCE
+    # ------------------------------------------------------------------
+
+    def gc(self, keep_hashes, grace_s=3600):
+        """
+        Deletes blobs not in `keep_hashes` that were last written over `grace_s` seconds ago.
+
+        Younger unreferenced blobs may belong to a build that another session
+        has not saved yet. Returns the number removed.
+        """
+        keep = set(keep_hashes)
+        cutoff = time.time() - max(0, grace_s)
+        with self._lock:
+            stored = [r[0] for r in self._conn.execute(
+                "SELECT hash FROM blobs WHERE written IS NULL OR written < ?", (cutoff,))]
+            stale = [h for h in stored if h not in keep]
+            self._conn.executemany("DELETE FROM blobs WHERE hash = ?", [(h,) for h in stale])
+            self._conn.commit()
+            for h in stale:
+                old = self._cache.pop(h, None)
+                if old is not None: self._cached_chars -= len(old)
+        return len(stale)
+
+    def stats(self):
+        """Returns {'blobs', 'raw_chars', 'disk_bytes'} for the UI."""
+        with self._lock:
+            n, chars, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chars), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs").fetchone()
+        return {"blobs": n, "raw_chars": chars, "disk_bytes": size}
+
+
+class DocumentTextMap(MutableMapping):
+    """
+    `filename -> raw text` mapping backed by a DocumentStore.
+
+    Behaves like the old `file_contents` dict (membership, len, keys, get,
+    item assignment), but only the filename -> hash table lives in memory.
+    """
+
+    def __init__(self, store, hashes=None):
+        self.store = store
+        self._hashes = dict(hashes or {})
+
+    def __getitem__(self, filename):
+        return self.store.get(self._hashes[filename], "")
+
+    def __setitem__(self, filename, text):
+        self._hashes[filename] = self.store.put(text)
+
+    def __delitem__(self, filename):
+        del self._hashes[filename]
+
+    def __iter__(self):
+        return iter(self._hashes)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, filename):
+        return filename in self._hashes
+
+    def hash_of(self, filename):
+        """Content hash of a document, without reading its text."""
+        return self._hashes.get(filename)
+
+    def chars(self, filename):
+        return self.store.chars(self._hashes[filename]) if filename in self._hashes else 0
+
+    def adopt(self, other):
+        """Copies entries from another mapping; hashes are shared when both use the same store file."""
+        if isinstance(other, DocumentTextMap) and os.path.abspath(other.store.path) == os.path.abspath(self.store.path):
+            other.store.commit()
+            self._hashes.update(other._hashes)
+        else:
+            for filename, text in other.items():
+                self[filename] = text
+
+    def to_manifest(self):
+        """The serializable part: {filename: hash}."""
+        return dict(self._hashes)
@@ -0,0 +1,127 @@
+"""
+Embedding Batcher — Micro-Batching of Concurrent Query Embeddings
+=================================================================
+
+Architecture Rationale:
+-----------------------
+Each chat turn embeds its query with one HTTP request to Ollama. When several
+users (or the index server's request handlers) query at once, those requests
+queue up inside Ollama and are processed one at a time, although the
+embedding model could encode all of them in a single forward pass.
+
+The batcher sits between `OllamaService.embed_text` and Ollama:
+1. **Submit**: Every caller enqueues its text and receives a `Future`.
+2. **Collect**: A dispatcher thread takes the first waiting text, plus
+   everything queued behind it, up to `max_batch` texts.
+3. **Dispatch**: The whole batch goes out as one `ollama.embed(input=[...])`
+   call; each vector is handed back to its caller's future.
+
+Performance Note (Single-User Latency):
+The dispatcher only waits for more texts (`max_wait_ms`) while the system is
+under concurrent load (the previous batch held more than one text, or
+several are already queued). A lone query from an idle system is sent
+immediately, so batching costs a single user nothing. Under load, texts
+that arrive while a batch is in flight form the next batch by themselves.
+
+Developer Note:
+One batcher is shared by the whole process (`shared_batcher`), because every
+Streamlit session owns its own OllamaService; a per-service batcher would
+never see two users' queries together.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class EmbeddingBatcher:
+    """Groups concurrent single-text embedding requests into batched calls."""
+
+    def __init__(self, embed_many, max_batch=16, max_wait_ms=5.0):
+        """
+        Args:
+            embed_many (callable): (model, list of texts) -> list of vectors.
+            max_batch (int): Most texts sent in one call.
+            max_wait_ms (float): Longest a batch waits to fill under load.
+        """
+        self.embed_many = embed_many
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.stats = {"texts": 0, "calls": 0, "largest": 0}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._busy = False # Previous batch held more than one text (system under load)
+
+    def configure(self, max_batch=None, max_wait_ms=None):
+        if max_batch is not None: self.max_batch = max(1, int(max_batch))
+        if max_wait_ms is not None: self.max_wait_ms = max(0.0, float(max_wait_ms))
+
+    def submit(self, model, text):
+        """Queues one text; the returned Future resolves to its vector ([] on failure)."""
+        future = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+        self._queue.put((model, text, future))
+        return future
+
+    def embed(self, model, text):
+        """Blocking convenience wrapper around `submit`."""
+        return self.submit(model, text).result()
+
+    def _collect(self):
+        """Blocks for the first request, then gathers a batch behind it."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            # Only wait for company while requests are arriving concurrently
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not (self._busy or len(batch) > 1): break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self._busy = len(batch) > 1
+            # A batch may mix models (e.g. a session switched embedders): one call per model
+            by_model = {}
+            for model, text, future in batch:
+                by_model.setdefault(model, []).append((text, future))
+            for model, items in by_model.items():
+                try:
+                    vectors = self.embed_many(model, [text for text, _ in items])
+                except Exception as e:
+                    print(f"Embedding error: {e}")
+                    vectors = []
+                if len(vectors) != len(items): vectors = [[]] * len(items)
+                for (_, future), vector in zip(items, vectors):
+                    future.set_result(vector)
+                self.stats["calls"] += 1
+                self.stats["texts"] += len(items)
+                self.stats["largest"] = max(self.stats["largest"], len(items))
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_batcher(embed_many, max_batch=None, max_wait_ms=None):
+    """The process-wide batcher (created on first use, then reconfigured in place)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = EmbeddingBatcher(embed_many)
+        _shared.configure(max_batch, max_wait_ms)
+        return _shared
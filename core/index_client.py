@@ -0,0 +1,207 @@
+"""
+Index Client — Thin Retrieval Client for the Index Server
+=========================================================
+
+Architecture Rationale:
+-----------------------
+`IndexClient` mirrors the retrieval surface of `KnowledgeBase`
+(`search`, `get_context_snippets`, `get_context_for_query`,
+`last_query_vector`, `index_version`), so `app.py` can swap the in-process
+index for a remote one without touching the RAG flow.
+
+1. **Keep-Alive Connections**: One persistent HTTP connection per thread,
+   reopened once if the server closed it.
+2. **Transport**: `http://host:port` (TCP) or `unix:///path/to.sock`.
+3. **Errors**: Server-side validation errors (e.g. a dimension mismatch)
+   are raised as `ValueError`, like the in-process search; an unreachable
+   server is printed and yields no results, and `available` lets the UI fall
+   back to the local index.
+
+Developer Note:
+The server embeds text queries itself, with the model its index was built
+with, so the `llm` arguments are accepted for signature compatibility only.
+"""
+
+import http.client
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from core.context_packer import format_snippet
+from core.query_profiler import elapsed_ms
+from core.search_filters import SearchFilter
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket."""
+
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class IndexClient:
+    """Queries a running index server (see `core/index_server.py`)."""
+
+    def __init__(self, url="http://127.0.0.1:8765", timeout=30.0, health_ttl=5.0):
+        """
+        Args:
+            url (str): 'http://host:port' or 'unix:///path/to.sock'.
+            timeout (float): Socket timeout per request in seconds.
+            health_ttl (float): Seconds a health check result is reused.
+        """
+        self.url = url
+        self.timeout = timeout
+        self.health_ttl = health_ttl
+        self.neural_threshold = None # Relevance cutoff sent with each query (None: the server's, calibrated)
+        self.mmr_lambda = None # Diversity settings sent with each query (None: the server's)
+        self.merge_adjacent = None
+        self.expansion_mode = None # Context expansion for get_context_* (None: the server's)
+        self.last_query_vector = None # Reused by the semantic answer cache
+        self.index_version = None
+        self.last_snapshot = None
+        self.last_threshold = None # Relevance cutoff the server applied to the last search
+        self.last_search_profile = {} # Server-side stage timings plus the round trip (ms)
+        self._health = (0.0, None)
+        self._local = threading.local()
+
+    def _connect(self):
+        if self.url.startswith("unix://"):
+            return _UnixHTTPConnection(self.url[len("unix://"):], self.timeout)
+        parts = urlsplit(self.url)
+        return http.client.HTTPConnection(parts.hostname or "127.0.0.1", parts.port or 8765, timeout=self.timeout)
+
+    def _request(self, method, path, payload=None):
+        """
+        Sends one JSON request.
+
+        Raises:
+            OSError: The server is unreachable.
+            ValueError: The server rejected the request.
+        """
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        for attempt in (0, 1):
+            conn = getattr(self._local, "conn", None) or self._connect()
+            self._local.conn = conn
+            try:
+                conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                data = json.loads(response.read() or b"{}")
+                break
+            except (http.client.HTTPException, OSError):
+                # A keep-alive connection the server already closed: reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt: raise
+        if response.status >= 400:
+            raise ValueError(data.get("error") or f"Index server returned HTTP {response.status}")
+        return data
+
+    # ------------------------------------------------------------------
+    # 1. STATUS
+    # ------------------------------------------------------------------
+
+    def health(self, refresh=False):
+        """Server/index facts, or None if unreachable (cached for `health_ttl` seconds)."""
+        checked, info = self._health
+        if refresh or time.time() - checked > self.health_ttl:
+            try:
+                info = self._request("GET", "/health")
+            except (OSError, ValueError):
+                info = None
+            self._health = (time.time(), info)
+        return info
+
+    def similarity_thresholds(self):
+        """The server's active relevance cutoffs and calibration profile (None if unreachable)."""
+        info = self.health()
+        return info.get("thresholds") if info else None
+
+    @property
+    def available(self):
+        info = self.health()
+        return bool(info) and info.get("status") == "ok"
+
+    def stats(self):
+        try:
+            return self._request("GET", "/stats")
+        except (OSError, ValueError):
+            return None
+
+    def reload(self):
+        """Asks the server to load the CURRENT snapshot now."""
+        try:
+            info = self._request("POST", "/reload")
+        except (OSError, ValueError) as e:
+            print(f"Index server error: {e}")
+            return False
+        self._health = (time.time(), info)
+        return True
+
+    # ------------------------------------------------------------------
+    # 2. RETRIEVAL (KnowledgeBase-compatible)
+    # ------------------------------------------------------------------
+
+    def search(self, query_text, llm_service=None, top_n=None, query_vector=None, filters=None,
+               mmr_lambda=None, merge_adjacent=None, expand=None):
+        """
+        Remote `KnowledgeBase.search`.
+
+        Args:
+            query_text (str): The user's search query.
+            llm_service: Ignored (the server embeds with the index's own model).
+            top_n (int): Number of results.
+            query_vector: Send a pre-computed embedding instead of text.
+            filters: Optional SearchFilter (or dict), applied server-side before scoring.
+            mmr_lambda (float): Per-query MMR trade-off (None = `self.mmr_lambda`).
+            merge_adjacent (bool): Per-query adjacent-chunk merging (None = `self.merge_adjacent`).
+            expand (str): Widen each hit server-side ('window', 'neighbors', 'parent'; None = no).
+        """
+        payload = {"query": query_text, "top_n": top_n, "return_vector": True}
+        if query_vector is not None: payload["vector"] = np.asarray(query_vector, dtype=np.float32).tolist()
+        scope = SearchFilter.coerce(filters)
+        if scope: payload["filters"] = scope.to_dict()
+        if self.neural_threshold is not None: payload["threshold"] = float(self.neural_threshold)
+        mmr_lambda = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        merge_adjacent = self.merge_adjacent if merge_adjacent is None else merge_adjacent
+        if mmr_lambda is not None: payload["mmr_lambda"] = float(mmr_lambda)
+        if merge_adjacent is not None: payload["merge_adjacent"] = bool(merge_adjacent)
+        if expand: payload["expand"] = expand
+        self.last_query_vector = None
+        self.last_search_profile = {}
+        started = time.perf_counter()
+        try:
+            data = self._request("POST", "/search", payload)
+        except OSError as e:
+            print(f"Index server error: {e}")
+            return []
+        vector = data.get("query_vector")
+        self.last_query_vector = np.array(vector, dtype=np.float32) if vector is not None else None
+        self.index_version = data.get("index_version")
+        self.last_snapshot = data.get("snapshot")
+        self.last_threshold = data.get("threshold")
+        self.last_search_profile = {**(data.get("profile") or {}), "roundtrip_ms": elapsed_ms(started)}
+        return data.get("results", [])
+
+    def get_context_snippets(self, query_text, llm=None, top_n=5, expand=None, **search_options):
+        expand = expand or getattr(self, 'expansion_mode', None)
+        return self.search(query_text, llm, top_n=top_n, expand=expand, **search_options)
+
+    def get_context_for_query(self, query_text, llm=None, top_n=5, **search_options):
+        res = self.get_context_snippets(query_text, llm, top_n=top_n, **search_options)
+        return "\n".join([format_snippet(r) for r in res])
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None: conn.close()
+        self._local.conn = None
@@ -0,0 +1,366 @@
+"""
+Index Server — Standalone Retrieval Process with Batched Queries
+===============================================================
+
+Architecture Rationale:
+-----------------------
+Every Streamlit session used to hold its own copy of the index in-process:
+other tools could not query it, and each extra UI process paid the full
+memory cost again. The index server is a small standalone process that owns
+one index and answers queries over HTTP/JSON (TCP or a Unix socket):
+
+1. **One Memory-Mapped Index**: The current snapshot is loaded with the
+   embedding matrix memory-mapped, so the OS page cache holds it once no
+   matter how many processes read it. A background task follows the
+   snapshot `CURRENT` pointer and hot-reloads when a new index is published.
+2. **asyncio Front End**: A single event loop parses requests (stdlib only,
+   keep-alive HTTP/1.1) and never blocks: embedding calls and matrix math run
+   on thread pools.
+3. **Query Batching**: Neural queries are queued. One search thread drains
+   the queue and scores up to `max_batch` queries with a single
+   `KnowledgeBase.search_batch` matmul, which reads the embedding matrix once
+   for the whole batch. While one batch is being scored the next one forms
+   behind it, so batches grow with load; `max_wait_ms` bounds how long a lone
+   query waits for company.
+
+Endpoints:
+    GET  /health    -> index facts (chunks, snapshot, model, dimension, version, thresholds)
+    GET  /stats     -> request / batch counters
+    POST /search    -> {"query" | "vector", "top_n", "threshold", "filters", "mmr_lambda",
+                        "merge_adjacent", "expand", "return_vector"}
+                       filters: {"files", "path_prefix", "pages": [first, last], "types"}
+                       expand: "none" | "window" | "neighbors" | "parent" (widens each hit)
+    POST /context   -> same (hits expanded per the server's setting unless "expand" is
+                       sent), plus the formatted LLM context block
+    POST /reload    -> reload the CURRENT snapshot now
+
+Usage:
+    python -m core.index_server --port 8765
+    python -m core.index_server --socket /tmp/pkb-index.sock
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.config_manager import ConfigManager
+from core.context_expansion import MODES as EXPANSION_MODES
+from core.context_packer import format_snippet
+from core.index_snapshots import SnapshotStore
+from core.knowledge_base import KnowledgeBase
+from core.query_profiler import elapsed_ms
+from core.result_diversity import merge_adjacent_chunks
+from core.search_filters import SearchFilter
+
+MAX_BODY = 1024 * 1024 # Largest accepted request body (a 4096-dim vector is ~80 KB of JSON)
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def _json_default(value):
+    """NumPy scalars and arrays in result dicts."""
+    if hasattr(value, "tolist"): return value.tolist()
+    return str(value)
+
+
+class IndexServer:
+    """Serves one KnowledgeBase over HTTP/JSON with batched neural scoring."""
+
+    def __init__(self, index_dir="data/index", llm=None, max_batch=32, max_wait_ms=2.0, reload_seconds=5.0,
+                 embed_workers=8, doc_store=None):
+        """
+        Args:
+            index_dir (str): Snapshot root to serve.
+            llm: OllamaService used to embed text queries (None: clients must send vectors).
+            max_batch (int): Most queries scored by one matmul.
+            max_wait_ms (float): How long a batch waits to fill once its first query arrived.
+            reload_seconds (float): How often the CURRENT pointer is checked (0 disables).
+            embed_workers (int): Concurrent query-embedding calls.
+            doc_store (DocumentStore): Raw-text store (default: the one under data/).
+        """
+        self.index_dir = index_dir
+        self.llm = llm
+        self.kb = KnowledgeBase(doc_store=doc_store)
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.reload_seconds = reload_seconds
+        self.address = None # (host, port) or socket path once listening
+        self.stats = {"started": time.time(), "requests": 0, "queries": 0, "batches": 0, "errors": 0, "reloads": 0}
+        self._queue = None # Created inside the event loop
+        # One scan at a time: the next batch accumulates while the current one runs
+        self._search_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-search")
+        self._embed_pool = ThreadPoolExecutor(max_workers=embed_workers, thread_name_prefix="index-embed")
+
+    # ------------------------------------------------------------------
+    # 1. INDEX
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Loads (or reloads) the CURRENT snapshot with memory-mapped embeddings."""
+        if not self.kb.load_from_disk(self.index_dir, mmap=True): return False
+        if self.llm is not None and self.kb.engine_mode == "Deep Learning" and self.kb.index_embedding_model:
+            # Queries must be embedded by the model the index was built with
+            self.llm.embedding_model = self.kb.index_embedding_model
+        self.stats["reloads"] += 1
+        return True
+
+    def health(self):
+        kb = self.kb
+        neural = kb.embeddings is not None
+        return {"status": "ok" if kb.documents_metadata else "empty", "snapshot": kb.loaded_snapshot,
+                "chunks": len(kb.documents_metadata), "files": len(kb.file_contents),
+                "engine_mode": kb.engine_mode, "index_model": kb.index_embedding_model,
+                "query_dim": kb.query_dimension() if neural else None, "index_version": kb.index_version,
+                "embeds_text": self.llm is not None, "thresholds": kb.similarity_thresholds()}
+
+    def _stats(self):
+        batches = max(1, self.stats["batches"])
+        return {**self.stats, "uptime_s": round(time.time() - self.stats["started"], 1),
+                "mean_batch": round(self.stats["queries"] / batches, 2), "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000, "queued": self._queue.qsize() if self._queue else 0}
+
+    # ------------------------------------------------------------------
+    # 2. QUERY EXECUTION
+    # ------------------------------------------------------------------
+
+    async def _search(self, body):
+        """Runs one /search request; returns (results, raw query vector or None, stage timings)."""
+        loop = asyncio.get_running_loop()
+        kb = self.kb
+        query = body.get("query") or ""
+        top_n = int(body.get("top_n") or kb.ml_top_n)
+        filters = body.get("filters")
+        if filters is not None and not isinstance(filters, dict): raise ValueError("'filters' must be an object.")
+        scope = SearchFilter.coerce(filters)
+        mmr_lambda = body.get("mmr_lambda")
+        if mmr_lambda is not None: mmr_lambda = float(mmr_lambda)
+        merge = body.get("merge_adjacent")
+        if merge is None: merge = getattr(kb, 'merge_adjacent', False)
+        if not kb.documents_metadata: return [], None, {}
+
+        started = time.perf_counter()
+        if kb.engine_mode == "Machine Learning":
+            if not query: raise ValueError("A 'query' string is required for keyword search.")
+            results = await loop.run_in_executor(self._search_pool, kb.search, query, None, top_n, None, scope,
+                                                 mmr_lambda, bool(merge))
+            return results, None, {"embed_ms": 0.0, "search_ms": elapsed_ms(started)}
+
+        vector = body.get("vector")
+        if vector is None:
+            if not query: raise ValueError("Send a 'query' string or a 'vector'.")
+            if self.llm is None: raise ValueError("This server has no embedding service; send a 'vector'.")
+            vector = await loop.run_in_executor(self._embed_pool, self.llm.embed_text, query)
+            if not vector: raise ValueError("Query embedding failed (is Ollama running?).")
+        embed_ms = elapsed_ms(started)
+        vector = np.asarray(vector, dtype=np.float32)
+        expected = kb.query_dimension()
+        if vector.ndim != 1 or vector.shape[0] != expected:
+            raise ValueError(f"Neural Dimension Mismatch: Index is {expected} (from {kb.index_embedding_model}), "
+                             f"but Query is {vector.shape[-1] if vector.ndim else 0}. Please re-index.")
+
+        future = loop.create_future()
+        queued = time.perf_counter()
+        await self._queue.put((vector, top_n, body.get("threshold"), scope, mmr_lambda, future))
+        results = await future
+        if merge: results = merge_adjacent_chunks(results)
+        # search_ms includes waiting for the batch to form (max_wait_ms)
+        return results, vector, {"embed_ms": embed_ms, "search_ms": elapsed_ms(queued)}
+
+    async def _batch_loop(self):
+        """Drains the query queue into batches and scores each with one matmul."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0: break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            vectors = np.stack([item[0] for item in batch])
+            top_n = max(item[1] for item in batch)
+            thresholds = [item[2] for item in batch]
+            filters = [item[3] for item in batch]
+            lambdas = [item[4] for item in batch]
+            try:
+                ranked = await loop.run_in_executor(self._search_pool, self.kb.search_batch, vectors, top_n, thresholds,
+                                                    filters, lambdas)
+                for (_, n, *_, future), results in zip(batch, ranked):
+                    if not future.done(): future.set_result(results[:n])
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done(): future.set_exception(e)
+            self.stats["batches"] += 1
+            self.stats["queries"] += len(batch)
+
+    async def _watch_snapshots(self):
+        """Hot-reloads when another process publishes a new snapshot."""
+        loop = asyncio.get_running_loop()
+        store = SnapshotStore(self.index_dir)
+        while self.reload_seconds:
+            await asyncio.sleep(self.reload_seconds)
+            current = store.current_id()
+            if current and current != self.kb.loaded_snapshot:
+                await loop.run_in_executor(None, self.load)
+
+    # ------------------------------------------------------------------
+    # 3. HTTP
+    # ------------------------------------------------------------------
+
+    async def _route(self, method, path, body):
+        if method == "GET" and path == "/health": return 200, self.health()
+        if method == "GET" and path == "/stats": return 200, self._stats()
+        if method == "POST" and path == "/reload":
+            ok = await asyncio.get_running_loop().run_in_executor(None, self.load)
+            return (200 if ok else 503), self.health()
+        if method == "POST" and path in ("/search", "/context"):
+            results, vector, profile = await self._search(body)
+            expand = body.get("expand") or (getattr(self.kb, 'expansion_mode', "none") if path == "/context" else "none")
+            if expand not in EXPANSION_MODES: raise ValueError(f"'expand' must be one of {', '.join(EXPANSION_MODES)}.")
+            if expand != "none" and results:
+                started = time.perf_counter()
+                results = await asyncio.get_running_loop().run_in_executor(self._search_pool, self.kb.expand_results,
+                                                                           results, expand)
+                profile["expand_ms"] = elapsed_ms(started)
+            payload = {"results": results, "index_version": self.kb.index_version, "snapshot": self.kb.loaded_snapshot,
+                       "threshold": self._applied_threshold(body), "profile": profile}
+            if body.get("return_vector") and vector is not None: payload["query_vector"] = vector
+            if path == "/context": payload["context"] = "\n".join(format_snippet(r) for r in results)
+            return 200, payload
+        return 404, {"error": f"No route for {method} {path}"}
+
+    def _applied_threshold(self, body):
+        """Relevance cutoff a /search request was answered with (its own, or the index's)."""
+        if self.kb.engine_mode == "Machine Learning": return self.kb.similarity_threshold("keyword")
+        threshold = body.get("threshold")
+        return float(threshold) if threshold is not None else self.kb.similarity_threshold()
+
+    async def _read_request(self, reader):
+        """Parses one HTTP/1.1 request; None when the client closed the connection."""
+        line = await reader.readline()
+        if not line.strip(): return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""): break
+            name, _, value = header.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_BODY: return method, target.split("?")[0], headers, None
+        raw = await reader.readexactly(length) if length else b""
+        return method, target.split("?")[0], headers, raw
+
+    async def _handle(self, reader, writer):
+        """Serves requests on one (keep-alive) connection."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None: break
+                method, path, headers, raw = request
+                self.stats["requests"] += 1
+                try:
+                    if raw is None: status, payload = 413, {"error": "Request body too large."}
+                    else: status, payload = await self._route(method, path, json.loads(raw) if raw else {})
+                except ValueError as e: # Bad input, dimension mismatch, invalid JSON
+                    status, payload = 400, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                if status >= 400: self.stats["errors"] += 1
+
+                data = json.dumps(payload, default=_json_default).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close" and raw is not None
+                writer.write((f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Error')}\r\n"
+                              f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive: break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass # Client went away or sent a malformed request line
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, socket_path=None, ready=None):
+        """
+        Listens until cancelled.
+
+        Args:
+            host, port: TCP address (port 0 picks a free one; see `address`).
+            socket_path (str): Listen on a Unix socket instead of TCP.
+            ready (threading.Event): Set once the server accepts connections.
+        """
+        self._queue = asyncio.Queue()
+        if socket_path:
+            if os.path.exists(socket_path): os.remove(socket_path)
+            server = await asyncio.start_unix_server(self._handle, path=socket_path)
+            self.address = socket_path
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+            self.address = server.sockets[0].getsockname()[:2]
+        tasks = [asyncio.create_task(self._batch_loop()), asyncio.create_task(self._watch_snapshots())]
+        if ready is not None: ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks: task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the saved index over HTTP/JSON.")
+    parser.add_argument("--index", default="data/index", help="Snapshot root to serve.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="Listen on this Unix socket path instead of TCP.")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--reload-seconds", type=float, default=5.0)
+    parser.add_argument("--no-embed", action="store_true", help="Do not embed text queries (clients send vectors).")
+    args = parser.parse_args()
+
+    # Same retrieval settings as the UI (settings.json)
+    config = ConfigManager()
+    llm = None
+    if not args.no_embed:
+        from core.llm_service import OllamaService
+        llm = OllamaService()
+        # Concurrent request handlers share batched embedding calls
+        llm.embed_batching = config.get("embed_batching_enabled")
+        llm.embed_batch_max = config.get("embed_batch_max")
+        llm.embed_batch_wait_ms = config.get("embed_batch_wait_ms")
+    server = IndexServer(args.index, llm, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                         reload_seconds=args.reload_seconds)
+    server.kb.vector_quantization = config.get("vector_quantization")
+    server.kb.rescore_oversample = config.get("quantization_oversample")
+    server.kb.threshold_mode = config.get("similarity_threshold_mode")
+    server.kb.min_results = config.get("similarity_min_results")
+    server.kb.mmr_lambda = config.get("mmr_lambda")
+    server.kb.mmr_candidates = config.get("mmr_candidates")
+    server.kb.merge_adjacent = config.get("merge_adjacent_chunks")
+    server.kb.expansion_mode = config.get("context_expansion")
+    server.kb.expansion_chars = config.get("expansion_window_chars")
+    server.kb.expansion_neighbors = config.get("expansion_neighbors")
+    server.kb.expansion_max_chars = config.get("expansion_max_chars")
+    if not server.load():
+        print(f"No index found under {args.index}; serving an empty index until one is published.")
+    where = args.socket or f"http://{args.host}:{args.port}"
+    print(f"Index server: {len(server.kb.documents_metadata)} chunks (snapshot {server.kb.loaded_snapshot}) on {where}")
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
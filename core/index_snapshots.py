@@ -0,0 +1,262 @@
+"""
+Index Snapshots — Atomic, Versioned Persistence for the KnowledgeBase
+=====================================================================
+
+Architecture Rationale:
+-----------------------
+`save_to_disk` used to overwrite `metadata.json`, the `.npy` matrices and
+`vectorizer.pkl` in place. A crash (or a watch-mode save racing a reader)
+could leave a directory holding the new metadata next to the old vectors —
+an index whose rows no longer line up.
+
+Snapshots make every save all-or-nothing:
+1. **Staging**: A save writes into a private temp directory under the index
+   root (`.staging-*`), fsyncing each file.
+2. **Manifest**: `manifest.json` records the SHA-256 and size of every file
+   plus the engine mode, embedding model/dimension and index version, so a
+   snapshot can be verified before it is trusted.
+3. **Atomic Publish**: The staging directory is renamed into
+   `snapshots/<id>/`, then the `CURRENT` pointer file is replaced with
+   `os.replace` (atomic on POSIX and Windows). Readers resolve `CURRENT`
+   once and only ever see a complete snapshot.
+4. **Retention & Rollback**: The newest `keep` snapshots are retained;
+   rolling back just re-points `CURRENT` (after verifying checksums).
+5. **Hot Reload**: Other sessions compare `CURRENT` with the snapshot they
+   loaded and reload when it moves.
+
+Layout:
+    data/index/CURRENT                 -> "20260101-120000-ab12cd"
+    data/index/snapshots/<id>/         -> metadata.json, *.npy, vectorizer.pkl,
+                                          blob_refs.txt, manifest.json
+
+Legacy Note:
+Indexes saved before snapshots (files directly in `data/index/`) still load.
+They are removed once the first snapshot has been published.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+LEGACY_FILES = ("metadata.json", "tfidf_matrix.npy", "embeddings.npy", "vectorizer.pkl")
+MANIFEST = "manifest.json"
+BLOB_REFS = "blob_refs.txt"
+
+
+def file_sha256(path, block=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _fsync_dir(path):
+    """Persists a directory entry (rename/create) on POSIX; a no-op where unsupported."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class SnapshotStore:
+    """Publishes, lists, verifies and rolls back index snapshots under one root."""
+
+    def __init__(self, root="data/index", keep=3):
+        """
+        Args:
+            root (str): Index directory (also the legacy single-version location).
+            keep (int): Snapshots retained after each publish (the current one always is).
+        """
+        self.root = root
+        self.keep = max(1, int(keep))
+        self.snapshot_dir = os.path.join(root, "snapshots")
+        self.pointer = os.path.join(root, "CURRENT")
+
+    # ------------------------------------------------------------------
+    # 1. RESOLUTION
+    # ------------------------------------------------------------------
+
+    def current_id(self):
+        """Id of the published snapshot, or None."""
+        try:
+            with open(self.pointer, "r") as f:
+                sid = f.read().strip()
+        except OSError:
+            return None
+        return sid if sid and os.path.isdir(self.path_of(sid)) else None
+
+    def path_of(self, sid):
+        return os.path.join(self.snapshot_dir, sid)
+
+    def current_path(self):
+        """Directory to load: the current snapshot, else a legacy flat index, else None."""
+        sid = self.current_id()
+        if sid: return self.path_of(sid)
+        if os.path.exists(os.path.join(self.root, "metadata.json")): return self.root
+        return None
+
+    def exists(self):
+        return self.current_path() is not None
+
+    def manifest(self, sid):
+        try:
+            with open(os.path.join(self.path_of(sid), MANIFEST), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def snapshots(self):
+        """Manifests of every complete snapshot, newest first."""
+        if not os.path.isdir(self.snapshot_dir): return []
+        found = [m for m in (self.manifest(sid) for sid in os.listdir(self.snapshot_dir)) if m]
+        return sorted(found, key=lambda m: (m.get("created", 0), m["id"]), reverse=True)
+
+    # ------------------------------------------------------------------
+    # 2. PUBLISHING
+    # ------------------------------------------------------------------
+
+    def begin(self):
+        """Creates a private staging directory for a new snapshot."""
+        os.makedirs(self.root, exist_ok=True)
+        staging = os.path.join(self.root, f".staging-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(staging)
+        return staging
+
+    def discard(self, staging):
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def publish(self, staging, info):
+        """
+        Checksums the staged files, moves them into place and flips CURRENT.
+
+        Args:
+            staging (str): Directory returned by `begin()`, fully written.
+            info (dict): Index facts for the manifest (engine_mode, index_model, index_dim, ...).
+
+        Returns:
+            str: The new snapshot id.
+        """
+        sid = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        files = {}
+        for name in sorted(os.listdir(staging)):
+            path = os.path.join(staging, name)
+            with open(path, "rb+") as f:
+                os.fsync(f.fileno())
+            files[name] = {"sha256": file_sha256(path), "bytes": os.path.getsize(path)}
+        manifest = {"id": sid, "created": time.time(), "files": files, **info}
+        with open(os.path.join(staging, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_dir(staging)
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        os.replace(staging, self.path_of(sid))
+        _fsync_dir(self.snapshot_dir)
+        self._set_current(sid)
+        self._retire_legacy()
+        self._prune()
+        return sid
+
+    def _set_current(self, sid):
+        tmp = f"{self.pointer}.{uuid.uuid4().hex[:6]}.tmp"
+        with open(tmp, "w") as f:
+            f.write(sid)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.pointer)
+        _fsync_dir(self.root)
+
+    def _retire_legacy(self):
+        """Removes a pre-snapshot flat index once a snapshot supersedes it."""
+        for name in LEGACY_FILES:
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                pass
+
+    def _prune(self):
+        current = self.current_id()
+        for i, m in enumerate(self.snapshots()):
+            if i >= self.keep and m["id"] != current:
+                shutil.rmtree(self.path_of(m["id"]), ignore_errors=True)
+        # Staging directories left behind by a crashed save
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".staging-") and time.time() - os.path.getmtime(path) > 3600:
+                shutil.rmtree(path, ignore_errors=True)
+
+    # ------------------------------------------------------------------
+    # 3. INTEGRITY & ROLLBACK
+    # ------------------------------------------------------------------
+
+    def verify(self, sid, doc_store=None):
+        """
+        Re-hashes a snapshot's files against its manifest.
+
+        Args:
+            sid (str): Snapshot id.
+            doc_store (DocumentStore): When given, also checks that every text
+                blob the snapshot references is still stored.
+
+        Returns:
+            tuple: (ok, list of problems)
+        """
+        manifest = self.manifest(sid)
+        if manifest is None: return False, [f"{sid}: manifest missing or unreadable"]
+        problems = []
+        for name, expected in manifest.get("files", {}).items():
+            path = os.path.join(self.path_of(sid), name)
+            if not os.path.exists(path):
+                problems.append(f"{name}: missing")
+            elif os.path.getsize(path) != expected["bytes"] or file_sha256(path) != expected["sha256"]:
+                problems.append(f"{name}: checksum mismatch")
+        if doc_store is not None:
+            missing = doc_store.missing(self.blob_refs(sid))
+            if missing: problems.append(f"{len(missing)} document blobs missing from the DocumentStore")
+        return not problems, problems
+
+    def rollback(self, sid=None, doc_store=None):
+        """
+        Makes an older snapshot current (default: the one before the current).
+
+        Returns:
+            str: The snapshot id now current.
+
+        Raises:
+            ValueError: If there is no such snapshot or it fails verification.
+        """
+        if sid is None:
+            current = self.current_id()
+            older = [m["id"] for m in self.snapshots() if m["id"] != current]
+            if not older: raise ValueError("No previous snapshot to roll back to.")
+            sid = older[0]
+        ok, problems = self.verify(sid, doc_store)
+        if not ok: raise ValueError(f"Snapshot {sid} is damaged: {'; '.join(problems)}")
+        self._set_current(sid)
+        return sid
+
+    def blob_refs(self, sid):
+        """DocumentStore hashes one snapshot references (empty if it predates blob refs)."""
+        try:
+            with open(os.path.join(self.path_of(sid), BLOB_REFS), "r") as f:
+                return {line.strip() for line in f if line.strip()}
+        except OSError:
+            return set()
+
+    def referenced_blobs(self):
+        """DocumentStore hashes referenced by any retained snapshot (kept by GC)."""
+        refs = set()
+        for m in self.snapshots():
+            refs |= self.blob_refs(m["id"])
+        return refs
@@ -42,6 +42,20 @@ import json
 import os
 import hashlib
 import pickle
+import threading
+import time
+from core.context_packer import format_snippet
+from core.document_store import DocumentStore, DocumentTextMap
+from core.chunk_table import ChunkTable
+from core.index_snapshots import SnapshotStore, BLOB_REFS
+from core.quantization import QuantizedIndex
+from core.search_filters import SearchFilter
+from core.result_diversity import mmr_select, merge_adjacent_chunks
+from core.context_expansion import expand_results
+from core.projection import EmbeddingProjection
+from core.threshold_calibration import calibrate, keyword_queries, text_queries
+from core.query_profiler import elapsed_ms
+from core.summarizer import split_text
 
 # --- NLTK Resource Management ---
 # WordNet is used for Lemmatization (finding the root of a word).
@@ -53,7 +67,7 @@ class KnowledgeBase:
     Orchestrates the lifecycle of knowledge from raw file to searchable vector.
     """
 
-    def __init__(self, chunk_size=600, overlap_size=100, engine_mode="Deep Learning"):
+    def __init__(self, chunk_size=600, overlap_size=100, engine_mode="Deep Learning", doc_store=None):
         """
         Initializes the semantic core with configurable windowing parameters.
         
@@ -66,31 +80,47 @@ class KnowledgeBase:
             chunk_size (int): Max characters per searchable segment.
             overlap_size (int): Context preservation between chunks.
             engine_mode (str): 'Machine Learning' (Keyword) or 'Deep Learning' (Neural).
+            doc_store (DocumentStore): Shared raw-text store (a default one under data/ if None).
         """
         # --- CONFIGURATION & TUNING ---
         self.chunk_size = chunk_size
         self.overlap_size = overlap_size
         self.engine_mode = engine_mode
         self.dataset_overlap = 15 
+        self.dataset_chunk_rows = 5000 # Rows read per batch when streaming CSV/Excel files
+        self.pdf_backend = "auto" # 'auto', 'pymupdf', 'pypdf' or 'pypdf2'
+        self.pdf_workers = 0 # Worker processes for large PDFs (0 = auto)
         self.ml_top_n = 5  # Depth of keyword retrieval
         self.stop_requested = False # Flag for safe indexing termination
         self.spatial_granularity = "Segments" # Controls 3D map detail: 'Documents' or 'Segments'
         
         # --- PRIMARY DATA REGISTRY ---
-        # metadata stores the 'context' (text, file name, page numbers)
-        self.documents_metadata = [] 
+        # metadata stores the 'context' (text, file name, page numbers) in a
+        # columnar ChunkTable; lists of dicts assigned here are converted.
+        self.documents_metadata = []
         # spatial stores 'coordinates' (x, y, z) for the 3D visualizer
         self.documents_spatial = []  
         # matrix_agg stores file-level centroids for "Document Mode" visualization
         self.documents_matrix_agg = None 
-        # file_contents stores raw full-text for secondary processing
-        self.file_contents = {}      
+        # file_contents maps filename -> raw full-text for secondary processing.
+        # Texts live compressed in the DocumentStore and are read lazily.
+        self.doc_store = doc_store or DocumentStore()
+        self.file_contents = DocumentTextMap(self.doc_store)
+        # Pages are collected here during ingestion and joined once (see finalize_document)
+        self._content_parts = {}
         
         # --- OPS & REPORTING ---
         self.cleaning_report = []
         self.file_chunk_counts = {}
+        self.file_hashes = {} # filename -> content hash (keys the summary store)
+        self.extraction_profile = {} # filename -> parser timing report (slowest pages)
         self.indexing_errors = [] # JSON-serializable list of UI error cards
         self.index_embedding_model = None # Safety check to ensure model/vector alignment
+        self.index_version = None # Content fingerprint of the built index (cache invalidation key)
+        self.update_lock = threading.RLock() # Serializes live (watch-mode) merges against searches
+        self.snapshot_retention = 3 # Index snapshots kept on disk for rollback
+        self.blob_gc_grace_minutes = 60 # Unreferenced DocumentStore blobs younger than this survive a save
+        self.loaded_snapshot = None # Snapshot id this instance was loaded from / saved as
         
         # --- ML ENGINE (Statistical / TF-IDF) ---
         # The vectorizer transforms text into a sparse frequency matrix.
@@ -104,9 +134,38 @@ class KnowledgeBase:
         self._embed_cache = {}       # Local JSON-backed cache to avoid re-embedding
         self._active_cache_path = None
         self.neural_threshold = 0.35 # Mathematical cutoff for 'relevance'
-
-
-
+        self.keyword_threshold = 0.05 # TF-IDF cutoff when no calibration applies
+        self.threshold_mode = "auto" # 'auto' = calibrated cutoffs stored with the index, 'manual' = the fixed ones
+        self.calibration = {} # {'neural' | 'keyword': profile} measured at build time (see threshold_calibration)
+        self.min_results = 2 # Best hits returned even when all score under the cutoff (positive scores only)
+        self.vector_quantization = "none" # 'none', 'int8' or 'binary' first-pass scoring
+        self.rescore_oversample = 10 # Candidates rescored at full precision per wanted result
+        self._quantized = None # QuantizedIndex matching self.embeddings (built lazily)
+        self._row_norms = None # (embeddings, their L2 norms) reused across searches
+        self.embedding_reduction = "none" # 'none', 'truncate' (Matryoshka) or 'pca'
+        self.embedding_reduced_dim = 256 # Target dimension when a reduction is active
+        self.projection = None # EmbeddingProjection fitted at build time (persisted with the index)
+        self.last_query_vector = None # Reused by the semantic answer cache
+        self.last_search_profile = {} # Stage timings (ms) of the most recent search
+        self.mmr_lambda = 1.0 # Maximal Marginal Relevance trade-off (1.0 = plain top-k)
+        self.mmr_candidates = 4 # MMR candidate pool per wanted result
+        self.merge_adjacent = False # Join overlapping / touching hits from the same page
+        self.expansion_mode = "none" # Widen context hits: 'none', 'window', 'neighbors' or 'parent'
+        self.expansion_chars = 600 # Characters added on each side of a hit ('window')
+        self.expansion_neighbors = 1 # Chunks added on each side of a hit ('neighbors')
+        self.expansion_max_chars = 2400 # Cap on one expanded snippet
+
+
+
+
+    @property
+    def documents_metadata(self):
+        """Per-chunk metadata (ChunkTable; rows read and write like the old dicts)."""
+        return self._chunks
+
+    @documents_metadata.setter
+    def documents_metadata(self, records):
+        self._chunks = records if isinstance(records, ChunkTable) else ChunkTable.from_records(records)
 
     # ------------------------------------------------------------------
     # PHASE 1: DISCOVERY & CACHING
@@ -150,8 +209,13 @@ class KnowledgeBase:
         self.documents_spatial = []
         # We preserve file_contents if we are doing a progressive update,
         # but for a clean rebuild from app.py, it will be reset.
-        self.file_contents = {}
+        self.file_contents = DocumentTextMap(self.doc_store)
+        self._content_parts = {}
+        self.file_hashes = {}
         self.documents_metadata = []
+        self.loaded_snapshot = None # An in-memory rebuild no longer matches any snapshot
+        self.projection = None
+        self.calibration = {}
 
     # ------------------------------------------------------------------
     # PHASE 2: THE PREPROCESSING PIPELINE
@@ -197,18 +261,39 @@ class KnowledgeBase:
         Cleans and segments raw text into searchable chunks.
         Implementing 'Sentence-Aware' chunking for ML and 'Sliding-Window' for Neural.
         """
-        if filename not in self.file_contents: self.file_contents[filename] = ""
-        self.file_contents[filename] += raw_text
+        # Performance Note: `str +=` per page copies the whole document every
+        # time (quadratic for long PDFs), so pages are collected in a list and
+        # joined once in `finalize_document`.
+        if filename not in self._content_parts:
+            self._content_parts[filename] = [self.file_contents[filename]] if self.file_contents.get(filename) else []
+            self.file_contents[filename] = "" # Registers the file in the manifest right away
+        self._content_parts[filename].append(raw_text)
+        self.file_hashes.pop(filename, None) # Content changed: fingerprint must be recomputed
 
         cleaned = self.clean_text(raw_text)
         
         # Update Analytics
         self._record_cleaning_stats(filename, raw_text, cleaned)
 
+        # The cleaned page is stored once; persisted chunks point into it by offset
+        src = self.doc_store.put(cleaned, commit=False)
+
         if self.engine_mode == "Machine Learning":
-            self._split_sentences_aware(cleaned, filename, page_num, full_path)
+            self._split_sentences_aware(cleaned, filename, page_num, full_path, src)
         else:
-            self._split_sliding_window(cleaned, filename, page_num, full_path)
+            self._split_sliding_window(cleaned, filename, page_num, full_path, src)
+
+    def finalize_document(self, filename):
+        """Joins the pages collected by `process_text` into `file_contents`."""
+        parts = self._content_parts.pop(filename, None)
+        if parts is not None:
+            self.file_contents[filename] = "".join(parts)
+        self.doc_store.commit()
+
+    def finalize_documents(self):
+        """Finalizes every document still being accumulated."""
+        for filename in list(self._content_parts):
+            self.finalize_document(filename)
 
     def _record_cleaning_stats(self, filename, raw, clean):
         """Internal helper to track NLP pipeline effectiveness."""
@@ -219,38 +304,116 @@ class KnowledgeBase:
                 "Reduction": f"{((r_len - c_len) / r_len * 100):.1f}%" if r_len > 0 else "0%"
             })
 
-    def _split_sentences_aware(self, text, filename, page, path):
+    def _split_sentences_aware(self, text, filename, page, path, src=None):
         """Splits text by sentences to ensure grammatical units remain intact."""
         sentences = re.split(r'(?<=[.!?])\s+', text)
-        cur_chunk = ""
+        cur_chunk, cursor = "", 0
         for s in sentences:
             if len(cur_chunk) + len(s) > self.chunk_size and cur_chunk:
-                self.documents_metadata.append({"text": cur_chunk.strip(), "file": filename, "full_path": path, "page": page})
+                cursor = self._append_chunk(cur_chunk.strip(), text, cursor, filename, page, path, src)
                 cur_chunk = s
             else: cur_chunk += " " + s
         if cur_chunk:
-            self.documents_metadata.append({"text": cur_chunk.strip(), "file": filename, "full_path": path, "page": page})
+            self._append_chunk(cur_chunk.strip(), text, cursor, filename, page, path, src)
 
-    def _split_sliding_window(self, text, filename, page, path):
+    def _append_chunk(self, chunk, text, cursor, filename, page, path, src):
+        """
+        Records a sentence-aware chunk with its offsets into the cleaned page.
+        `clean_text` collapses whitespace to single spaces, so every chunk is an
+        exact substring of `text` and can be located by search from `cursor`.
+        """
+        meta = {"text": chunk, "file": filename, "full_path": path, "page": page}
+        start = text.find(chunk, cursor)
+        if src and start != -1:
+            meta.update(src=src, start=start, end=start + len(chunk))
+            cursor = start + len(chunk)
+        self.documents_metadata.append(meta)
+        return cursor
+
+    def _split_sliding_window(self, text, filename, page, path, src=None):
         """Fixed-size window moving through text with configurable overlap."""
         start = 0
         while start < len(text):
             end = start + self.chunk_size
-            self.documents_metadata.append({"text": text[start:end], "file": filename, "full_path": path, "page": page})
+            meta = {"text": text[start:end], "file": filename, "full_path": path, "page": page}
+            if src: meta.update(src=src, start=start, end=min(end, len(text)))
+            self.documents_metadata.append(meta)
             start += (self.chunk_size - self.overlap_size)
             if end >= len(text): break
 
+    @staticmethod
+    def _serialize_rows(df):
+        """
+        Compact row-to-text serializer for tabular data.
+        
+        `DataFrame.to_string()` pads every cell to the column width, so most of
+        its output is whitespace that still gets embedded and stored. Instead we
+        emit one pipe-delimited line per row; blocks carry a header line so each
+        chunk stays self-describing.
+        """
+        cells = df.astype(str).where(df.notna(), "")
+        return [" | ".join(row) for row in cells.itertuples(index=False, name=None)]
+
+    def process_dataset_stream(self, filename, frames, block_size=100):
+        """
+        Converts a stream of tabular batches into overlapping row blocks.
+
+        Memory Model:
+        Only the current batch plus one block of serialized rows is held at a
+        time, so memory stays bounded no matter how many rows the file has.
+
+        Args:
+            filename (str): Display name for citations.
+            frames (iterable[pd.DataFrame]): Row batches (e.g. `read_csv(chunksize=...)`).
+            block_size (int): Rows per searchable block; consecutive blocks
+                share `dataset_overlap` rows.
+        """
+        fingerprint = hashlib.sha1()
+        header, buffer = None, []
+        block_start = 0   # Row index of buffer[0]
+        emitted_until = 0 # Rows [0, emitted_until) already belong to an emitted block
+
+        def emit(rows, start):
+            txt = header + "\n" + "\n".join(rows)
+            self.documents_metadata.append({"text": txt, "file": filename, "page": f"Rows {start}-{start + len(rows)}"})
+
+        for df in frames:
+            if header is None:
+                header = " | ".join(str(c) for c in df.columns)
+                self.file_contents[filename] = df.head(50).to_string() # Sample for summarizer
+            lines = self._serialize_rows(df)
+            for line in lines: fingerprint.update(line.encode('utf-8'))
+            buffer.extend(lines)
+
+            # Emit every full block, keeping the overlap rows for the next one
+            while len(buffer) >= block_size:
+                emit(buffer[:block_size], block_start)
+                emitted_until = block_start + block_size
+                step = block_size - self.dataset_overlap
+                buffer = buffer[step:]
+                block_start += step
+
+        # Tail: only emit if it holds rows not already covered by the last block
+        if buffer and block_start + len(buffer) > emitted_until:
+            emit(buffer, block_start)
+
+        if header is not None:
+            # The stored text is only a sample, so fingerprint the full table instead
+            self.file_hashes[filename] = fingerprint.hexdigest()
+
     def process_dataset(self, filename, df):
         """Converts tabular data into block-based text for the search engine."""
-        rows = len(df)
-        self.file_contents[filename] = df.head(50).to_string() # Sample for summarizer
-        
-        # Chunk the dataset into manageable blocks
-        block_size = 100
-        for start in range(0, rows, block_size - self.dataset_overlap):
-            end = min(start + block_size, rows)
-            txt = df.iloc[start:end].to_string(index=False)
-            self.documents_metadata.append({"text": txt, "file": filename, "page": f"Rows {start}-{end}"})
+        self.process_dataset_stream(filename, [df])
+
+    def restore_dataset_blocks(self, filename, blocks, sample, fingerprint):
+        """
+        Re-registers row blocks produced by an earlier `process_dataset_stream`
+        run (served from the extraction cache), skipping parsing and serialization.
+        """
+        for label, txt in blocks:
+            self.documents_metadata.append({"text": txt, "file": filename, "page": label})
+        self.file_contents[filename] = sample
+        if fingerprint: self.file_hashes[filename] = fingerprint
 
     # ------------------------------------------------------------------
     # PHASE 4: VECTORIZATION CORE
@@ -263,6 +426,7 @@ class KnowledgeBase:
         Automatically triggers 3D spatial generation for the UI.
         """
         if not self.documents_metadata: return
+        self.finalize_documents()
         
         # Track the model used for this build
         if self.engine_mode == "Deep Learning" and llm_service:
@@ -280,7 +444,9 @@ class KnowledgeBase:
             self.index_embedding_model = "Classical ML (TF-IDF)"
             self.index_embedding_dimension = self.vectorizer.max_features if hasattr(self.vectorizer, 'max_features') else 0
 
-        texts = [doc['text'] for doc in self.documents_metadata]
+        texts = self.documents_metadata.texts
+        self.index_version = self._compute_index_version(texts)
+        self.file_chunk_counts = self.documents_metadata.chunk_counts()
 
         # Hybrid Labeling Layer: Always build TF-IDF for semantic topic modeling
         self.tfidf_matrix = self.vectorizer.fit_transform(texts).toarray()
@@ -288,13 +454,160 @@ class KnowledgeBase:
         if self.engine_mode == "Deep Learning":
             if not llm_service: return
             self._build_neural_embeddings(texts, llm_service)
+        self.calibrate_thresholds(llm_service)
 
         
         # Trigger 3D Spatial Processing
         self._generate_3d_spatial_data()
 
+    def _compute_index_version(self, texts):
+        """
+        Fingerprints the index contents (model + every chunk text).
+        Rebuilding the same files yields the same version, so caches that key
+        on it (e.g. the semantic answer cache) survive no-op rebuilds.
+        """
+        h = hashlib.md5(str(self.index_embedding_model).encode('utf-8'))
+        for t in texts:
+            h.update(t.encode('utf-8'))
+        return h.hexdigest()[:16]
+
     def _build_neural_embeddings(self, texts, llm):
         """Internal logic for batch embedding with disk-cache lookup."""
+        embeddings = self._embed_with_cache(texts, llm)
+        # float32 halves memory versus NumPy's float64 default at no ranking cost
+        self.embeddings = np.array([e for e in embeddings if e is not None], dtype=np.float32)
+        self._quantized = None
+        self._row_norms = None
+
+        # Optional reduced-dimension index: fit once, store the shorter vectors
+        self.projection = None
+        if len(self.embeddings):
+            self.projection = EmbeddingProjection.fit(self.embeddings, getattr(self, 'embedding_reduction', "none"),
+                                                      getattr(self, 'embedding_reduced_dim', 0))
+        if self.projection is not None:
+            self.embeddings = self.projection.transform(self.embeddings)
+
+    def apply_file_updates(self, staging, removed_files=(), llm_service=None):
+        """
+        Merges a freshly ingested 'staging' KnowledgeBase into the live index
+        without a full rebuild (used by watch mode).
+
+        Every file present in `staging` replaces its old chunks; files in
+        `removed_files` are dropped. Only the new chunks are vectorized.
+
+        Developer Note (Spatial Placement):
+        Re-running UMAP/KMeans over the whole corpus is the slowest part of a
+        build, so in 'Segments' mode new chunks are placed next to their most
+        similar surviving chunk (inheriting its cluster). The layout is
+        therefore approximate until the next full rebuild. 'Documents' mode
+        only projects one centroid per file, so it is simply recomputed.
+
+        Args:
+            staging (KnowledgeBase): Holds only the changed files, already chunked.
+            removed_files (iterable[str]): Display names of deleted files.
+            llm_service: Required in 'Deep Learning' mode to embed new chunks.
+
+        Returns:
+            dict: {'added_chunks', 'removed_chunks', 'files_updated', 'files_removed'}
+        """
+        staging.finalize_documents()
+        new_table = staging.documents_metadata
+        replaced = set(new_table.files) | set(staging.file_contents)
+        drop = replaced | set(removed_files)
+        new_texts = list(new_table.texts)
+
+        # 1. Vectorize the new chunks outside the lock (the slow part)
+        new_vecs = None
+        if self.engine_mode == "Deep Learning" and new_texts:
+            if not llm_service: raise ValueError("Neural index updates require the LLM service.")
+            if self.index_embedding_model and self.index_embedding_model != llm_service.embedding_model:
+                raise ValueError(f"Index was built with {self.index_embedding_model}; re-index to use {llm_service.embedding_model}.")
+            if self._active_cache_path is None:
+                self._embed_cache = self._load_disk_cache(llm_service.embedding_model)
+            vecs = self._embed_with_cache(new_texts, llm_service)
+            if any(v is None for v in vecs): raise RuntimeError("Embedding failed for some of the updated chunks.")
+            new_vecs = np.array(vecs, dtype=np.float32)
+            if getattr(self, 'projection', None) is not None:
+                new_vecs = self.projection.transform(new_vecs)
+
+        with self.update_lock:
+            table = self.documents_metadata
+            drop_ids = [table.file_id(f) for f in drop]
+            keep = np.flatnonzero(~np.isin(table.file_ids, drop_ids)).tolist()
+            merged = table.take(keep)
+            merged.extend(new_table)
+            all_texts = merged.texts
+
+            # 2. Vector matrices (row i must stay aligned with metadata i)
+            if self.engine_mode == "Machine Learning":
+                # TF-IDF *is* the ML index: refit so new vocabulary is searchable
+                self.tfidf_matrix = self.vectorizer.fit_transform(all_texts).toarray() if all_texts else None
+                kept_matrix = self.tfidf_matrix[:len(keep)] if all_texts else None
+                new_matrix = self.tfidf_matrix[len(keep):] if all_texts else None
+            else:
+                # TF-IDF only labels topics here: project new chunks onto the existing vocabulary
+                if self.tfidf_matrix is not None and hasattr(self.vectorizer, 'vocabulary_'):
+                    parts = [self.tfidf_matrix[keep]]
+                    if new_texts: parts.append(self.vectorizer.transform(new_texts).toarray())
+                    self.tfidf_matrix = np.vstack(parts)
+                elif all_texts:
+                    self.tfidf_matrix = self.vectorizer.fit_transform(all_texts).toarray()
+                kept_matrix = self.embeddings[keep] if self.embeddings is not None else None
+                new_matrix = new_vecs
+                if kept_matrix is None or not len(keep):
+                    self.embeddings = new_matrix
+                elif new_matrix is None:
+                    self.embeddings = kept_matrix
+                else:
+                    self.embeddings = np.vstack([kept_matrix, new_matrix])
+
+            self._quantized = None # Rebuilt from the merged vectors on the next search
+            self._row_norms = None
+
+            # 3. Text registries & reporting
+            removed_chunks = len(table) - len(keep)
+            self.documents_metadata = merged
+            for f in drop:
+                self.file_contents.pop(f, None)
+                self.file_hashes.pop(f, None)
+                self.extraction_profile.pop(f, None)
+            self.file_contents.adopt(staging.file_contents)
+            self.file_hashes.update(staging.file_hashes)
+            self.extraction_profile.update(getattr(staging, 'extraction_profile', {}))
+            self.cleaning_report = [r for r in self.cleaning_report if r['File'] not in drop] + staging.cleaning_report
+            self.file_chunk_counts = merged.chunk_counts()
+            self.index_version = self._compute_index_version(all_texts)
+
+            # 4. Spatial data
+            kept_meta, new_meta = merged[:len(keep)], merged[len(keep):]
+            if self.spatial_granularity == "Segments" and kept_matrix is not None and len(keep) \
+                    and all('x' in m for m in kept_meta):
+                self._place_near_neighbours(kept_matrix, kept_meta, new_matrix, new_meta)
+            else:
+                self._generate_3d_spatial_data()
+
+        # Indexes saved before calibration existed get their profile on the first merge
+        if not getattr(self, 'calibration', None): self.calibrate_thresholds(llm_service)
+        return {"added_chunks": len(new_table), "removed_chunks": removed_chunks,
+                "files_updated": len(replaced), "files_removed": len(set(removed_files) - replaced)}
+
+    @staticmethod
+    def _place_near_neighbours(kept_matrix, kept_meta, new_matrix, new_meta, jitter=0.05):
+        """Copies each new chunk's 3D position and cluster from its most similar existing chunk."""
+        if new_matrix is None or not len(new_meta): return
+        kept_norms = np.linalg.norm(kept_matrix, axis=1) + 1e-9
+        rng = np.random.default_rng(42)
+        for vec, meta in zip(new_matrix, new_meta):
+            sims = kept_matrix @ vec / (kept_norms * (np.linalg.norm(vec) + 1e-9))
+            anchor = kept_meta[int(np.argmax(sims))]
+            offset = rng.uniform(-jitter, jitter, 3)
+            meta['x'] = round(anchor['x'] + float(offset[0]), 4)
+            meta['y'] = round(anchor['y'] + float(offset[1]), 4)
+            meta['z'] = round(anchor['z'] + float(offset[2]), 4)
+            meta['cluster'] = anchor.get('cluster', 0)
+
+    def _embed_with_cache(self, texts, llm):
+        """Embeds texts, serving repeats from the model's disk cache. Returns a list aligned with `texts`."""
         embeddings = [None] * len(texts)
         to_query, to_query_meta = [], []
         
@@ -314,8 +627,7 @@ class KnowledgeBase:
                 embeddings[idx] = vec
                 self._embed_cache[h] = vec
             self._save_disk_cache()
-            
-        self.embeddings = np.array([e for e in embeddings if e is not None])
+        return embeddings
 
     def _generate_3d_spatial_data(self):
         """
@@ -356,6 +668,10 @@ class KnowledgeBase:
         # 3. Metadata Injection
         if self.spatial_granularity == "Documents": 
             self.documents_spatial = []
+        elif isinstance(source_meta, ChunkTable) and len(coords) == len(source_meta):
+            # Columnar fast path: write every chunk's position and cluster at once
+            source_meta.set_coords(coords, clusters)
+            return
         
         for i, (x, y, z) in enumerate(coords):
             if i < len(source_meta):
@@ -369,27 +685,30 @@ class KnowledgeBase:
                 if self.spatial_granularity == "Documents":
                     self.documents_spatial.append(meta)
                     # PROPAGATION: Assign this cluster ID to all segments belonging to this file
-                    fname = meta['file']
-                    for m in self.documents_metadata:
-                        if m['file'] == fname:
-                            m['cluster'] = c_id
+                    # (file index lookup + one vectorized write instead of a scan per file)
+                    self.documents_metadata.set_clusters(self.documents_metadata.rows_for_file(meta['file']), c_id)
                 else:
                     # Segments mode already modifies documents_metadata directly
                     pass
 
     def _get_aggregated_document_matrix(self):
-        """Calculates centroid vectors for each unique file."""
-        df = pd.DataFrame(self.documents_metadata)
-        if df.empty: return None, []
+        """
+        Calculates centroid vectors for each unique file.
+
+        Performance Note:
+        Rows per file come from the ChunkTable's file index (one stable sort),
+        so this is O(chunks) instead of one DataFrame filter per file
+        (O(files x chunks)).
+        """
+        table = self.documents_metadata
+        if not len(table): return None, []
 
         matrix = self.tfidf_matrix if self.engine_mode == "Machine Learning" else self.embeddings
-        unique_files = df['file'].unique()
-        
         agg_matrix = []
         agg_meta = []
         
-        for fname in unique_files:
-            indices = df[df['file'] == fname].index.tolist()
+        for fname in table.file_names():
+            indices = table.rows_for_file(fname)
             file_vecs = matrix[indices]
             centroid = np.mean(file_vecs, axis=0)
             agg_matrix.append(centroid)
@@ -397,7 +716,7 @@ class KnowledgeBase:
                 "file": fname, 
                 "text": f"Document Summary: {fname}", 
                 "segments": len(indices),
-                "page": "1-" + str(df[df['file'] == fname]['page'].max())
+                "page": "1-" + str(table.max_page(indices))
             })
             
         return np.array(agg_matrix), agg_meta
@@ -430,13 +749,16 @@ class KnowledgeBase:
         if full_matrix is None: return pd.DataFrame()
 
         # Filter by cluster mapping
-        indices = [i for i, m in enumerate(source_list) if m.get('cluster') == cluster_id]
+        if is_doc_mode:
+            indices = [i for i, m in enumerate(source_list) if m.get('cluster') == cluster_id]
+        else:
+            indices = source_list.rows_for_cluster(cluster_id).tolist()
         if not indices: return pd.DataFrame()
 
         subset_matrix = full_matrix[indices]
 
         if len(subset_matrix) < 2:
-            return pd.DataFrame([source_list[i] for i in indices])
+            return pd.DataFrame([source_list[i].copy() for i in indices])
 
         # Localized UMAP
         n_neighbors = min(15, len(subset_matrix) - 1)
@@ -457,11 +779,16 @@ class KnowledgeBase:
         is_doc_mode = getattr(self, 'spatial_granularity', "Segments") == "Documents"
         source_list = self.documents_spatial if is_doc_mode else self.documents_metadata
         
-        subset = [m for m in source_list if m.get('cluster') == cluster_id]
-        if not subset: return {"docs": 0, "segments": 0, "topics": []}
-        
-        unique_docs = len(set(m.get('file') for m in subset))
-        total_segments = sum(m.get('segments', 1) for m in subset) if is_doc_mode else len(subset)
+        if is_doc_mode:
+            subset = [m for m in source_list if m.get('cluster') == cluster_id]
+            if not subset: return {"docs": 0, "segments": 0, "topics": []}
+            unique_docs = len(set(m.get('file') for m in subset))
+            total_segments = sum(m.get('segments', 1) for m in subset)
+        else:
+            rows = source_list.rows_for_cluster(cluster_id)
+            if not len(rows): return {"docs": 0, "segments": 0, "topics": []}
+            unique_docs = len(np.unique(source_list.file_ids[rows]))
+            total_segments = len(rows)
         
         return {
             "docs": unique_docs,
@@ -472,13 +799,13 @@ class KnowledgeBase:
     def get_cluster_topics(self, cluster_id, top_n=3):
         """Extracts dominant keywords for a cluster to provide semantic naming."""
         # Always use segments for topic modeling to get fine-grained keywords
-        indices = [i for i, m in enumerate(self.documents_metadata) if m.get('cluster') == cluster_id]
-        if not indices or self.tfidf_matrix is None:
+        indices = self.documents_metadata.rows_for_cluster(cluster_id)
+        if not len(indices) or self.tfidf_matrix is None:
             return [f"Galaxy {cluster_id}"]
 
         # Sum TF-IDF scores across the cluster to find top features
-        valid_indices = [idx for idx in indices if idx < self.tfidf_matrix.shape[0]]
-        if not valid_indices:
+        valid_indices = indices[indices < self.tfidf_matrix.shape[0]]
+        if not len(valid_indices):
             return [f"Galaxy {cluster_id} (Syncing)"]
             
         cluster_tfidf = self.tfidf_matrix[valid_indices].sum(axis=0)
@@ -506,7 +833,7 @@ class KnowledgeBase:
         total_segments = len(self.documents_metadata)
         
         # Build a map of cluster IDs to their semantic topics
-        all_clusters = sorted(list(set(m.get('cluster', 0) for m in self.documents_metadata)))
+        all_clusters = self.documents_metadata.cluster_ids() or [0]
         galaxy_map = {}
         for c in all_clusters:
             galaxy_map[c] = self.get_cluster_topics(c, top_n=2)
@@ -521,7 +848,8 @@ class KnowledgeBase:
     # PHASE 5: THE RETRIEVAL ENGINE
     # ------------------------------------------------------------------
 
-    def search(self, query_text, llm_service=None, top_n=None):
+    def search(self, query_text, llm_service=None, top_n=None, query_vector=None, filters=None,
+               mmr_lambda=None, merge_adjacent=None):
         """
         Orchestrates the search request across the selected engine.
         
@@ -535,38 +863,92 @@ class KnowledgeBase:
             query_text (str): The user's search query.
             llm_service: Required for 'Deep Learning' mode to vectorize the query.
             top_n (int): Number of results to return.
+            query_vector: Pre-computed query embedding (e.g. shared by every shard of a ShardedIndex).
+            filters: Optional SearchFilter (or its dict form) restricting the rows that are scored.
+            mmr_lambda (float): Per-query MMR trade-off (1.0 = plain top-k; None = `self.mmr_lambda`).
+            merge_adjacent (bool): Per-query override of `self.merge_adjacent` (join touching chunks).
         """
         if not self.documents_metadata: return []
         # Support for stale session objects that might lack this attribute
         default_limit = getattr(self, 'ml_top_n', 5)
         limit = top_n if top_n else default_limit
+        if mmr_lambda is None: mmr_lambda = getattr(self, 'mmr_lambda', 1.0)
+        if merge_adjacent is None: merge_adjacent = getattr(self, 'merge_adjacent', False)
+
+        # A background merge (watch mode) swaps metadata and vectors together;
+        # holding the lock keeps row i of both aligned for the whole search.
+        started = time.perf_counter()
+        self.last_search_profile = {}
+        with self.update_lock:
+            rows = self.filter_rows(filters)
+            filter_ms = elapsed_ms(started)
+            if rows is not None and not len(rows): return []
+            if self.engine_mode == "Machine Learning":
+                results = self._search_tfidf(query_text, limit, rows, mmr_lambda)
+            else:
+                results = self._search_neural(query_text, llm_service, limit, query_vector, rows, mmr_lambda)
+        if merge_adjacent: results = merge_adjacent_chunks(results)
+        self.last_search_profile = {**self.last_search_profile, "filter_ms": filter_ms,
+                                    "rows_scored": len(rows) if rows is not None else len(self.documents_metadata),
+                                    "search_ms": elapsed_ms(started)}
+        return results
+
+    def filter_rows(self, filters):
+        """
+        Row numbers selected by `filters` (sorted), or None when every row is in scope.
 
-        if self.engine_mode == "Machine Learning":
-            return self._search_tfidf(query_text, limit)
-        else:
-            return self._search_neural(query_text, llm_service, limit)
-
+        Performance Note:
+        A user typically asks several questions within one scope, so the
+        resolved rows are cached per (index version, table, filter).
+        """
+        scope = SearchFilter.coerce(filters)
+        if not scope: return None
+        table = self.documents_metadata
+        key = (getattr(self, 'index_version', None), id(table), len(table), scope.key())
+        cache = getattr(self, '_filter_cache', None)
+        if cache is None or cache[0] != key[:3]:
+            cache = self._filter_cache = (key[:3], {})
+        rows = cache[1].get(key[3])
+        if rows is None:
+            if len(cache[1]) >= 32: cache[1].clear()
+            rows = cache[1][key[3]] = scope.resolve(table)
+        return rows
+
+    def _search_tfidf(self, query, top_n, rows=None, mmr_lambda=1.0):
+        """
+        Keyword matching via TF-IDF dot-products.
 
-    def _search_tfidf(self, query, top_n):
-        """Keyword matching via TF-IDF dot-products."""
+        Performance Note:
+        The cosine is computed for all candidate rows with one matrix-vector
+        product; with `rows` (a filtered search) only those rows are read.
+        """
         if self.tfidf_matrix is None: return []
         
+        started = time.perf_counter()
         q_vec = self.vectorizer.transform([self.clean_text(query)]).toarray()[0]
         q_norm = np.linalg.norm(q_vec)
         if q_norm == 0: return []
+        embedded = time.perf_counter()
         
-        results = []
-        for i, doc_vec in enumerate(self.tfidf_matrix):
-            d_norm = np.linalg.norm(doc_vec)
-            if d_norm == 0: continue
-            score = np.dot(q_vec, doc_vec) / (q_norm * d_norm)
-            if score > 0.05:
-                meta = self.documents_metadata[i].copy()
-                meta['score'] = round(float(score), 4)
-                results.append(meta)
-        return sorted(results, key=lambda x: x['score'], reverse=True)[:top_n]
-
-    def _search_neural(self, query, llm, top_n):
+        matrix = self.tfidf_matrix if rows is None else self.tfidf_matrix[rows]
+        d_norms = np.linalg.norm(matrix, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(d_norms > 0, matrix @ q_vec / (q_norm * d_norms), 0.0)
+        cutoff = self.similarity_threshold("keyword")
+        # Any match is a candidate: _mmr/_collect_results apply the cutoff and the min_results floor
+        hits = np.flatnonzero(scores > 0)
+        top, top_scores = self._top_rows(scores[hits], self._candidate_pool(top_n, mmr_lambda))
+        row_ids = hits[top] if rows is None else rows[hits[top]]
+        scored = time.perf_counter()
+        if mmr_lambda < 1.0:
+            row_ids, top_scores = self._mmr(row_ids, top_scores, top_n, mmr_lambda, self.tfidf_matrix, cutoff,
+                                            getattr(self, 'min_results', 2))
+        results = self._collect_results(row_ids, top_scores, top_n, threshold=cutoff)
+        self.last_search_profile = {"embed_ms": round((embedded - started) * 1000, 2),
+                                    "score_ms": round((scored - embedded) * 1000, 2), "select_ms": elapsed_ms(scored)}
+        return results
+
+    def _search_neural(self, query, llm, top_n, query_vector=None, rows=None, mmr_lambda=1.0):
         """
         Contextual matching via dense vector similarity.
         
@@ -574,43 +956,356 @@ class KnowledgeBase:
         Instead of looping through documents (O(n)), we use NumPy's vectorization
         to calculate matches across the entire index simultaneously.
         """
-        if self.embeddings is None or not llm: return []
-        q_vec = np.array(llm.embed_text(query))
+        self.last_query_vector = None
+        if self.embeddings is None or (not llm and query_vector is None): return []
+        started = time.perf_counter()
+        q_vec = np.array(query_vector if query_vector is not None else llm.embed_text(query))
         if q_vec.size == 0: return []
+        self.last_query_vector = q_vec
+        embedded = time.perf_counter()
         
         # --- DIMENSION GUARDRAIL ---
         # If the user switched models (e.g., Nomic -> Gemma) without re-indexing,
         # the math will fail as the vectors have different lengths.
-        if q_vec.shape[0] != self.embeddings.shape[1]:
-            raise ValueError(f"Neural Dimension Mismatch: Index is {self.embeddings.shape[1]} (from {self.index_embedding_model}), but Query is {q_vec.shape[0]} (from {llm.embedding_model}). Please re-index.")
-
-        
+        index_dim = self.query_dimension()
+        if q_vec.shape[0] != index_dim:
+            raise ValueError(f"Neural Dimension Mismatch: Index is {index_dim} (from {self.index_embedding_model}), but Query is {q_vec.shape[0]} (from {getattr(llm, 'embedding_model', 'query')}). Please re-index.")
+        projection = getattr(self, 'projection', None)
+        if projection is not None:
+            # Same truncation / PCA basis the stored vectors went through
+            q_vec = projection.transform(q_vec)
+
+        found, scores = self._rank_neural(q_vec, self._candidate_pool(top_n, mmr_lambda), rows)
+        scored = time.perf_counter()
+        if mmr_lambda < 1.0:
+            found, scores = self._mmr(found, scores, top_n, mmr_lambda, self.embeddings, self.similarity_threshold(),
+                                      getattr(self, 'min_results', 2))
+        results = self._collect_results(found, scores, top_n)
+        # A pre-computed query vector (shards, index server) costs no embedding time here
+        self.last_search_profile = {"embed_ms": round((embedded - started) * 1000, 2) if query_vector is None else 0.0,
+                                    "score_ms": round((scored - embedded) * 1000, 2), "select_ms": elapsed_ms(scored)}
+        return results
+
+    def _candidate_pool(self, top_n, mmr_lambda):
+        """How many ranked candidates MMR chooses from (just `top_n` when MMR is off)."""
+        if mmr_lambda >= 1.0: return top_n
+        return top_n * max(1, int(getattr(self, 'mmr_candidates', 4)))
+
+    @staticmethod
+    def _mmr(rows, scores, top_n, mmr_lambda, matrix, threshold, min_results=0):
+        """
+        Re-selects `top_n` of the ranked candidates with Maximal Marginal Relevance.
+        Candidates below the relevance threshold are dropped first, so novelty
+        never pulls in a chunk the plain search would have rejected (apart from
+        the best `min_results`, which the plain search keeps as well).
+        """
+        rows, scores = np.asarray(rows), np.asarray(scores)
+        keep = scores > threshold
+        if keep.sum() < min_results:
+            best = np.argsort(-scores)[:min_results]
+            keep[best[scores[best] > 0]] = True
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) <= top_n: return rows, scores
+        pick = mmr_select(matrix[rows], scores, top_n, mmr_lambda)
+        return rows[pick], scores[pick]
+
+    def _rank_neural(self, q_vec, top_n, rows=None):
+        """(row indices, cosine scores) of the best matches for a projected query vector."""
+        quantized = self._quantized_index()
+        if quantized is not None:
+            # Two-pass search: compact int8/binary scan, exact rescoring of the best candidates
+            return quantized.search(self.embeddings, q_vec, top_n, getattr(self, 'rescore_oversample', 10), rows=rows)
         # Parallel Cosine Similarity using NumPy
         # Formula: (A . B) / (||A|| * ||B||)
         q_norm = np.linalg.norm(q_vec)
-        d_norms = np.linalg.norm(self.embeddings, axis=1)
-        sims = np.dot(self.embeddings, q_vec) / (q_norm * d_norms + 1e-9)
+        if rows is None:
+            sims = np.dot(self.embeddings, q_vec) / (q_norm * self._embedding_norms() + 1e-9)
+            return self._top_rows(sims, top_n)
+        # Filtered search: gather and score only the rows in scope
+        sims = np.dot(self.embeddings[rows], q_vec) / (q_norm * self._embedding_norms()[rows] + 1e-9)
+        top, scores = self._top_rows(sims, top_n)
+        return rows[top], scores
+
+    def search_batch(self, query_vectors, top_n=None, thresholds=None, filters=None, mmr_lambdas=None):
+        """
+        Neural search for several pre-computed query embeddings at once.
 
+        Performance Note:
+        The full-precision scan is memory-bound: every query streams the whole
+        embedding matrix through the CPU. Stacking the queries into one
+        (n, dim) x (dim, b) product reads the matrix once for all of them, so
+        a batch of 16 costs little more than a single query (used by the
+        index server to serve concurrent requests). Filtered queries score
+        only their own rows and are ranked individually.
+
+        Args:
+            query_vectors: (b, dim) raw query embeddings (before any projection).
+            top_n (int): Results per query.
+            thresholds (list): Optional per-query relevance cutoffs (None = `similarity_threshold()`).
+            filters (list): Optional per-query SearchFilter / dict (None = whole index).
+            mmr_lambdas (list): Optional per-query MMR trade-off (None = `mmr_lambda`).
+
+        Returns:
+            list[list[dict]]: One result list per query, as `search` returns.
+        """
+        limit = top_n if top_n else getattr(self, 'ml_top_n', 5)
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if queries.ndim != 2 or not len(queries) or self.embeddings is None or not self.documents_metadata:
+            return [[] for _ in range(len(queries))]
+        with self.update_lock:
+            index_dim = self.query_dimension()
+            if queries.shape[1] != index_dim:
+                raise ValueError(f"Neural Dimension Mismatch: Index is {index_dim} (from {self.index_embedding_model}), but Query is {queries.shape[1]}. Please re-index.")
+            projection = getattr(self, 'projection', None)
+            if projection is not None: queries = projection.transform(queries)
+
+            scopes = [self.filter_rows(f) for f in (filters or [None] * len(queries))]
+            default_lambda = getattr(self, 'mmr_lambda', 1.0)
+            lambdas = [default_lambda if lam is None else lam for lam in (mmr_lambdas or [None] * len(queries))]
+            pools = [self._candidate_pool(limit, lam) for lam in lambdas]
+            ranked = [None] * len(queries)
+            for j, rows in enumerate(scopes):
+                if rows is not None:
+                    ranked[j] = self._rank_neural(queries[j], pools[j], rows) if len(rows) else (rows, rows[:0])
+            shared = [j for j in range(len(queries)) if ranked[j] is None]
+            if shared and self._quantized_index() is not None:
+                for j in shared: ranked[j] = self._rank_neural(queries[j], pools[j])
+            elif shared:
+                sims = np.dot(self.embeddings, queries[shared].T) # (n, b): one pass over the matrix
+                sims /= self._embedding_norms()[:, None] * np.linalg.norm(queries[shared], axis=1)[None, :] + 1e-9
+                for col, j in enumerate(shared): ranked[j] = self._top_rows(sims[:, col], pools[j])
+            thresholds = thresholds or [None] * len(queries)
+            results = []
+            for (rows, scores), cutoff, lam in zip(ranked, thresholds, lambdas):
+                if lam < 1.0:
+                    floor = self.similarity_threshold() if cutoff is None else cutoff
+                    rows, scores = self._mmr(rows, scores, limit, lam, self.embeddings, floor, getattr(self, 'min_results', 2))
+                results.append(self._collect_results(rows, scores, limit, cutoff))
+            return results
+
+    # ------------------------------------------------------------------
+    # RELEVANCE THRESHOLDS
+    # ------------------------------------------------------------------
+
+    def calibrate_thresholds(self, llm_service=None):
+        """
+        Measures the index's similarity distribution and stores per-model cutoffs.
+
+        Runs at the end of every full build. Watch-mode merges keep the
+        existing profile (a few changed files barely move the distribution)
+        until the next rebuild; an index without one is calibrated on its
+        first merge.
+
+        Args:
+            llm_service: Embeds the dense pseudo-queries. Without it (or when
+                embedding fails) no neural profile is stored and the manual
+                cutoff applies.
+
+        Returns:
+            dict: The stored profiles ({'neural': ..., 'keyword': ...}).
+        """
+        calibration = {}
+        if self.engine_mode == "Deep Learning" and self.embeddings is not None and len(self.embeddings) \
+                and llm_service is not None:
+            # Probed with short chunk excerpts embedded like queries (chunk-to-chunk pairs score far higher)
+            sources, excerpts = text_queries(self.documents_metadata.texts)
+            vectors = llm_service.embed_batch(excerpts) if excerpts else []
+            if len(excerpts) and len(vectors) == len(excerpts):
+                queries = np.asarray(vectors, dtype=np.float32)
+                projection = getattr(self, 'projection', None)
+                if projection is not None: queries = projection.transform(queries)
+                profile = calibrate(self.embeddings, queries=queries, sources=sources)
+                if profile is not None:
+                    calibration["neural"] = dict(profile, model=self.index_embedding_model, probe="queries",
+                                                 dim=int(self.embeddings.shape[1]))
+        if self.engine_mode == "Machine Learning" and self.tfidf_matrix is not None and len(self.tfidf_matrix):
+            # Probed with few-term pseudo-queries; the fixed cutoff stays as a floor
+            sources, queries = keyword_queries(self.tfidf_matrix)
+            profile = calibrate(self.tfidf_matrix, floor=getattr(self, 'keyword_threshold', 0.05),
+                                queries=queries, sources=sources)
+            if profile is not None: calibration["keyword"] = dict(profile, model="Classical ML (TF-IDF)")
+        self.calibration = calibration
+        return calibration
+
+    def calibrated_threshold(self, kind="neural"):
+        """The stored cutoff for 'neural' or 'keyword' search, or None if it does not match this index."""
+        profile = (getattr(self, 'calibration', None) or {}).get(kind)
+        if not profile: return None
+        if kind == "neural":
+            # A profile measured on another model's vectors says nothing about these;
+            # one probed with whole chunks (older indexes) is far too strict for queries
+            if self.embeddings is None or profile.get("model") != self.index_embedding_model \
+                    or profile.get("dim") != self.embeddings.shape[1] or profile.get("probe") != "queries": return None
+        return profile["threshold"]
+
+    def similarity_threshold(self, kind="neural"):
+        """
+        The relevance cutoff searches apply: the calibrated one in 'auto'
+        mode (when available), else `neural_threshold` / `keyword_threshold`.
+        """
+        if getattr(self, 'threshold_mode', "manual") == "auto":
+            calibrated = self.calibrated_threshold(kind)
+            if calibrated is not None: return calibrated
+        return self.neural_threshold if kind == "neural" else getattr(self, 'keyword_threshold', 0.05)
+
+    def similarity_thresholds(self):
+        """Active cutoffs, their source and the stored profiles (served by the index server's /health)."""
+        kinds = {}
+        for kind in ("neural", "keyword"):
+            calibrated = getattr(self, 'threshold_mode', "manual") == "auto" and self.calibrated_threshold(kind) is not None
+            kinds[kind] = {"threshold": self.similarity_threshold(kind), "source": "calibrated" if calibrated else "manual"}
+        return {"mode": getattr(self, 'threshold_mode', "manual"), **kinds,
+                "calibration": getattr(self, 'calibration', None) or {}}
+
+    def query_dimension(self):
+        """Length of the raw query embedding this index expects (before projection)."""
+        projection = getattr(self, 'projection', None)
+        return projection.input_dim if projection is not None else self.embeddings.shape[1]
+
+    def _embedding_norms(self):
+        """L2 norm of every stored vector, computed once per embedding matrix."""
+        cached = getattr(self, '_row_norms', None)
+        if cached is None or cached[0] is not self.embeddings:
+            cached = self._row_norms = (self.embeddings, np.linalg.norm(self.embeddings, axis=1))
+        return cached[1]
+
+    @staticmethod
+    def _top_rows(sims, top_n):
+        """Row indices and scores of the best `top_n` similarities (ties keep row order)."""
+        k = min(top_n, len(sims))
+        if not k: return np.empty(0, dtype=np.int64), sims[:0]
+        kth = -np.partition(-sims, k - 1)[k - 1]
+        above = np.flatnonzero(sims > kth)
+        # Rows tied with the k-th score are taken in row order, so the cut is deterministic
+        top = np.sort(np.concatenate([above, np.flatnonzero(sims == kth)[:k - len(above)]]))
+        return top, sims[top]
+
+    def _collect_results(self, rows, scores, top_n, threshold=None):
+        """
+        Turns scored rows into result dicts above the threshold, best first.
+
+        The best `min_results` rows are kept even below the cutoff (flagged
+        `below_threshold`, positive scores only), so a cutoff set too strict for
+        the model still hands the LLM its closest evidence instead of nothing.
+        """
+        threshold = self.similarity_threshold() if threshold is None else threshold
+        floor = min(top_n, int(getattr(self, 'min_results', 2)))
+        rows, scores = np.asarray(rows), np.asarray(scores, dtype=np.float64)
         results = []
-        for i, score in enumerate(sims):
+        for j in np.argsort(-scores, kind="stable"):
+            score = float(scores[j])
             # We filter by a threshold to ensure quality in the final LLM context.
-            if score > self.neural_threshold: 
-                meta = self.documents_metadata[i].copy()
-                meta['score'] = round(float(score), 4)
-                results.append(meta)
-        return sorted(results, key=lambda x: x['score'], reverse=True)[:top_n]
+            above = score > threshold
+            if not above and (len(results) >= floor or score <= 0): break # Best first: the rest are lower
+            meta = self.documents_metadata[int(rows[j])].copy()
+            meta['chunk_id'] = int(rows[j])
+            meta['score'] = round(score, 4)
+            if not above: meta['below_threshold'] = True
+            results.append(meta)
+            if len(results) >= top_n: break
+        return results
+
+
+    def _quantized_index(self):
+        """The QuantizedIndex for the current embeddings, or None when quantization is off."""
+        mode = getattr(self, 'vector_quantization', "none")
+        if mode == "none" or self.embeddings is None or not len(self.embeddings): return None
+        current = getattr(self, '_quantized', None)
+        if current is None or current.mode != mode or len(current) != len(self.embeddings):
+            current = self._quantized = QuantizedIndex.build(self.embeddings, mode)
+        return current
+
+    def get_context_snippets(self, query_text, llm, top_n=5, expand=None, **search_options):
+        """
+        Returns the top N results as structured snippets for the ContextPacker.
+        Unlike `get_context_for_query`, the snippets keep their scores and
+        file/page labels so overlapping chunks can be merged before prompting.
+        `search_options` (filters, mmr_lambda, merge_adjacent) go to `search`;
+        `expand` overrides `expansion_mode` (see `expand_results`).
+        """
+        results = self.search(query_text, llm, top_n=top_n, **search_options)
+        started = time.perf_counter()
+        results = self.expand_results(results, expand)
+        self.last_search_profile = {**getattr(self, 'last_search_profile', {}), "expand_ms": elapsed_ms(started)}
+        return results
+
+    def expand_results(self, results, mode=None, dedupe=True):
+        """
+        Widens matched chunks to their window, neighbouring chunks or parent page.
 
+        Matching stays on the small chunks; only the returned context grows.
+        The text is cut from the DocumentStore page the chunk offsets point
+        into, and neighbours come from the table's chunk-adjacency index.
 
-    def get_context_for_query(self, query_text, llm, top_n=5):
+        Args:
+            results (list[dict]): Search results with src/start/end offsets.
+            mode (str): 'none', 'window', 'neighbors' or 'parent' (None = `self.expansion_mode`).
+            dedupe (bool): Merge expansions that overlap on the same page.
+        """
+        mode = mode or getattr(self, 'expansion_mode', "none")
+        if mode == "none" or not results: return results
+        table = self.documents_metadata
+        return expand_results(results, lambda src: self.doc_store.get(src, ""), table.chunk_bounds, mode,
+                              getattr(self, 'expansion_chars', 600), getattr(self, 'expansion_neighbors', 1),
+                              getattr(self, 'expansion_max_chars', 2400), dedupe)
+
+    def get_context_for_query(self, query_text, llm, top_n=5, **search_options):
         """Formats the top N results as a structured text block for the LLM."""
-        res = self.search(query_text, llm, top_n=top_n)
-        return "\n".join([f"[Source: {r['file']} P{r['page']} | Full Path: {r.get('full_path', 'N/A')}]\n{r['text']}\n" for r in res])
+        res = self.get_context_snippets(query_text, llm, top_n=top_n, **search_options)
+        return "\n".join([format_snippet(r) for r in res])
 
 
     def get_document_text(self, filename):
         """Retrieves raw content for summarization."""
+        if filename in self._content_parts: self.finalize_document(filename)
         return self.file_contents.get(filename, "")
 
+    def get_document_sections(self, filename, chunks_per_section=10):
+        """
+        Splits a document into sections for map-reduce summarization.
+
+        Sections are sized in units of the index's own chunk size
+        (`chunks_per_section * chunk_size` characters), but are cut from the
+        raw text so the LLM sees the original casing and punctuation rather
+        than the normalized chunk text.
+        """
+        text = self.get_document_text(filename)
+        return split_text(text, section_chars=max(1, chunks_per_section) * self.chunk_size)
+
+    def get_document_hash(self, filename):
+        """
+        Content fingerprint of a document's raw text.
+        Stable across sessions and rebuilds, so it keys persistent caches
+        (e.g. the summary store) without trusting filenames.
+        """
+        if not hasattr(self, 'file_hashes'): self.file_hashes = {}
+        if filename not in self.file_hashes:
+            if filename in self._content_parts: self.finalize_document(filename)
+            # The document store is content-addressed, so the hash is already known
+            stored = self.file_contents.hash_of(filename) if hasattr(self.file_contents, 'hash_of') else None
+            self.file_hashes[filename] = stored or hashlib.sha1(self.get_document_text(filename).encode('utf-8')).hexdigest()
+        return self.file_hashes[filename]
+
+    def get_document_records(self):
+        """
+        Collects per-file metadata (chunks, pages, size, type, path) from the
+        ChunkTable's file index, keyed by content hash for the summary store.
+        """
+        table = self.documents_metadata
+        records = {}
+        sizer = getattr(self.file_contents, 'chars', None)
+        for fname in self.get_file_manifest():
+            rows = table.rows_for_file(fname)
+            records[self.get_document_hash(fname)] = {
+                "filename": fname,
+                "chunks": len(rows),
+                "pages": table.distinct_pages(rows),
+                "chars": sizer(fname) if sizer else len(self.get_document_text(fname)),
+                "type": os.path.splitext(fname)[1].lower(),
+                "full_path": table.full_path_of(fname)
+            }
+        return records
+
     def get_file_manifest(self):
         """Returns a list of all unique filenames currently in the Knowledge Base."""
         return sorted(list(self.file_contents.keys()))
@@ -619,78 +1314,199 @@ class KnowledgeBase:
     # PHASE 6: PERSISTENCE (Save/Load)
     # ------------------------------------------------------------------
 
-    def save_to_disk(self, save_dir="data/index"):
-        """Serializes the current knowledge state to disk."""
+    def save_to_disk(self, save_dir="data/index", collect_garbage=True):
+        """
+        Serializes the current knowledge state to disk as a new snapshot.
+
+        Files are written to a staging directory and published atomically
+        (see `core/index_snapshots.py`), so a crash mid-save never leaves a
+        half-written index and concurrent readers never mix versions.
+
+        Args:
+            save_dir (str): Snapshot root.
+            collect_garbage (bool): Drop DocumentStore blobs no snapshot under
+                `save_dir` references and nobody wrote within `blob_gc_grace_minutes`
+                (off for shards, which share the main store).
+        """
         if not self.documents_metadata: return False
+        self.finalize_documents()
         
-        os.makedirs(save_dir, exist_ok=True)
+        store = SnapshotStore(save_dir, keep=getattr(self, 'snapshot_retention', 3))
+        staging = None
         try:
-            # 1. Save Text & Metadata (JSON)
-            payload = {
-                "metadata": self.documents_metadata,
-                "file_contents": self.file_contents,
-                "spatial": self.documents_spatial,
-                "engine_mode": self.engine_mode,
-                "index_model": getattr(self, "index_embedding_model", None),
-                "index_dim": getattr(self, "index_embedding_dimension", 0),
-                "granularity": self.spatial_granularity
-            }
-            with open(os.path.join(save_dir, "metadata.json"), "w") as f:
+            staging = store.begin()
+            with self.update_lock:
+                # 1. Save Text & Metadata (JSON)
+                # Raw text lives in the DocumentStore; chunks that point into it
+                # are written without their text and sliced back out on load.
+                metadata = self.documents_metadata.to_records(omit_stored_text=True)
+                payload = {
+                    "metadata": metadata,
+                    "documents": self.file_contents.to_manifest(),
+                    "spatial": self.documents_spatial,
+                    "engine_mode": self.engine_mode,
+                    "index_model": getattr(self, "index_embedding_model", None),
+                    "index_dim": getattr(self, "index_embedding_dimension", 0),
+                    "index_version": getattr(self, "index_version", None),
+                    "granularity": self.spatial_granularity,
+                    "calibration": getattr(self, 'calibration', None) or {}
+                }
+                blob_refs = set(payload["documents"].values()) | set(self.documents_metadata.sources)
+                tfidf_matrix, embeddings, vectorizer = self.tfidf_matrix, self.embeddings, self.vectorizer
+                quantized = self._quantized_index() if hasattr(self, 'vector_quantization') else None
+                projection = getattr(self, 'projection', None)
+
+            self.doc_store.commit()
+            with open(os.path.join(staging, "metadata.json"), "w") as f:
                 json.dump(payload, f)
+            with open(os.path.join(staging, BLOB_REFS), "w") as f:
+                f.write("\n".join(sorted(blob_refs)))
 
             # 2. Save Matrices (Numpy)
-            if self.tfidf_matrix is not None:
-                np.save(os.path.join(save_dir, "tfidf_matrix.npy"), self.tfidf_matrix)
-            if self.embeddings is not None:
-                np.save(os.path.join(save_dir, "embeddings.npy"), self.embeddings)
+            if tfidf_matrix is not None:
+                np.save(os.path.join(staging, "tfidf_matrix.npy"), tfidf_matrix)
+            if embeddings is not None:
+                np.save(os.path.join(staging, "embeddings.npy"), embeddings)
+            if quantized is not None:
+                quantized.save(os.path.join(staging, f"vectors_{quantized.mode}.npz"))
+            if projection is not None:
+                projection.save(os.path.join(staging, "projection.npz"))
 
             # 3. Save Vectorizer (Pickle - required for ML search)
-            with open(os.path.join(save_dir, "vectorizer.pkl"), "wb") as f:
-                pickle.dump(self.vectorizer, f)
-
+            with open(os.path.join(staging, "vectorizer.pkl"), "wb") as f:
+                pickle.dump(vectorizer, f)
+
+            # 4. Publish (atomic CURRENT swap) and prune old snapshots
+            self.loaded_snapshot = store.publish(staging, {
+                "engine_mode": payload["engine_mode"], "index_model": payload["index_model"],
+                "index_dim": payload["index_dim"], "index_version": payload["index_version"],
+                "chunks": len(metadata), "documents": len(payload["documents"]),
+                "projection": projection.describe() if projection is not None else None})
+
+            # Drop blobs no longer referenced by any retained snapshot
+            # (grace period: other sessions may hold blobs of builds they have not saved yet)
+            if collect_garbage:
+                self.doc_store.gc(blob_refs | store.referenced_blobs(),
+                                  grace_s=getattr(self, 'blob_gc_grace_minutes', 60) * 60)
             return True
         except Exception as e:
+            if staging: store.discard(staging)
             print(f"Save error: {e}")
             return False
 
-    def load_from_disk(self, load_dir="data/index"):
-        """Restores the knowledge state from disk."""
-        if not os.path.exists(load_dir): return False
+    def load_from_disk(self, load_dir="data/index", snapshot=None, verify=False, mmap=None):
+        """
+        Restores the knowledge state from disk.
+
+        Args:
+            load_dir (str): Index root (snapshots, or a legacy flat index).
+            snapshot (str): Specific snapshot id (default: the CURRENT one).
+            verify (bool): Re-hash the snapshot's files against its manifest first.
+            mmap (bool): Memory-map the embedding matrix (default: only when quantization is on).
+
+        Developer Note (Hot Reload):
+        Everything is read into locals first and swapped in under
+        `update_lock`, so a search running on another thread sees either the
+        old index or the new one, never a mix, and is only blocked for the
+        duration of the attribute swap.
+        """
+        store = SnapshotStore(load_dir)
+        sid = snapshot or store.current_id()
+        path = store.path_of(sid) if sid else store.current_path()
+        if not path or not os.path.exists(path): return False
         
         try:
+            if sid and verify:
+                ok, problems = store.verify(sid, self.doc_store)
+                if not ok:
+                    print(f"Load error: snapshot {sid} failed verification: {problems}")
+                    return False
+
             # 1. Load Text & Metadata
-            meta_path = os.path.join(load_dir, "metadata.json")
+            payload = None
+            meta_path = os.path.join(path, "metadata.json")
             if os.path.exists(meta_path):
                 with open(meta_path, "r") as f:
                     payload = json.load(f)
-                    self.documents_metadata = payload.get("metadata", [])
-                    self.file_contents = payload.get("file_contents", {})
+                table = ChunkTable.from_records(payload.get("metadata", []))
+                if "documents" in payload:
+                    file_contents = DocumentTextMap(self.doc_store, payload["documents"])
+                else:
+                    # Legacy layout: raw text inlined in metadata.json -> move it into the store
+                    file_contents = DocumentTextMap(self.doc_store)
+                    for fname, text in payload.get("file_contents", {}).items():
+                        file_contents[fname] = text
+                # A blob lost from the DocumentStore would silently load as empty text
+                missing = self.doc_store.missing(set(table.sources) | set(file_contents.to_manifest().values()))
+                if missing:
+                    print(f"Load error: {len(missing)} document blobs missing from the DocumentStore "
+                          f"(e.g. {', '.join(sorted(missing)[:3])}); re-index or roll back the snapshot.")
+                    return False
+                self._rehydrate_chunk_text(table)
+
+            # 2. Load Matrices (absent files mean the engine did not produce them)
+            tfidf_path = os.path.join(path, "tfidf_matrix.npy")
+            tfidf_matrix = np.load(tfidf_path) if os.path.exists(tfidf_path) else None
+            embed_path = os.path.join(path, "embeddings.npy")
+            mode = getattr(self, 'vector_quantization', "none")
+            # With quantization on, searches scan the compact codes and only read candidate
+            # rows at full precision, so the float matrix stays memory-mapped on disk.
+            # The index server maps it too: the page cache is shared between processes.
+            if mmap is None: mmap = mode != "none"
+            embeddings = np.load(embed_path, mmap_mode='r' if mmap else None) \
+                if os.path.exists(embed_path) else None
+            proj_path = os.path.join(path, "projection.npz")
+            projection = EmbeddingProjection.load(proj_path) if os.path.exists(proj_path) else None
+            quantized = None
+            codes_path = os.path.join(path, f"vectors_{mode}.npz")
+            if mode != "none" and os.path.exists(codes_path):
+                quantized = QuantizedIndex.load(codes_path)
+
+            # 3. Load Vectorizer
+            vectorizer = None
+            vec_path = os.path.join(path, "vectorizer.pkl")
+            if os.path.exists(vec_path):
+                with open(vec_path, "rb") as f:
+                    vectorizer = pickle.load(f)
+
+            # 4. Swap in
+            with self.update_lock:
+                if payload is not None:
+                    self.documents_metadata = table
+                    self.file_contents = file_contents
                     self.documents_spatial = payload.get("spatial", [])
                     self.engine_mode = payload.get("engine_mode", "Deep Learning")
                     self.index_embedding_model = payload.get("index_model")
                     self.index_embedding_dimension = payload.get("index_dim", 0)
                     self.spatial_granularity = payload.get("granularity", "Segments")
-
-            # 2. Load Matrices
-            tfidf_path = os.path.join(load_dir, "tfidf_matrix.npy")
-            if os.path.exists(tfidf_path):
-                self.tfidf_matrix = np.load(tfidf_path)
-            
-            embed_path = os.path.join(load_dir, "embeddings.npy")
-            if os.path.exists(embed_path):
-                self.embeddings = np.load(embed_path)
-
-            # 3. Load Vectorizer
-            vec_path = os.path.join(load_dir, "vectorizer.pkl")
-            if os.path.exists(vec_path):
-                with open(vec_path, "rb") as f:
-                    self.vectorizer = pickle.load(f)
+                    self.calibration = payload.get("calibration") or {}
+                    self.index_version = payload.get("index_version") or \
+                        self._compute_index_version(table.texts)
+                    self.file_hashes = {}
+                    self._content_parts = {}
+                self.tfidf_matrix = tfidf_matrix
+                self.embeddings = embeddings
+                self._quantized = quantized
+                self._row_norms = None
+                self.projection = projection
+                if vectorizer is not None: self.vectorizer = vectorizer
+                self.loaded_snapshot = sid
 
             return True
         except Exception as e:
             print(f"Load error: {e}")
             return False
 
+    def _rehydrate_chunk_text(self, table):
+        """Restores chunk text from (src, start, end) offsets into the DocumentStore."""
+        pages = {}
+        for row, text in enumerate(table.texts):
+            if text is not None: continue
+            src = table.get_value(row, 'src', None)
+            if src is None: continue
+            if src not in pages: pages[src] = self.doc_store.get(src) # Presence checked by load_from_disk
+            table.texts[row] = pages[src][table.get_value(row, 'start'):table.get_value(row, 'end')]
+
     def get_top_keywords_df(self, top_n=10):
         """Analytics: Identifies the most statistically important terms in the index."""
         if self.engine_mode == "Machine Learning" and self.tfidf_matrix is not None:
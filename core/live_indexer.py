@@ -0,0 +1,164 @@
+"""
+Live Indexer — Incremental KnowledgeBase Updates from Watch Mode
+================================================================
+
+Architecture Rationale:
+-----------------------
+`VaultWatcher` reports which files changed; this class turns those batches
+into index updates without a full rebuild:
+
+1. **Staging**: Changed files are parsed and chunked into a throw-away
+   `KnowledgeBase` with the live index's settings. Parsing goes through the
+   extraction cache, and nothing the user is searching is touched yet.
+2. **Merge**: `KnowledgeBase.apply_file_updates` embeds only the new chunks
+   and swaps them in under the KB's `update_lock`, so a concurrent search
+   never sees metadata and vectors out of step.
+3. **Persist**: The merged index is saved, so a restart picks it up.
+4. **Shards**: With a ShardedIndex attached, only the shards holding the
+   changed files are rebuilt from the merged index.
+
+Developer Note (Streamlit):
+Like `BatchSummaryJob`, this runs on a background thread and must never touch
+`st.session_state`; it holds direct references to the KB and LLM service and
+the UI polls its `history`.
+
+One Watcher Per Process:
+Every session would otherwise start its own watcher/indexer pair, and two
+pairs merge the same changes and publish competing snapshots to the same
+index directory. `shared_watch()` keeps a single pair per process (module
+state survives Streamlit reruns and sessions); sessions only read its status
+and pick up its snapshots through the normal hot reload. Before each batch
+the indexer re-loads its KB if another session published a newer snapshot,
+so a batch is never merged into (and saved over) an outdated index.
+"""
+
+import os
+import threading
+import time
+
+from core.index_snapshots import SnapshotStore
+from core.knowledge_base import KnowledgeBase
+from utils.file_processor import process_single_file
+
+
+class LiveIndexer:
+    """Applies watcher change batches to a live KnowledgeBase."""
+
+    def __init__(self, kb, llm=None, extraction_cache=None, summary_store=None, save_dir="data/index", shards=None):
+        """
+        Args:
+            kb (KnowledgeBase): The live index to update.
+            llm: OllamaService used to embed new chunks ('Deep Learning' mode).
+            extraction_cache: Optional ExtractionCache to skip re-parsing.
+            summary_store: Optional DocumentSummaryStore whose metadata is refreshed.
+            save_dir (str): Where the merged index is persisted.
+            shards (ShardedIndex): Optional sharded index kept in sync with the merged one.
+        """
+        self.kb = kb
+        self.llm = llm
+        self.extraction_cache = extraction_cache
+        self.summary_store = summary_store
+        self.save_dir = save_dir
+        self.shards = shards
+        self.generation = 0 # Incremented on every applied batch (UI refresh trigger)
+        self.history = []   # Most recent batch reports, newest last
+        self._lock = threading.Lock() # One batch at a time
+
+    def _new_staging_kb(self):
+        kb = self.kb
+        staging = KnowledgeBase(chunk_size=kb.chunk_size, overlap_size=kb.overlap_size, engine_mode=kb.engine_mode,
+                                doc_store=kb.doc_store)
+        for attr in ("dataset_overlap", "dataset_chunk_rows", "pdf_backend", "pdf_workers"):
+            setattr(staging, attr, getattr(kb, attr, getattr(staging, attr)))
+        return staging
+
+    def _display_name(self, path):
+        """
+        Name `path` is (or will be) indexed under.
+
+        The KB identifies files by basename. When that name already belongs to
+        a file at another path (same name under another root), this file is
+        indexed under its full path instead (which keeps the extension the
+        ingestion routing relies on), so neither one replaces or removes the
+        other.
+        """
+        name = os.path.basename(path)
+        qualified = os.path.normpath(path)
+        table = self.kb.documents_metadata
+        if not hasattr(table, "full_path_of"): return name
+        if table.full_path_of(qualified) is not None: return qualified # Already indexed qualified
+        recorded = table.full_path_of(name)
+        if recorded is None or os.path.normcase(os.path.abspath(recorded)) == os.path.normcase(os.path.abspath(path)):
+            return name
+        return qualified
+
+    def apply_batch(self, changed_paths, removed_paths):
+        """
+        Re-ingests changed files and drops removed ones (the VaultWatcher callback).
+
+        Returns:
+            dict: The batch report (also appended to `history`).
+        """
+        with self._lock:
+            started = time.perf_counter()
+            published = SnapshotStore(self.save_dir).current_id()
+            if published and published != getattr(self.kb, "loaded_snapshot", None):
+                self.kb.load_from_disk(self.save_dir) # A session rebuilt or another indexer published
+            staging = self._new_staging_kb()
+            errors = []
+            for path in changed_paths:
+                try:
+                    process_single_file(path, staging, self._display_name(path), path, cache=self.extraction_cache)
+                except Exception as e:
+                    errors.append(f"{path} - {e}")
+            if self.extraction_cache is not None: self.extraction_cache.flush()
+
+            # Files are identified by display name across the KB; resolve it from the
+            # recorded full path so a same-named file under another root is kept
+            removed_names = {self._display_name(p) for p in removed_paths}
+            llm = self.llm if self.kb.engine_mode == "Deep Learning" else None
+            merge = self.kb.apply_file_updates(staging, removed_names, llm)
+            self.kb.save_to_disk(self.save_dir)
+            if self.shards is not None and self.shards.strategy != "none":
+                merge["shards"] = self.shards.sync(self.kb)
+            if self.summary_store is not None:
+                self.summary_store.update_metadata(self.kb.get_document_records())
+
+            self.generation += 1
+            report = {"time": time.time(), "changed": len(changed_paths), "removed": len(removed_paths),
+                      "seconds": round(time.perf_counter() - started, 2), "errors": errors, **merge}
+            self.history = (self.history + [report])[-20:]
+            return report
+
+
+_shared_lock = threading.Lock()
+_shared = {"key": None, "watcher": None, "indexer": None}
+
+
+def shared_watch(key, start=None):
+    """
+    The process-wide (watcher, indexer) pair.
+
+    Args:
+        key (tuple): Roots and settings the pair runs with. A different key (or
+            a dead watcher thread) replaces the running pair; None stops it.
+        start (callable): Builds and starts a new `(watcher, indexer)` for `key`.
+
+    Returns:
+        tuple: (watcher, indexer), or (None, None) when nothing is running.
+    """
+    with _shared_lock:
+        watcher = _shared["watcher"]
+        if watcher is not None and (key != _shared["key"] or not watcher.is_running()):
+            watcher.stop()
+            _shared.update(key=None, watcher=None, indexer=None)
+        if key is not None and _shared["watcher"] is None:
+            watcher, indexer = start()
+            _shared.update(key=key, watcher=watcher, indexer=indexer)
+        return _shared["watcher"], _shared["indexer"]
+
+
+def current_watch():
+    """The running (watcher, indexer) pair without changing it."""
+    with _shared_lock:
+        return _shared["watcher"], _shared["indexer"]
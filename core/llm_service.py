@@ -21,7 +21,13 @@ Anthropic, only this file needs significant modification.
 
 from __future__ import annotations
 import ollama
+import os
 import re
+import time
+from core.context_packer import ContextPacker, CHARS_PER_TOKEN
+from core.summarizer import MapReduceSummarizer, split_text
+from core.embedding_batcher import shared_batcher
+from core.query_profiler import elapsed_ms
 
 class OllamaService:
     """
@@ -49,6 +55,23 @@ class OllamaService:
             "total_tokens": 0
         }
 
+        # Prompt Budgeting: Fits manifest, snippets and history into a token budget
+        self.context_packer = ContextPacker()
+        self.last_pack_report = {}
+
+        # Runtime Residency: Keeps the model (and its KV cache) warm between turns
+        self.keep_alive = "30m"
+        self.num_ctx = 8192
+        self._last_prompt_messages = []
+
+        # Long-Document Summarization: concurrent map-reduce with a section cache
+        self.summarizer = MapReduceSummarizer(self)
+
+        # Query Embedding Micro-Batching: concurrent embed_text calls share one request
+        self.embed_batching = True
+        self.embed_batch_max = 16
+        self.embed_batch_wait_ms = 5.0
+
     # ------------------------------------------------------------------
     # 1. NEURAL CORE (Embeddings)
     # ------------------------------------------------------------------
@@ -57,7 +80,15 @@ class OllamaService:
         """
         Generates a neural embedding for a single text chunk.
         Used for real-time query vectorization.
+
+        With `embed_batching` on, the text joins the process-wide
+        EmbeddingBatcher, so concurrent callers (other sessions, index server
+        handlers) are embedded together in one `ollama.embed` request.
         """
+        if getattr(self, 'embed_batching', False):
+            batcher = shared_batcher(self._embed_many, getattr(self, 'embed_batch_max', 16),
+                                     getattr(self, 'embed_batch_wait_ms', 5.0))
+            return batcher.embed(self.embedding_model, text)
         try:
             response = ollama.embeddings(model=self.embedding_model, prompt=text)
             return response["embedding"]
@@ -65,6 +96,11 @@ class OllamaService:
             print(f"Embedding error: {e}")
             return []
 
+    @staticmethod
+    def _embed_many(model: str, texts: list[str]) -> list[list[float]]:
+        """One batched embedding request (the EmbeddingBatcher's dispatch call)."""
+        return ollama.embed(model=model, input=texts).get("embeddings", [])
+
     def get_embedding_dimension(self) -> int:
         """Probes the current model to determine its vector dimension."""
         try:
@@ -177,7 +213,7 @@ class OllamaService:
     # 3. CONTEXTUAL INTELLIGENCE (RAG & Chat)
     # ------------------------------------------------------------------
 
-    def _build_rag_messages(self, query: str, context_text: str,
+    def _build_rag_messages(self, query: str, context_text: str | list[dict],
                              chat_history: list[dict] | None = None,
                              agent_context: str | None = None,
                              file_manifest: list[str] | None = None) -> list[dict]:
@@ -185,30 +221,59 @@ class OllamaService:
         Constructs a prompt that grounds the LLM in the provided document context.
         
         Developer Insight (Prompt Engineering):
-        We use a three-tier system prompt:
+        We use a three-tier prompt:
         1. **Identity**: Role instructions from AGENT.md.
-        2. **Grounding**: The specific file manifest and retrieval context.
+        2. **Grounding**: The file manifest (system) and retrieval context (final user turn).
         3. **Constraints**: Formatting rules to prevent 'context-leaking' or hallucinations.
+
+        Theory Note: Prefix Caching
+        ---------------------------
+        Ollama keeps the KV cache of the last prompt it evaluated. If the next
+        prompt starts with the same tokens, those tokens are reused instead of
+        being evaluated again. We therefore lay the prompt out as:
+        - **Stable Prefix**: system prompt (persona + manifest + rules) followed
+          by the conversation history. Identical from one turn to the next.
+        - **Variable Suffix**: the retrieved snippets and the question, placed
+          in the final user message. Only this part changes per query.
+
+        Before assembly, the manifest, snippets and history are passed through the
+        ContextPacker so the prompt never exceeds the configured token budget.
+        The resulting savings are stored in `self.last_pack_report`.
+
+        Args:
+            context_text: Retrieval results (list of dicts) or a pre-rendered context string.
         """
 
+        # Clean out HTML tags if any were stored in history
+        history = []
+        if chat_history:
+            for msg in chat_history:
+                if msg.get("role") not in ("user", "assistant"): continue
+                clean_content = re.sub(r'<[^>]+>', '', str(msg.get("content", ""))).strip()
+                if clean_content:
+                    history.append({"role": msg["role"], "content": clean_content})
+            # The UI appends the pending query to history before searching;
+            # it is re-sent below with its context, so don't pay for it twice.
+            if history and history[-1]["role"] == "user" and history[-1]["content"] == query.strip():
+                history.pop()
+
+        packed = self.context_packer.pack(context_text, file_manifest, history)
+        self.last_pack_report = packed["report"]
+
         system_prompt = ""
         if agent_context:
             system_prompt += f"{agent_context}\n\n"
         else:
             system_prompt += "You are a knowledgeable research assistant. "
 
-        if file_manifest:
-            manifest_str = ", ".join(file_manifest)
-            system_prompt += f"You have access to a Knowledge Base containing the following files: [{manifest_str}].\n\n"
+        if packed["manifest"]:
+            system_prompt += f"You have access to a Knowledge Base containing the following files: [{packed['manifest']}].\n\n"
             
         system_prompt += (
-            "Your job is to answer the user's question using the provided document context below.\n"
+            "Your job is to answer the user's question using the document context supplied with each question.\n"
             "Each document snippet is labeled with a 'Source' filename and a 'Full Path'.\n"
             "If the user asks for the location or full path of a file, ALWAYS provide the 'Full Path' correctly from the context snippets.\n"
             "If the answer isn't in the provided snippets, look at the file manifest above. If a relevant file exists but its content is missing from the snippets, tell the user you know the file exists but it didn't return a strong match for this query.\n\n"
-            "--- DOCUMENT CONTEXT ---\n"
-            f"{context_text}\n"
-            "--- END CONTEXT ---\n\n"
             "Constraints:\n"
             "- If the answer isn't in the context and you can't infer it from the manifest, say 'I don't have enough information'.\n"
             "- Cite specific filenames and page numbers if available.\n"
@@ -216,22 +281,63 @@ class OllamaService:
             "- Keep technical explanations precise."
         )
 
-
+        # --- STABLE PREFIX ---
         messages = [{"role": "system", "content": system_prompt}]
 
-        # Append last 5 turns of history for conversational memory
-        if chat_history:
-            relevant_history = [m for m in chat_history if m.get("role") in ("user", "assistant")][-5:]
-            for msg in relevant_history:
-                # Clean out HTML tags if any were stored in history
-                clean_content = re.sub(r'<[^>]+>', '', str(msg.get("content", ""))).strip()
-                if clean_content:
-                    messages.append({"role": msg["role"], "content": clean_content})
+        # Append the budgeted tail of history (up to 5 turns) for conversational memory
+        messages.extend(packed["history"])
 
-        messages.append({"role": "user", "content": query})
+        # --- VARIABLE SUFFIX ---
+        user_turn = (
+            "--- DOCUMENT CONTEXT ---\n"
+            f"{packed['context']}\n"
+            "--- END CONTEXT ---\n\n"
+            f"Question: {query}"
+        )
+        messages.append({"role": "user", "content": user_turn})
         return messages
 
-    def generate_rag_response(self, query: str, context_text: str,
+    def _model_options(self, **overrides) -> dict:
+        """Merges the session-wide runtime options (context window) with per-call sampling options."""
+        options = {"num_ctx": self.num_ctx} if self.num_ctx else {}
+        options.update(overrides)
+        return options
+
+    def _measure_prefix_reuse(self, messages: list[dict]) -> int:
+        """
+        Estimates how many prompt tokens Ollama can reuse from the previous turn.
+
+        We compare the messages with the last prompt we sent: whole messages
+        that are identical (system prompt, older history) count fully, and the
+        first differing message contributes its common character prefix.
+        """
+        previous = self._last_prompt_messages
+        self._last_prompt_messages = [dict(m) for m in messages]
+
+        reused_chars = 0
+        for prev, cur in zip(previous, messages):
+            if prev["role"] != cur["role"]: break
+            if prev["content"] == cur["content"]:
+                reused_chars += len(cur["content"])
+                continue
+            reused_chars += len(os.path.commonprefix([prev["content"], cur["content"]]))
+            break
+        return reused_chars // CHARS_PER_TOKEN
+
+    def preload_model(self) -> bool:
+        """
+        Loads the chat model into memory ahead of the first query.
+        An empty prompt makes Ollama load the weights and honor `keep_alive`
+        without generating any tokens.
+        """
+        try:
+            ollama.generate(model=self.model_name, prompt="", keep_alive=self.keep_alive)
+            return True
+        except Exception as e:
+            print(f"Preload error: {e}")
+            return False
+
+    def generate_rag_response(self, query: str, context_text: str | list[dict],
                                 chat_history: list[dict] | None = None,
                                 agent_context: str | None = None,
                                 file_manifest: list[str] | None = None):
@@ -249,72 +355,133 @@ class OllamaService:
         where they repeat the same sentence. 
         - repeat_penalty (1.2): Higher values make the model less likely to repeat tokens.
         - repeat_last_n (64): The "memory window" the model checks for repetitions.
+
+        Performance Note:
+        `keep_alive` keeps the model resident between turns and `num_ctx` pins
+        the context window size; changing `num_ctx` forces a model reload, so
+        it is set once from ConfigManager rather than per request.
+
+        Profiling Note: `last_run_stats` also records time-to-first-token and
+        total generation time (measured here) and the decode speed from
+        Ollama's own `eval_duration`, for the chat hub's profile panel.
         """
 
 
         messages = self._build_rag_messages(query, context_text, chat_history, agent_context, file_manifest)
+        reused_tokens = self._measure_prefix_reuse(messages)
+        prompt_chars = sum(len(m["content"]) for m in messages)
 
+        started = time.perf_counter()
+        ttft_ms = None
+        # A failed stream must not leave the previous answer's numbers behind
+        self.last_run_stats = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
         try:
             stream = ollama.chat(
                 model=self.model_name,
                 messages=messages,
                 stream=True,
-                options={
-                    "temperature": 0.3,
-                    "repeat_penalty": 1.2,
-                    "repeat_last_n": 64
-                }
+                keep_alive=self.keep_alive,
+                options=self._model_options(
+                    temperature=0.3,
+                    repeat_penalty=1.2,
+                    repeat_last_n=64
+                )
             )
 
             current_response = ""
             for chunk in stream:
                 token_text = chunk["message"]["content"]
                 current_response += token_text
+                if token_text and ttft_ms is None: ttft_ms = elapsed_ms(started)
                 
                 # Capture stats if provided in the final chunk
                 if chunk.get("done"):
+                    prompt_tokens = chunk.get("prompt_eval_count", 0) or 0
+                    prompt_ns = chunk.get("prompt_eval_duration", 0) or 0
+                    eval_tokens = chunk.get("eval_count", 0) or 0
+                    eval_ns = chunk.get("eval_duration", 0) or 0
+                    # Durations are reported in nanoseconds
+                    per_token_ms = (prompt_ns / 1e6 / prompt_tokens) if prompt_tokens else 0.0
                     self.last_run_stats = {
-                        "input_tokens": chunk.get("prompt_eval_count", 0),
-                        "output_tokens": chunk.get("eval_count", 0),
-                        "total_tokens": chunk.get("prompt_eval_count", 0) + chunk.get("eval_count", 0)
+                        "input_tokens": prompt_tokens,
+                        "output_tokens": eval_tokens,
+                        "total_tokens": prompt_tokens + eval_tokens,
+                        "prompt_eval_ms": round(prompt_ns / 1e6, 1),
+                        "load_ms": round((chunk.get("load_duration", 0) or 0) / 1e6, 1),
+                        "cached_prefix_tokens": reused_tokens,
+                        "prompt_eval_saved_ms": round(reused_tokens * per_token_ms, 1),
+                        "prompt_chars": prompt_chars,
+                        "eval_ms": round(eval_ns / 1e6, 1),
+                        "tokens_per_s": round(eval_tokens / (eval_ns / 1e9), 1) if eval_ns else None,
+                        "ollama_total_ms": round((chunk.get("total_duration", 0) or 0) / 1e6, 1),
+                        "ttft_ms": ttft_ms
                     }
                 
                 if token_text:
                     yield token_text
         except Exception as e:
             yield f"⚠️ LLM Error: {str(e)}"
+        finally:
+            # Wall time until the stream ended (or the UI stopped reading it)
+            self.last_run_stats["generation_ms"] = elapsed_ms(started)
 
     # ------------------------------------------------------------------
     # 4. SUMMARIZATION & ANALYTICS
     # ------------------------------------------------------------------
 
-    def summarize_text(self, text: str, filename: str) -> str:
+    def chat_once(self, system_prompt: str, user_content: str) -> tuple[str | None, dict]:
         """
-        Uses the LLM to generate a structured executive summary of a document.
-        Optimized for high-density information extraction.
+        Single non-streaming completion used by the map-reduce summarizer.
+        Safe to call from worker threads: it never touches `last_run_stats`.
+
+        Returns:
+            tuple: (content or None on failure, token stats)
         """
-        # Truncate to stay within context window limits (~12k chars safety)
-        safe_text = text[:12000]
-        
         messages = [
-            {"role": "system", "content": "Summarize this document strictly into 3 bullet points: Context, Key Findings, and Conclusion."},
-            {"role": "user", "content": f"Document: {filename}\nContent:\n{safe_text}"}
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
         ]
-
         try:
-            response = ollama.chat(model=self.model_name, messages=messages, stream=False)
-            
-            # Record analytics
-            self.last_run_stats = {
-                "input_tokens": response.get("prompt_eval_count", 0),
-                "output_tokens": response.get("eval_count", 0),
-                "total_tokens": response.get("prompt_eval_count", 0) + response.get("eval_count", 0)
+            response = ollama.chat(model=self.model_name, messages=messages, stream=False,
+                                   keep_alive=self.keep_alive, options=self._model_options())
+            return response["message"]["content"], {
+                "input_tokens": response.get("prompt_eval_count", 0) or 0,
+                "output_tokens": response.get("eval_count", 0) or 0
             }
-            
-            return response["message"]["content"]
         except Exception as e:
-            return f"Failed to generate summary: {str(e)}"
+            print(f"Summarization error: {e}")
+            return None, {"error": str(e)}
+
+    def summarize_document(self, sections: list[str], filename: str) -> tuple[str, dict]:
+        """
+        Summarizes a whole document from its sections via concurrent map-reduce.
+        Safe to call from worker threads (`BatchSummaryJob`): token counts are
+        returned in the stats, never written to `last_run_stats`.
+
+        Args:
+            sections (list[str]): Document sections (see `KnowledgeBase.get_document_sections`).
+            filename (str): Display name used in the prompts.
+
+        Returns:
+            tuple: (summary text, map-reduce stats)
+        """
+        return self.summarizer.summarize(sections, filename)
+
+    def summarize_text(self, text: str, filename: str) -> str:
+        """
+        Uses the LLM to generate a structured executive summary of a document.
+        Optimized for high-density information extraction.
+
+        Long texts are no longer truncated: they are split into sections and
+        summarized through the map-reduce pipeline in `core/summarizer.py`.
+        """
+        summary, _ = self.summarize_document(split_text(text), filename)
+        return summary
 
     def get_last_stats(self) -> dict:
         """Returns the token analytics from the most recent LLM operation."""
         return self.last_run_stats
+
+    def get_last_pack_report(self) -> dict:
+        """Returns the ContextPacker report (tokens saved) from the most recent RAG prompt."""
+        return self.last_pack_report
@@ -0,0 +1,83 @@
+"""
+Embedding Projection — Reduced-Dimension Neural Search
+======================================================
+
+Architecture Rationale:
+-----------------------
+Memory and scan time of the neural index grow linearly with the embedding
+dimension (1024 for mxbai-embed-large). Most of the ranking signal usually
+lives in far fewer dimensions, so the index can store and search shorter
+vectors at a small quality cost:
+
+1. **Truncate (Matryoshka)**: Models trained with Matryoshka Representation
+   Learning (e.g. nomic-embed-text v1.5, mxbai-embed-large) front-load
+   information, so the first `d` dimensions are a usable embedding on their
+   own. No fitting needed.
+2. **PCA**: For models without that property, a PCA basis is fitted on the
+   indexed vectors and every vector (and query) is projected onto its top
+   `d` components — the linear projection that keeps the most variance.
+
+The projection is fitted once per index build, persisted inside the index
+snapshot (`projection.npz`) and applied to every query in `_search_neural`,
+so stored vectors and queries always live in the same space.
+"""
+
+import numpy as np
+from sklearn.decomposition import PCA
+
+MODES = ("none", "truncate", "pca")
+PCA_FIT_ROWS = 20000 # Sample size for fitting the PCA basis
+
+
+class EmbeddingProjection:
+    """Maps full-size embeddings to `output_dim` dimensions (truncation or PCA)."""
+
+    def __init__(self, mode, input_dim, output_dim, mean=None, components=None):
+        if mode not in ("truncate", "pca"): raise ValueError(f"Unknown projection mode: {mode}")
+        self.mode = mode
+        self.input_dim = int(input_dim)
+        self.output_dim = int(output_dim)
+        self.mean = mean
+        self.components = components # (output_dim, input_dim) for PCA
+
+    @classmethod
+    def fit(cls, matrix, mode, output_dim):
+        """
+        Builds a projection for `matrix` (n, input_dim).
+
+        Returns:
+            EmbeddingProjection | None: None when no reduction applies
+            (mode 'none', or `output_dim` not smaller than the input).
+        """
+        n, input_dim = matrix.shape
+        if mode == "none" or not output_dim or output_dim >= input_dim: return None
+        if mode == "truncate": return cls("truncate", input_dim, output_dim)
+        # PCA cannot keep more components than it has samples
+        output_dim = min(output_dim, n)
+        if output_dim < 1: return None
+        rows = np.random.default_rng(42).choice(n, PCA_FIT_ROWS, replace=False) if n > PCA_FIT_ROWS else slice(None)
+        pca = PCA(n_components=output_dim, svd_solver="auto", random_state=42).fit(np.asarray(matrix[rows], dtype=np.float32))
+        return cls("pca", input_dim, output_dim, pca.mean_.astype(np.float32), pca.components_.astype(np.float32))
+
+    def transform(self, vectors):
+        """Projects a vector (dim,) or a matrix (n, dim) into the reduced space."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.mode == "truncate": return np.ascontiguousarray(vectors[..., :self.output_dim])
+        return (vectors - self.mean) @ self.components.T
+
+    def describe(self):
+        return {"mode": self.mode, "input_dim": self.input_dim, "output_dim": self.output_dim}
+
+    def save(self, path):
+        arrays = {"mode": np.array(self.mode), "dims": np.array([self.input_dim, self.output_dim])}
+        if self.mode == "pca": arrays.update(mean=self.mean, components=self.components)
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            input_dim, output_dim = data["dims"].tolist()
+            if str(data["mode"]) == "pca":
+                return cls("pca", input_dim, output_dim, data["mean"], data["components"])
+            return cls("truncate", input_dim, output_dim)
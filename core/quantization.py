@@ -0,0 +1,169 @@
+"""
+Vector Quantization — Compact First-Pass Scoring with Exact Rescoring
+=====================================================================
+
+Architecture Rationale:
+-----------------------
+Neural search scored the query against every stored embedding at full
+precision. With 1024-dimensional models a million chunks is 4-8 GB of
+vectors, all of which had to stay in RAM and be streamed through on each
+query.
+
+Quantized search splits the work into two passes:
+1. **First Pass (compact codes)**: Every vector is also stored as
+   - **int8**: one byte per dimension with a per-dimension scale
+     (4x smaller than float32, near-lossless ranking), or
+   - **binary**: one *bit* per dimension — the sign (32x smaller); similarity
+     is estimated from the Hamming distance between sign patterns.
+   The whole index is scanned in this compact form.
+2. **Rescoring (exact)**: Only the best `top_k * oversample` candidates are
+   re-scored with the full-precision vectors. Those can stay memory-mapped
+   on disk (`np.load(..., mmap_mode='r')`), so only candidate rows are read.
+
+Theory Note:
+Scores are cosine similarities, so vectors are L2-normalized before
+quantization. For int8 the approximate score is `codes @ (q * scale)`; for
+binary codes, `cos ≈ 1 - 2 * hamming / dim` (the fraction of agreeing signs
+tracks the angle between the vectors).
+"""
+
+import numpy as np
+
+MODES = ("none", "int8", "binary")
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_BLOCK_ROWS = 65536 # Rows converted per step, bounds temporary memory
+_SCAN_ROWS = 4096   # int8 rows widened per matrix-vector product (fits in L2 cache)
+
+
+def _popcount(words):
+    """Set bits per element (NumPy >= 2.0 has a native ufunc; older versions use a byte table)."""
+    if hasattr(np, "bitwise_count"): return np.bitwise_count(words)
+    return _POPCOUNT[words.view(np.uint8)].reshape(len(words), -1)
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9)
+
+
+class QuantizedIndex:
+    """Compact int8 or sign-bit codes of an embedding matrix."""
+
+    def __init__(self, mode, codes, dim, scale=None):
+        if mode not in ("int8", "binary"): raise ValueError(f"Unknown quantization mode: {mode}")
+        self.mode = mode
+        self.codes = codes
+        self.dim = dim
+        self.scale = scale
+
+    @classmethod
+    def build(cls, matrix, mode):
+        """Quantizes a float matrix (n, dim), block by block (works on memory-mapped input)."""
+        n, dim = matrix.shape
+        if mode == "int8":
+            # Per-dimension symmetric scale from the normalized vectors
+            peak = np.zeros(dim, dtype=np.float32)
+            for s in range(0, n, _BLOCK_ROWS):
+                peak = np.maximum(peak, np.abs(normalize_rows(matrix[s:s + _BLOCK_ROWS])).max(axis=0))
+            scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+            codes = np.empty((n, dim), dtype=np.int8)
+            for s in range(0, n, _BLOCK_ROWS):
+                block = normalize_rows(matrix[s:s + _BLOCK_ROWS]) / scale
+                codes[s:s + len(block)] = np.clip(np.rint(block), -127, 127)
+            return cls("int8", codes, dim, scale)
+        if mode == "binary":
+            codes = np.empty((n, (dim + 7) // 8), dtype=np.uint8)
+            for s in range(0, n, _BLOCK_ROWS):
+                block = np.asarray(matrix[s:s + _BLOCK_ROWS])
+                codes[s:s + len(block)] = np.packbits(block > 0, axis=1)
+            return cls("binary", codes, dim)
+        raise ValueError(f"Unknown quantization mode: {mode}")
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    # ------------------------------------------------------------------
+    # 1. SCORING
+    # ------------------------------------------------------------------
+
+    def approx_scores(self, q_vec):
+        """Estimated cosine similarity of the query to every stored vector."""
+        q = normalize_rows(np.asarray(q_vec).reshape(1, -1))[0]
+        n = len(self.codes)
+        scores = np.empty(n, dtype=np.float32)
+        if self.mode == "int8":
+            # Codes are widened into a small reused float32 buffer so each block
+            # stays cache-resident for the BLAS matrix-vector product.
+            q_scaled = q * self.scale
+            buf = np.empty((min(n, _SCAN_ROWS), self.dim), dtype=np.float32)
+            for s in range(0, n, _SCAN_ROWS):
+                block = buf[:min(_SCAN_ROWS, n - s)]
+                block[...] = self.codes[s:s + len(block)]
+                np.dot(block, q_scaled, out=scores[s:s + len(block)])
+        else:
+            q_bits = np.packbits(q > 0)
+            codes, q_words = self.codes, q_bits
+            if codes.shape[1] % 8 == 0:
+                # Compare 64 bits at a time
+                codes, q_words = codes.view(np.uint64), q_bits.view(np.uint64)
+            for s in range(0, n, _BLOCK_ROWS):
+                xor = np.bitwise_xor(codes[s:s + _BLOCK_ROWS], q_words)
+                hamming = _popcount(xor).sum(axis=1, dtype=np.int32)
+                scores[s:s + _BLOCK_ROWS] = 1.0 - 2.0 * hamming / self.dim
+        return scores
+
+    def subset(self, rows):
+        """A QuantizedIndex over only `rows` (codes are gathered; local row i is `rows[i]`)."""
+        return QuantizedIndex(self.mode, self.codes[rows], self.dim, self.scale)
+
+    def search(self, full_matrix, q_vec, top_k, oversample=10, rows=None):
+        """
+        Two-pass search: compact scan, then exact cosine on the candidates.
+
+        Args:
+            full_matrix: Full-precision vectors (ndarray or memmap), row-aligned with the codes.
+            q_vec: Query embedding.
+            top_k (int): Results wanted.
+            oversample (int): Candidates rescored per wanted result.
+            rows: Optional sorted row numbers to restrict the scan to (a filtered search).
+
+        Returns:
+            tuple: (row indices, exact cosine scores), best first; at most `top_k`
+            rows, like the exact search, so callers see the same pool either way.
+        """
+        approx = (self if rows is None else self.subset(rows)).approx_scores(q_vec)
+        k = min(len(approx), max(top_k, top_k * max(1, int(oversample))))
+        if k <= 0: return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates = np.argpartition(-approx, k - 1)[:k]
+        candidates.sort() # Sequential reads from a memory-mapped matrix
+        if rows is not None: candidates = rows[candidates]
+        exact = rescore(full_matrix, q_vec, candidates)
+        order = np.argsort(-exact)[:top_k] # The extra candidates only served the rescoring
+        return candidates[order], exact[order]
+
+    # ------------------------------------------------------------------
+    # 2. PERSISTENCE
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        arrays = {"codes": self.codes, "dim": np.array(self.dim)}
+        if self.scale is not None: arrays["scale"] = self.scale
+        with open(path, "wb") as f:
+            np.savez(f, mode=np.array(self.mode), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            scale = data["scale"] if "scale" in data else None
+            return cls(str(data["mode"]), data["codes"], int(data["dim"]), scale)
+
+
+def rescore(full_matrix, q_vec, rows):
+    """Exact cosine similarity between the query and selected rows."""
+    q = np.asarray(q_vec, dtype=np.float32)
+    vecs = np.asarray(full_matrix[rows], dtype=np.float32)
+    return vecs @ q / (np.linalg.norm(q) * np.linalg.norm(vecs, axis=1) + 1e-9)
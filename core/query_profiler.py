@@ -0,0 +1,121 @@
+"""
+Query Profiler — Where Did the Time Go?
+=======================================
+
+Architecture Rationale:
+-----------------------
+A slow answer can come from four very different places: the query embedding
+call to Ollama, scoring the index, the selection steps after it (MMR,
+merging, expansion), or the LLM itself (model load, prompt evaluation,
+token generation). The chat hub only showed token counts, so none of these
+could be told apart.
+
+1. **QueryProfiler**: Times the stages of one query with a context manager
+   and collects the retriever's own breakdown (`last_search_profile`) and
+   the LLM's response durations (`last_run_stats`) into one flat record.
+2. **ProfileLog**: Appends every record as one JSON line to a rolling log
+   (`data/logs/query_profile.jsonl`, rotated at `max_bytes`), so latency can
+   be analysed offline with pandas or jq across sessions and settings.
+
+Developer Note:
+Ollama reports durations in nanoseconds on the final streamed chunk;
+`OllamaService.generate_rag_response` converts them. Time-to-first-token is
+measured on the client, so it includes model loading and prompt evaluation.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+def elapsed_ms(start):
+    """Milliseconds since `start` (a `time.perf_counter()` reading)."""
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+class QueryProfiler:
+    """Collects the stage timings and facts of a single query into one record."""
+
+    def __init__(self, query="", **fields):
+        self._start = time.perf_counter()
+        self.record = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "query": query[:200], **fields}
+
+    @contextmanager
+    def stage(self, name):
+        """Times the enclosed block as `<name>_ms`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record[f"{name}_ms"] = elapsed_ms(start)
+
+    def add(self, prefix="", **fields):
+        """Merges facts into the record (None values are skipped)."""
+        for key, value in fields.items():
+            if value is not None: self.record[f"{prefix}{key}"] = value
+
+    def finish(self):
+        """Stamps the wall-clock total and returns the record."""
+        self.record["total_ms"] = elapsed_ms(self._start)
+        return self.record
+
+
+class ProfileLog:
+    """Rolling JSON-lines log of query profiles."""
+
+    def __init__(self, path="data/logs/query_profile.jsonl", max_bytes=5_000_000, backups=3):
+        """
+        Args:
+            path (str): Active log file.
+            max_bytes (int): Size at which the log is rotated (`path.1`, `path.2`, ...).
+            backups (int): Rotated files kept.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older): os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups > 0: os.replace(self.path, f"{self.path}.1")
+        else: os.remove(self.path)
+
+    def append(self, record):
+        """Writes one record; returns False (and prints) on I/O errors."""
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+            return True
+        except Exception as e:
+            print(f"Profile log error: {e}")
+            return False
+
+    def recent(self, n=50):
+        """The last `n` records of the active log (oldest first)."""
+        if not os.path.exists(self.path): return []
+        records = []
+        with open(self.path, "r") as f:
+            for line in f.readlines()[-n:]:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue # A line cut short by a crash
+        return records
+
+
+def summarize(records, keys=("embed_ms", "retrieval_ms", "ttft_ms", "generation_ms", "tokens_per_s", "total_ms")):
+    """p50 / p95 of the numeric `keys` across profile records."""
+    summary = {}
+    for key in keys:
+        values = [r[key] for r in records if isinstance(r.get(key), (int, float))]
+        if values:
+            p50, p95 = np.percentile(values, [50, 95])
+            summary[key] = {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "n": len(values)}
+    return summary
@@ -0,0 +1,124 @@
+"""
+Result Diversity — Maximal Marginal Relevance & Adjacent-Chunk Merging
+=====================================================================
+
+Architecture Rationale:
+-----------------------
+Sliding-window chunking overlaps neighbouring chunks by `overlap_size`
+characters, so the top-k by cosine similarity is often three windows over the
+same paragraph. Each of them costs prompt tokens in `generate_rag_response`
+while adding little that the first one did not already say.
+
+Two post-retrieval steps trade a little raw relevance for coverage:
+1. **Maximal Marginal Relevance (MMR)**: From a deeper candidate pool, pick
+   results one at a time, maximising
+   `λ · relevance − (1 − λ) · max similarity to the results already picked`.
+   λ = 1 is the plain top-k; lower values favour novelty.
+2. **Adjacent-Chunk Merging**: Hits from the same file, page and stored
+   page text whose character ranges overlap or touch are joined into one
+   snippet. Chunks carry (src, start, end) offsets into the DocumentStore
+   page, so the join is exact: the overlapping characters are paid for
+   once, with no fuzzy text matching.
+
+Performance Note:
+MMR works on the candidate pool only (a few dozen vectors). The pairwise
+similarity matrix is computed with one matrix product, and each selection
+step updates the "closest selected neighbour" vector with one vectorized
+`np.maximum`, so the whole selection is O(k · c) after an O(c² · d) product.
+"""
+
+import numpy as np
+
+from core.quantization import normalize_rows
+
+
+def mmr_select(candidate_vectors, relevance, k, lambda_mult=0.7):
+    """
+    Maximal Marginal Relevance selection over a candidate pool.
+
+    Args:
+        candidate_vectors: (c, d) vectors of the candidates (any scale; cosine is used).
+        relevance: (c,) query relevance of each candidate (e.g. its cosine score).
+        k (int): Number of candidates to select.
+        lambda_mult (float): 1.0 = pure relevance, 0.0 = pure novelty.
+
+    Returns:
+        np.ndarray: Indices into the candidates, in selection order.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    n = len(relevance)
+    k = min(int(k), n)
+    if k <= 0: return np.empty(0, dtype=np.int64)
+    if lambda_mult >= 1.0 or k == n:
+        return np.argsort(-relevance, kind="stable")[:k]
+
+    unit = normalize_rows(np.asarray(candidate_vectors, dtype=np.float32))
+    pairwise = unit @ unit.T
+    chosen = np.zeros(n, dtype=bool)
+    closest = np.full(n, -np.inf, dtype=np.float32) # Similarity to the nearest selected result
+    selected = []
+    for _ in range(k):
+        redundancy = np.where(np.isfinite(closest), closest, 0.0)
+        gain = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        gain[chosen] = -np.inf
+        j = int(np.argmax(gain))
+        selected.append(j)
+        chosen[j] = True
+        np.maximum(closest, pairwise[j], out=closest)
+    return np.array(selected, dtype=np.int64)
+
+
+def _span(result):
+    """(src, start, end) of a result when it carries valid offsets, else None."""
+    start, end = result.get("start"), result.get("end")
+    if result.get("src") is None or start is None or end is None or start < 0: return None
+    text = result.get("text") or ""
+    # Offsets must describe this exact text (rehydrated / cleaned chunks always do)
+    if end - start != len(text): return None
+    return result["src"], int(start), int(end)
+
+
+def merge_adjacent_chunks(results, max_gap=1):
+    """
+    Joins hits whose character ranges on the same stored page overlap or touch.
+
+    Args:
+        results (list[dict]): Search results (best first) with src/start/end offsets.
+        max_gap (int): Largest gap (in characters, e.g. the space between two
+            sentence-aware chunks) still treated as adjacent.
+
+    Returns:
+        list[dict]: Merged results, best first. A merged snippet keeps the
+        chunk_id and score of its best member and lists every member in
+        'merged_ids'.
+    """
+    groups, passthrough = {}, []
+    for rank, r in enumerate(results):
+        span = _span(r)
+        if span is None: passthrough.append((rank, r))
+        else: groups.setdefault((r.get("file"), r.get("page"), span[0]), []).append((span[1], span[2], rank, r))
+
+    merged = list(passthrough)
+    for members in groups.values():
+        members.sort(key=lambda m: (m[0], m[1]))
+        run = None
+        for start, end, rank, r in members:
+            if run is not None and start <= run["end"] + max_gap:
+                if end > run["end"]:
+                    overlap = run["end"] - start
+                    run["text"] += r["text"][overlap:] if overlap >= 0 else " " * -overlap + r["text"]
+                    run["end"] = end
+                run["merged_ids"].append(r.get("chunk_id"))
+                if rank < run["_rank"]:
+                    run.update(chunk_id=r.get("chunk_id"), score=r.get("score"), _rank=rank)
+                continue
+            if run is not None: merged.append((run.pop("_rank"), run))
+            run = dict(r, start=start, end=end, merged_ids=[r.get("chunk_id")], _rank=rank)
+        if run is not None: merged.append((run.pop("_rank"), run))
+
+    merged.sort(key=lambda item: item[0])
+    out = []
+    for _, r in merged:
+        if len(r.get("merged_ids", ())) < 2: r.pop("merged_ids", None)
+        out.append(r)
+    return out
@@ -0,0 +1,138 @@
+"""
+Search Filters — Metadata Predicates Pushed Down Into Retrieval
+===============================================================
+
+Architecture Rationale:
+-----------------------
+Scoping a question to "only the Q3 reports" or "pages 10-20 of the thesis"
+used to mean searching the whole index and throwing most of the hits away
+afterwards. That is slower than a global query, and a narrow scope often came
+back empty because its chunks never made the global top-k.
+
+`SearchFilter` turns the scope into a set of rows *before* any scoring:
+1. **File-Level Predicates**: File names, a `full_path` prefix and source
+   types (file extensions) are evaluated once per *file*, never per chunk,
+   and expanded to rows through `ChunkTable.rows_for_file` (the precomputed
+   file -> rows index).
+2. **Page Range**: Applied to the candidate rows with one vectorized compare
+   over the table's int32 page column (`rows_in_page_range`).
+3. **Pushdown**: The KnowledgeBase then scores only the selected rows
+   (`embeddings[rows]`, the matching quantized codes or TF-IDF rows), so a
+   scoped query does less work than a global one.
+
+Developer Note:
+Filters travel as plain dicts (`to_dict` / `from_dict`) through the index
+server's JSON API and the Streamlit session state. Every predicate is
+optional; an empty filter means "search everything".
+"""
+
+import os
+
+import numpy as np
+
+
+def _norm_path(path):
+    return str(path).replace("\\", "/")
+
+
+def _file_type(filename):
+    """Source type of a file: its lower-case extension without the dot ('pdf', 'md', ...)."""
+    return os.path.splitext(str(filename))[1].lower().lstrip(".")
+
+
+class SearchFilter:
+    """Predicates on chunk metadata, resolved to row numbers of a ChunkTable."""
+
+    def __init__(self, files=None, path_prefix=None, pages=None, types=None):
+        """
+        Args:
+            files (list): Exact file names to search.
+            path_prefix (str): Only files whose `full_path` starts with this prefix.
+            pages (tuple): Inclusive (first, last) page range; either end may be None.
+            types (list): Source types / extensions, e.g. ['pdf', 'md'].
+        """
+        self.files = sorted(set(files)) if files else None
+        self._file_set = set(self.files or ())
+        self.path_prefix = _norm_path(path_prefix) if path_prefix else None
+        first, last = tuple(pages) if pages else (None, None)
+        self.pages = (first, last) if first is not None or last is not None else None
+        self.types = sorted({str(t).lower().lstrip(".") for t in types}) if types else None
+
+    @classmethod
+    def coerce(cls, value):
+        """Accepts a SearchFilter, a dict (JSON / session state) or None; returns a filter or None."""
+        if value is None or isinstance(value, cls): return value or None
+        return cls.from_dict(value) or None
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(data.get("files"), data.get("path_prefix"), data.get("pages"), data.get("types"))
+
+    def to_dict(self):
+        return {k: v for k, v in (("files", self.files), ("path_prefix", self.path_prefix),
+                                   ("pages", list(self.pages) if self.pages else None),
+                                   ("types", self.types)) if v}
+
+    def __bool__(self):
+        return bool(self.files or self.path_prefix or self.pages or self.types)
+
+    def __repr__(self):
+        return f"SearchFilter({self.to_dict()!r})"
+
+    def key(self):
+        """Hashable identity of the predicates (used to cache resolved rows)."""
+        return (tuple(self.files or ()), self.path_prefix, self.pages, tuple(self.types or ()))
+
+    # ------------------------------------------------------------------
+    # 1. FILE-LEVEL PREDICATES
+    # ------------------------------------------------------------------
+
+    def matches_file(self, filename, full_path=None):
+        """
+        True if a file passes the name, path-prefix and type predicates (pages are per chunk).
+        Without a `full_path` the prefix cannot be judged and is treated as a possible match.
+        """
+        if self.files is not None and filename not in self._file_set: return False
+        if self.types is not None and _file_type(filename) not in self.types: return False
+        if self.path_prefix is not None and full_path is not None and not _norm_path(full_path).startswith(self.path_prefix):
+            return False
+        return True
+
+    def select_files(self, filenames, path_of=None):
+        """The subset of `filenames` that can hold matching chunks (`path_of`: filename -> full path)."""
+        return [f for f in filenames if self.matches_file(f, path_of(f) if path_of and self.path_prefix else None)]
+
+    # ------------------------------------------------------------------
+    # 2. ROW RESOLUTION
+    # ------------------------------------------------------------------
+
+    def resolve(self, table):
+        """
+        Sorted row numbers of `table` that satisfy every predicate.
+
+        Performance Note:
+        File predicates cost O(files); the expansion to rows is a lookup in
+        the table's file index (or one vectorized pass over the file-id column
+        when many files are selected). Rows come back sorted, which keeps
+        gathers from a memory-mapped embedding matrix sequential.
+        """
+        if self.files is None and self.path_prefix is None and self.types is None:
+            rows = np.arange(len(table), dtype=np.int64)
+        else:
+            candidates = self.files if self.files is not None else table.files
+            rows = table.rows_for_files(self.select_files(candidates, lambda f: table.full_path_of(f, f)))
+        if self.pages is not None and len(rows):
+            rows = table.rows_in_page_range(rows, *self.pages)
+        return rows
+
+    def describe(self):
+        """Short human-readable summary for the UI ('2 files · pages 3-9')."""
+        parts = []
+        if self.files: parts.append(f"{len(self.files)} file{'s' if len(self.files) != 1 else ''}")
+        if self.path_prefix: parts.append(f"under {self.path_prefix}")
+        if self.types: parts.append("/".join(self.types))
+        if self.pages:
+            first, last = self.pages
+            parts.append(f"pages {first if first is not None else 1}-{last if last is not None else 'end'}")
+        return " · ".join(parts) or "all documents"
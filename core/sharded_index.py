@@ -0,0 +1,464 @@
+"""
+Sharded Index — Independent Index Partitions with Parallel Fan-Out Search
+=========================================================================
+
+Architecture Rationale:
+-----------------------
+The KnowledgeBase is one monolithic index: one metadata table, one TF-IDF
+matrix, one embedding matrix. Any change rebuilds and reloads the whole thing,
+and a query is a single scan on a single core.
+
+The sharded index splits the built index into partitions that are stored,
+rebuilt and searched independently:
+
+1. **Partitioning**: Every file belongs to exactly one shard, chosen by
+   - **directory**: the folder the file was ingested from,
+   - **batch**: the sync (ingest run) that first saw the file — new files
+     always open a new shard, so older shards are never touched, or
+   - **size**: files are packed into shards of at most `max_chunks` chunks.
+   All strategies respect the `max_chunks` cap (oversized groups are split).
+2. **Self-Contained Shards**: Each shard is a regular KnowledgeBase (own
+   ChunkTable, TF-IDF vectorizer, embedding rows and projection) persisted
+   under its own SnapshotStore root (`data/shards/<name>/`). Shards are cut
+   from the freshly built main index, so no text is re-embedded.
+3. **Incremental Rebuilds**: `sync` fingerprints each planned shard (model +
+   chunk texts) and only rebuilds shards whose contents changed; files keep
+   their shard assignment between syncs (directory/batch/size alike).
+4. **Lazy Loading**: Shards are loaded from disk on the first search that
+   needs them and can be unloaded individually.
+5. **Fan-Out Search**: The query is embedded once, every shard is searched
+   on a thread pool (NumPy releases the GIL inside the matrix products, so
+   shards scan on separate cores) and the per-shard top-k lists are merged
+   with a heap.
+
+Layout:
+    data/shards/shards.json            -> strategy + {shard: {files, chunks, version}}
+    data/shards/<shard>/CURRENT        -> snapshot pointer (see index_snapshots.py)
+
+Developer Note:
+Results carry a `shard` field and a `"<shard>:<row>"` chunk_id, so ids stay
+unique across shards (the semantic answer cache keys on them).
+
+Theory Note:
+Neural scores are cosines against the same query vector, so they compare
+directly across shards. TF-IDF scores use each shard's own IDF weights and
+are only approximately comparable.
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.document_store import DocumentTextMap
+from core.index_snapshots import SnapshotStore
+from core.knowledge_base import KnowledgeBase
+from core.query_profiler import elapsed_ms
+from core.result_diversity import mmr_select, merge_adjacent_chunks
+from core.search_filters import SearchFilter
+from core.threshold_calibration import keep_min_results
+
+STRATEGIES = ("none", "directory", "batch", "size")
+REGISTRY = "shards.json"
+# Search settings copied from the main KnowledgeBase onto every shard
+SEARCH_SETTINGS = ("neural_threshold", "threshold_mode", "min_results", "vector_quantization", "rescore_oversample", "ml_top_n",
+                   "mmr_lambda", "mmr_candidates", "merge_adjacent",
+                   "expansion_mode", "expansion_chars", "expansion_neighbors", "expansion_max_chars")
+
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', text).strip('_')[:40] or "root"
+
+
+def _split_by_cap(files, counts, max_chunks):
+    """Groups files (in order) into runs of at most `max_chunks` chunks (a single larger file gets its own run)."""
+    groups, current, size = [], [], 0
+    for f in files:
+        n = counts.get(f, 0)
+        if current and size + n > max_chunks:
+            groups.append(current)
+            current, size = [], 0
+        current.append(f)
+        size += n
+    if current: groups.append(current)
+    return groups
+
+
+class ShardedIndex:
+    """A set of KnowledgeBase shards searched in parallel and merged by score."""
+
+    def __init__(self, root="data/shards", doc_store=None, strategy="none", max_chunks=20000, max_workers=None):
+        """
+        Args:
+            root (str): Directory holding the registry and one snapshot root per shard.
+            doc_store (DocumentStore): Raw-text store shared with the main index.
+            strategy (str): 'none', 'directory', 'batch' or 'size'.
+            max_chunks (int): Size cap per shard.
+            max_workers (int): Search threads (default: one per CPU, at most 32).
+        """
+        self.root = root
+        self.doc_store = doc_store
+        self.strategy = strategy
+        self.max_chunks = max(1, int(max_chunks))
+        self.max_workers = max_workers or min(32, os.cpu_count() or 1)
+        self.settings = {} # Search settings pushed onto loaded shards (see configure)
+        self.last_query_vector = None # Reused by the semantic answer cache
+        self.last_search_profile = {} # Stage timings (ms) of the most recent search
+        self._shards = {} # name -> loaded KnowledgeBase
+        self._lock = threading.RLock() # Guards the registry and the loaded-shard cache
+        self._pool = None
+        self.registry = self._read_registry()
+
+    # ------------------------------------------------------------------
+    # 1. REGISTRY
+    # ------------------------------------------------------------------
+
+    def _read_registry(self):
+        try:
+            with open(os.path.join(self.root, REGISTRY), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"strategy": None, "shards": {}}
+
+    def _write_registry(self, registry):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, REGISTRY)
+        tmp = f"{path}.{uuid.uuid4().hex[:6]}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(registry, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @property
+    def enabled(self):
+        return self.strategy != "none" and bool(self.registry.get("shards"))
+
+    @property
+    def index_version(self):
+        """Combined fingerprint of every shard (changes when any shard is rebuilt)."""
+        shards = self.registry.get("shards", {})
+        if not shards: return None
+        h = hashlib.md5()
+        for name in sorted(shards):
+            h.update(f"{name}:{shards[name].get('version')}|".encode('utf-8'))
+        return h.hexdigest()[:16]
+
+    def stats(self):
+        """Per-shard summary for the UI: [{name, files, chunks, loaded}]."""
+        with self._lock:
+            return [{"name": name, "files": len(info.get("files", {})), "chunks": info.get("chunks", 0),
+                     "loaded": name in self._shards}
+                    for name, info in sorted(self.registry.get("shards", {}).items())]
+
+    def get_file_manifest(self):
+        return sorted(f for info in self.registry.get("shards", {}).values() for f in info.get("files", {}))
+
+    # ------------------------------------------------------------------
+    # 2. PARTITIONING & BUILDING
+    # ------------------------------------------------------------------
+
+    def plan(self, kb):
+        """
+        Assigns every file of `kb` to a shard.
+
+        Files keep the shard they were in at the last sync when the strategy
+        is unchanged, so a sync only rebuilds the shards that gained, lost or
+        changed files.
+
+        Returns:
+            dict: shard name -> list of filenames
+        """
+        table = kb.documents_metadata
+        counts = table.chunk_counts()
+        files = table.file_names() # First-ingested first
+        cap = self.max_chunks
+
+        if self.strategy == "directory":
+            groups = {}
+            for f in files:
+                path = table.full_path_of(f)
+                folder = os.path.dirname(os.path.abspath(path)) if path else ""
+                groups.setdefault(folder, []).append(f)
+            plan = {}
+            for folder, members in sorted(groups.items()):
+                base = f"dir-{_slug(os.path.basename(folder) or 'uploads')}-{hashlib.md5(folder.encode('utf-8')).hexdigest()[:6]}"
+                for i, part in enumerate(_split_by_cap(sorted(members), counts, cap)):
+                    plan[base if i == 0 else f"{base}-{i + 1}"] = part
+            return plan
+
+        # batch / size: keep existing assignments, place new files
+        plan, assigned = {}, set()
+        if self.registry.get("strategy") == self.strategy:
+            present = set(files)
+            for name, info in self.registry.get("shards", {}).items():
+                kept = [f for f in info.get("files", {}) if f in present]
+                if kept:
+                    plan[name] = kept
+                    assigned.update(kept)
+        new_files = [f for f in files if f not in assigned]
+        if not new_files: return plan
+
+        if self.strategy == "size":
+            # Top up shards with spare room before opening new ones
+            for name in sorted(plan):
+                room = cap - sum(counts.get(f, 0) for f in plan[name])
+                while new_files and counts.get(new_files[0], 0) <= room:
+                    room -= counts.get(new_files[0], 0)
+                    plan[name].append(new_files.pop(0))
+            taken = len(plan)
+            for i, part in enumerate(_split_by_cap(new_files, counts, cap)):
+                plan[f"part-{taken + i + 1:03d}"] = part
+        else:
+            stamp = f"batch-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:4]}"
+            for i, part in enumerate(_split_by_cap(new_files, counts, cap)):
+                plan[stamp if i == 0 else f"{stamp}-{i + 1}"] = part
+        return plan
+
+    def build_shard(self, kb, files):
+        """
+        Cuts a standalone KnowledgeBase holding `files` out of a built main index.
+
+        Chunk rows, embedding rows, the projection, the neural threshold
+        calibration and spatial data are copied; the TF-IDF vectorizer (and
+        its calibration) is refitted on the shard's own chunks.
+        """
+        table = kb.documents_metadata
+        rows = np.concatenate([table.rows_for_file(f) for f in files]) if files else np.empty(0, dtype=np.int64)
+        shard = KnowledgeBase(chunk_size=kb.chunk_size, overlap_size=kb.overlap_size, engine_mode=kb.engine_mode,
+                              doc_store=kb.doc_store)
+        for attr in SEARCH_SETTINGS + ("spatial_granularity",):
+            setattr(shard, attr, getattr(kb, attr, getattr(shard, attr)))
+        shard.snapshot_retention = 1 # Shards are derived data: rebuilt from the main index, never rolled back
+        shard.documents_metadata = table.take(rows)
+        hashes = kb.file_contents.to_manifest()
+        shard.file_contents = DocumentTextMap(kb.doc_store, {f: hashes[f] for f in files if f in hashes})
+        shard.documents_spatial = [d for d in kb.documents_spatial if d.get('file') in set(files)]
+        shard.index_embedding_model = kb.index_embedding_model
+        shard.index_embedding_dimension = getattr(kb, 'index_embedding_dimension', 0)
+        shard.projection = getattr(kb, 'projection', None)
+
+        texts = shard.documents_metadata.texts
+        shard.index_version = shard._compute_index_version(texts)
+        shard.file_chunk_counts = shard.documents_metadata.chunk_counts()
+        try:
+            shard.tfidf_matrix = shard.vectorizer.fit_transform(texts).toarray()
+        except ValueError:
+            # Every token of this shard is a stop word: keyword search has nothing to match
+            shard.tfidf_matrix = None
+        if kb.embeddings is not None and len(rows):
+            shard.embeddings = np.asarray(kb.embeddings[rows], dtype=np.float32)
+        if shard.engine_mode == "Machine Learning":
+            shard.calibrate_thresholds() # Own vocabulary, own TF-IDF score distribution
+        else:
+            shard.calibration = dict(getattr(kb, 'calibration', None) or {}) # Same vector space as the main index
+        return shard
+
+    def rebuild(self, kb, name, files):
+        """
+        Rebuilds and saves a single shard from the main index.
+
+        Returns:
+            dict | None: The shard's registry entry, or None if the save failed.
+        """
+        # Rows are copied under the lock; the (slow) save runs without it
+        with kb.update_lock:
+            shard = self.build_shard(kb, files)
+        if not shard.save_to_disk(os.path.join(self.root, name), collect_garbage=False): return None
+        with self._lock:
+            self._shards.pop(name, None) # Loaded lazily on the next search
+        return {"files": shard.file_contents.to_manifest(), "chunks": len(shard.documents_metadata),
+                "version": shard.index_version}
+
+    def sync(self, kb):
+        """
+        Brings the shards in line with a built main index.
+
+        Only shards whose fingerprint changed are rebuilt (one at a time, so
+        peak memory is one shard's copy); shards that no longer hold any file
+        are deleted.
+
+        Returns:
+            dict: {"rebuilt": [...], "kept": [...], "removed": [...]}
+        """
+        report = {"rebuilt": [], "kept": [], "removed": []}
+        if self.strategy == "none" or not kb.documents_metadata: return report
+        kb.finalize_documents()
+        with kb.update_lock:
+            plan = self.plan(kb)
+            table = kb.documents_metadata
+            versions = {name: kb._compute_index_version(
+                            table.texts[i] for i in np.concatenate([table.rows_for_file(f) for f in files]).tolist())
+                        for name, files in plan.items()}
+        old = self.registry.get("shards", {}) if self.registry.get("strategy") == self.strategy else {}
+
+        shards = {}
+        for name, files in sorted(plan.items()):
+            previous = old.get(name)
+            if previous and previous.get("version") == versions[name] and \
+                    SnapshotStore(os.path.join(self.root, name)).exists():
+                shards[name] = previous
+                report["kept"].append(name)
+                continue
+            entry = self.rebuild(kb, name, files)
+            if entry is None:
+                print(f"Shard error: could not save shard {name}")
+                continue
+            shards[name] = entry
+            report["rebuilt"].append(name)
+
+        registry = {"strategy": self.strategy, "max_chunks": self.max_chunks, "shards": shards}
+        self._write_registry(registry)
+        with self._lock:
+            stale = set(self.registry.get("shards", {})) - set(shards)
+            self.registry = registry
+            for name in stale:
+                self._shards.pop(name, None)
+        # Shard directories left from an earlier layout or strategy
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path) and name not in shards:
+                shutil.rmtree(path, ignore_errors=True)
+                report["removed"].append(name)
+        return report
+
+    # ------------------------------------------------------------------
+    # 3. LAZY LOADING
+    # ------------------------------------------------------------------
+
+    def configure(self, **settings):
+        """Sets search settings (SEARCH_SETTINGS) on loaded shards and on shards loaded later."""
+        with self._lock:
+            self.settings.update(settings)
+            for shard in self._shards.values():
+                for key, value in settings.items():
+                    setattr(shard, key, value)
+
+    def shard(self, name):
+        """The loaded shard `name`, reading it from disk on first use (None if unavailable)."""
+        with self._lock:
+            if name in self._shards: return self._shards[name]
+            if name not in self.registry.get("shards", {}): return None
+            shard = KnowledgeBase(doc_store=self.doc_store)
+            for key, value in self.settings.items():
+                setattr(shard, key, value) # Before loading: quantization decides mmap vs in-memory
+            if not shard.load_from_disk(os.path.join(self.root, name)): return None
+            self._shards[name] = shard
+            return shard
+
+    def unload(self, name=None):
+        """Drops one loaded shard (or all of them) from memory."""
+        with self._lock:
+            if name is None: self._shards.clear()
+            else: self._shards.pop(name, None)
+
+    def reload(self):
+        """Re-reads the registry (after another session synced) and drops loaded shards."""
+        with self._lock:
+            self.registry = self._read_registry()
+            self._shards.clear()
+
+    # ------------------------------------------------------------------
+    # 4. FAN-OUT SEARCH
+    # ------------------------------------------------------------------
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="shard-search")
+        return self._pool
+
+    def search(self, query_text, llm_service=None, top_n=None, filters=None, mmr_lambda=None, merge_adjacent=None):
+        """
+        Searches every shard in parallel and merges the per-shard top-k lists.
+
+        Args:
+            query_text (str): The user's search query.
+            llm_service: Embeds the query (once) for neural shards.
+            top_n (int): Number of merged results.
+            filters: Optional SearchFilter (or dict). Shards holding no file in
+                scope are skipped without being loaded; the rest filter their rows.
+            mmr_lambda (float): Per-query MMR trade-off (None = configured setting).
+            merge_adjacent (bool): Per-query override of adjacent-chunk merging.
+
+        Developer Note:
+        Neural MMR runs once over the merged candidate pool (shards share the
+        embedding space), so diversity is judged across shards. TF-IDF shards
+        have different vocabularies and apply MMR individually.
+        """
+        limit = top_n or self.settings.get("ml_top_n", 5)
+        if mmr_lambda is None: mmr_lambda = self.settings.get("mmr_lambda", 1.0)
+        if merge_adjacent is None: merge_adjacent = self.settings.get("merge_adjacent", False)
+        scope = SearchFilter.coerce(filters)
+        shards = self.registry.get("shards", {})
+        names = sorted(n for n, info in shards.items() if not scope or scope.select_files(list(info.get("files", {}))))
+        self.last_query_vector = None
+        self.last_search_profile = {}
+        if not names: return []
+
+        # Embed once; every shard scores the same vector
+        started = time.perf_counter()
+        query_vector = None
+        first = self.shard(names[0])
+        if first is not None and first.engine_mode == "Deep Learning" and llm_service is not None:
+            query_vector = np.array(llm_service.embed_text(query_text))
+            if query_vector.size == 0: return []
+            self.last_query_vector = query_vector
+
+        embedded = time.perf_counter()
+        global_mmr = mmr_lambda < 1.0 and query_vector is not None
+        pool = limit * max(1, int(self.settings.get("mmr_candidates", 4))) if global_mmr else limit
+
+        def run(name):
+            shard = self.shard(name)
+            if shard is None: return []
+            hits = shard.search(query_text, llm_service, top_n=pool, query_vector=query_vector, filters=scope,
+                                mmr_lambda=1.0 if global_mmr else mmr_lambda, merge_adjacent=False)
+            for r in hits:
+                r['shard'] = name
+                r['chunk_id'] = f"{name}:{r['chunk_id']}"
+            return hits
+
+        if len(names) == 1: per_shard = [run(names[0])]
+        else: per_shard = list(self._executor().map(run, names))
+        scored = time.perf_counter()
+        merged = heapq.nlargest(pool, (r for hits in per_shard for r in hits), key=lambda r: r['score'])
+        # Every shard tops up to min_results below its cutoff; only the best of those survive globally
+        merged = keep_min_results(merged, self.settings.get("min_results", 2))
+        if global_mmr and len(merged) > limit:
+            vectors = np.stack([self.shard(r['shard']).embeddings[int(r['chunk_id'].rsplit(":", 1)[1])] for r in merged])
+            picked = mmr_select(vectors, [r['score'] for r in merged], limit, mmr_lambda)
+            merged = sorted((merged[i] for i in picked), key=lambda r: r['score'], reverse=True)
+        merged = merged[:limit]
+        if merge_adjacent: merged = merge_adjacent_chunks(merged)
+        # score_ms is the parallel fan-out (loading a cold shard included)
+        self.last_search_profile = {"embed_ms": round((embedded - started) * 1000, 2),
+                                    "score_ms": round((scored - embedded) * 1000, 2), "select_ms": elapsed_ms(scored),
+                                    "shards_searched": len(names), "search_ms": elapsed_ms(started)}
+        return merged
+
+    def get_context_snippets(self, query_text, llm, top_n=5, expand=None, **search_options):
+        """
+        Sharded counterpart of `KnowledgeBase.get_context_snippets`.
+
+        Each hit is expanded by the shard that holds its chunk offsets; the
+        overlap merge then runs once over the combined list.
+        """
+        results = self.search(query_text, llm, top_n=top_n, **search_options)
+        mode = expand or self.settings.get("expansion_mode", "none")
+        if mode == "none" or not results: return results
+        started = time.perf_counter()
+        expanded = []
+        for r in results:
+            shard = self.shard(r['shard']) if r.get('shard') else None
+            expanded.extend(shard.expand_results([r], mode, dedupe=False) if shard is not None else [r])
+        expanded = merge_adjacent_chunks(expanded)
+        self.last_search_profile = {**self.last_search_profile, "expand_ms": elapsed_ms(started)}
+        return expanded
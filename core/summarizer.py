@@ -0,0 +1,269 @@
+"""
+Map-Reduce Summarizer — Whole-Document Summaries at Any Length
+==============================================================
+
+Architecture Rationale:
+-----------------------
+A local LLM can only read a few thousand tokens at once. The original
+summarizer simply cut every document at 12,000 characters, so a 500-page
+report was summarized from its first few pages.
+
+This module applies the classic **Map-Reduce** pattern instead:
+1. **Split**: The document is divided into sections (sized in multiples of the
+   KnowledgeBase chunk size, see `KnowledgeBase.get_document_sections`).
+2. **Map**: Every section is condensed into short notes. Sections are
+   independent, so they run concurrently on a bounded thread pool.
+3. **Reduce**: Notes are merged in groups of `reduce_fanout`, level by level,
+   until a single set remains; the final pass produces the 3-bullet brief.
+
+Caching:
+Map outputs are stored per section hash (model-specific JSON cache under
+`data/`). Re-summarizing a document — or a new version that only changed a
+few pages — only pays for the sections whose text actually changed.
+
+Failure Handling:
+Every map and reduce call feeds the final brief, so a single failed call
+(e.g. Ollama restarting mid-run) is retried `retries` times and otherwise
+fails the whole summary. A brief silently built from the surviving sections
+would look complete and be persisted by the summary store.
+
+Concurrency Note:
+Threads are the right tool here: the work is network-bound (waiting on the
+Ollama server), so the GIL is irrelevant. `max_workers` should roughly match
+Ollama's `OLLAMA_NUM_PARALLEL`; extra workers just queue on the server.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAP_PROMPT = ("You are condensing one section of a longer document. Extract the key facts, figures, "
+              "arguments and conclusions as terse bullet notes. Do not add commentary.")
+REDUCE_PROMPT = ("You are merging notes taken from consecutive sections of one document. Combine them into "
+                 "a single set of terse bullet notes, removing repetition but keeping every distinct fact.")
+FINAL_PROMPT = "Summarize this document strictly into 3 bullet points: Context, Key Findings, and Conclusion."
+
+
+def split_text(text, section_chars=6000):
+    """
+    Splits raw text into sections of roughly `section_chars`, preferring to cut
+    at paragraph, then sentence, then word boundaries.
+    """
+    sections, start = [], 0
+    while start < len(text):
+        end = min(start + section_chars, len(text))
+        if end < len(text):
+            window = text[start:end]
+            # Search the last 20% of the window for a natural break
+            floor = int(len(window) * 0.8)
+            for pattern in ("\n\n", ". ", " "):
+                cut = window.rfind(pattern, floor)
+                if cut != -1:
+                    end = start + cut + len(pattern)
+                    break
+        section = text[start:end].strip()
+        if section: sections.append(section)
+        start = end
+    return sections
+
+
+class MapReduceSummarizer:
+    """Summarizes arbitrarily long documents through a concurrent map-reduce over sections."""
+
+    def __init__(self, llm, max_workers=4, reduce_fanout=6, cache_dir="data", retries=1):
+        """
+        Args:
+            llm: The OllamaService providing `chat_once` and the active model name.
+            max_workers (int): Upper bound on concurrent LLM calls.
+            reduce_fanout (int): Number of partial summaries merged per reduce call.
+            cache_dir (str): Directory for the model-specific section-summary cache.
+            retries (int): Extra attempts for a failed LLM call before the summary fails.
+        """
+        self.llm = llm
+        self.max_workers = max_workers
+        self.reduce_fanout = reduce_fanout
+        self.cache_dir = cache_dir
+        self.retries = retries
+        self._cache = {}
+        self._cache_model = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 1. SECTION CACHE
+    # ------------------------------------------------------------------
+
+    def _cache_path(self, model_name):
+        safe_name = re.sub(r'[^a-zA-Z0-9]', '_', model_name)
+        return os.path.join(self.cache_dir, f".summary_cache_{safe_name}.json")
+
+    def _ensure_cache(self):
+        """Loads the section cache for the active chat model (swaps on model change)."""
+        model = self.llm.model_name
+        if self._cache_model == model: return
+        self._cache, self._cache_model = {}, model
+        path = self._cache_path(model)
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._cache = json.load(f)
+            except Exception: pass
+
+    def _save_cache(self):
+        if not self._cache_model: return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with self._lock:
+                snapshot = dict(self._cache)
+            with open(self._cache_path(self._cache_model), "w") as f:
+                json.dump(snapshot, f)
+        except Exception: pass
+
+    @staticmethod
+    def _hash(prompt, text):
+        return hashlib.md5(f"{prompt}\n{text}".encode("utf-8")).hexdigest()
+
+    def _cached_call(self, system_prompt, text, stats):
+        """Runs one LLM call, served from the section cache when possible."""
+        key = self._hash(system_prompt, text)
+        with self._lock:
+            if key in self._cache:
+                stats["cached_calls"] += 1
+                return self._cache[key]
+
+        for attempt in range(getattr(self, "retries", 1) + 1):
+            content, run_stats = self.llm.chat_once(system_prompt, text)
+            with self._lock:
+                stats["llm_calls"] += 1
+                if attempt: stats["retried_calls"] = stats.get("retried_calls", 0) + 1
+                stats["input_tokens"] += run_stats.get("input_tokens", 0)
+                stats["output_tokens"] += run_stats.get("output_tokens", 0)
+                if content is not None:
+                    self._cache[key] = content
+                    return content
+        with self._lock:
+            stats["failed_calls"] = stats.get("failed_calls", 0) + 1
+            stats["error"] = run_stats.get("error", "unknown error")
+        return None
+
+    # ------------------------------------------------------------------
+    # 2. MAP-REDUCE
+    # ------------------------------------------------------------------
+
+    def summarize(self, sections, filename):
+        """
+        Produces the final 3-bullet summary for a document.
+
+        Args:
+            sections (list[str]): The document split into sections.
+            filename (str): Display name, included in the prompt for grounding.
+
+        Returns:
+            tuple: (summary_text, stats) where stats aggregates tokens and LLM calls.
+            If any call still fails after its retries, stats carries 'error' and the
+            text is a failure message; callers must not store it. An empty document
+            sets stats['empty'] and is not worth storing either.
+        """
+        self._ensure_cache()
+        stats = {"sections": len(sections), "llm_calls": 0, "cached_calls": 0,
+                 "input_tokens": 0, "output_tokens": 0, "reduce_levels": 0}
+        if not sections:
+            stats["empty"] = True
+            return "Document is empty.", stats
+
+        # Short documents: a single direct pass is both faster and better.
+        if len(sections) == 1:
+            summary = self._cached_call(FINAL_PROMPT, f"Document: {filename}\nContent:\n{sections[0]}", stats)
+            self._save_cache()
+            return summary or f"Failed to generate summary: {stats.get('error')}", stats
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # MAP: condense every section concurrently (order is preserved by map()).
+            # The label deliberately omits the section index so an unchanged
+            # section keeps its cache key even if earlier pages were edited.
+            labeled = [f"Document: {filename}\n{s}" for s in sections]
+            notes = list(pool.map(lambda t: self._cached_call(MAP_PROMPT, t, stats), labeled))
+
+            # REDUCE: merge neighbouring notes level by level (a tree of depth log_fanout(n))
+            while "error" not in stats and len(notes) > self.reduce_fanout:
+                stats["reduce_levels"] += 1
+                groups = ["\n\n".join(notes[i:i + self.reduce_fanout]) for i in range(0, len(notes), self.reduce_fanout)]
+                notes = list(pool.map(lambda t: self._cached_call(REDUCE_PROMPT, t, stats), groups))
+
+        self._save_cache() # Sections that did succeed are kept for the next attempt
+        if "error" in stats:
+            return f"Failed to generate summary ({stats['failed_calls']} section calls failed): {stats['error']}", stats
+        summary = self._cached_call(FINAL_PROMPT, f"Document: {filename}\nSection notes:\n" + "\n\n".join(notes), stats)
+        self._save_cache()
+        return summary or f"Failed to generate summary: {stats.get('error')}", stats
+
+
+class BatchSummaryJob:
+    """
+    Summarizes every file in the manifest on a background thread.
+
+    Developer Note (Streamlit):
+    Background threads must not touch `st.session_state`. The job only writes
+    to its own attributes; the UI polls `progress()` and reads `results` on
+    each rerun.
+    """
+
+    def __init__(self, kb, llm, filenames, section_resolver=None, summary_store=None):
+        """
+        Args:
+            kb: The KnowledgeBase holding the documents.
+            llm: The OllamaService used for summarization.
+            filenames (list[str]): Files to summarize, in order.
+            section_resolver (callable): Optional override mapping filename -> sections.
+            summary_store: Optional DocumentSummaryStore; stored briefs are reused
+                and new ones are written back.
+        """
+        self.kb = kb
+        self.llm = llm
+        self.filenames = list(filenames)
+        self.section_resolver = section_resolver or kb.get_document_sections
+        self.summary_store = summary_store
+        self.reused = 0
+        self.results = {}
+        self.errors = {}
+        self.current = None
+        self.cancel_requested = False
+        self.finished = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def progress(self):
+        """Returns (completed, total) for progress bars."""
+        return len(self.results) + len(self.errors), len(self.filenames)
+
+    def _run(self):
+        for fname in self.filenames:
+            if self.cancel_requested: break
+            self.current = fname
+            try:
+                doc_hash = self.kb.get_document_hash(fname) if self.summary_store else None
+                summary = self.summary_store.get_summary(doc_hash, self.llm.model_name) if doc_hash else None
+                if summary:
+                    self.reused += 1
+                else:
+                    summary, stats = self.llm.summarize_document(self.section_resolver(fname), fname)
+                    if "error" in stats:
+                        self.errors[fname] = stats["error"]
+                        continue
+                    if doc_hash and not stats.get("empty"): self.summary_store.put_summary(doc_hash, self.llm.model_name, fname, summary)
+                self.results[fname] = summary
+            except Exception as e:
+                self.errors[fname] = str(e)
+        self.current = None
+        self.finished = True
@@ -0,0 +1,142 @@
+"""
+Summary Store — Persistent Document Briefs & Metadata
+=====================================================
+
+Architecture Rationale:
+-----------------------
+Generating a summary costs minutes of GPU/CPU time on long reports, yet
+summaries used to live only in the chat history and were regenerated every
+time someone clicked "Summarize".
+
+This store persists, per document:
+1. **Metadata**: chunk count, page count, character count, type and path —
+   refreshed on every index build.
+2. **Summaries**: one per chat model (different models write different briefs).
+
+Keying Strategy:
+Records are keyed by the **content hash** of the document text, not by its
+filename. Renaming or moving a file keeps its summary; editing it produces a
+new hash, so a stale summary can never be served for changed content.
+
+Layout of `data/summaries.json`:
+    {doc_hash: {"filename": ..., "metadata": {...},
+                "summaries": {model_name: {"summary": ..., "created": ...}}}}
+
+Concurrency Note:
+Every Streamlit session holds its own store over the same file, and the
+batch summary thread writes while the UI reads. `save()` therefore never
+writes its in-memory copy over the file: under a lock file
+(`utils/file_lock.py`) it re-reads the file, applies only the summaries and
+metadata this object changed since its last save, and replaces the file
+atomically. Reads pick up records saved by other sessions when the file
+changes.
+"""
+
+import os
+import threading
+import time
+
+from utils.file_lock import file_lock, read_json, write_json_atomic
+
+
+class DocumentSummaryStore:
+    """JSON-backed store of document summaries keyed by (content hash, chat model)."""
+
+    def __init__(self, path="data/summaries.json"):
+        self.path = path
+        self._records = {}
+        self._lock = threading.RLock() # Batch summaries write from a background thread
+        self._pending = {"summaries": set(), "metadata": set()} # Changed since the last save
+        self._mtime = None # File mtime the in-memory records reflect
+        self._load()
+
+    def _read_disk(self):
+        self._mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        return read_json(self.path, {}) or {}
+
+    def _merge(self, disk):
+        """Applies this object's unsaved summaries and metadata on top of the on-disk records."""
+        for doc_hash, model_name in self._pending["summaries"]:
+            mine = self._records[doc_hash]
+            record = disk.setdefault(doc_hash, {"filename": mine["filename"], "metadata": {}, "summaries": {}})
+            record["filename"] = mine["filename"]
+            record["summaries"][model_name] = mine["summaries"][model_name]
+        for doc_hash in self._pending["metadata"]:
+            mine = self._records[doc_hash]
+            record = disk.setdefault(doc_hash, {"filename": mine["filename"], "metadata": {}, "summaries": {}})
+            record["filename"] = mine["filename"]
+            record["metadata"] = mine["metadata"]
+        return disk
+
+    def _load(self):
+        try:
+            with self._lock:
+                self._records = self._merge(self._read_disk())
+        except Exception as e:
+            print(f"Summary store load error: {e}")
+            self._records = {}
+
+    def _refresh(self):
+        """Reloads when another session has saved since this store last read the file."""
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if mtime != self._mtime: self._load()
+
+    def save(self):
+        """Merges this object's changes into the file on disk."""
+        try:
+            with self._lock, file_lock(self.path):
+                self._records = self._merge(self._read_disk())
+                write_json_atomic(self.path, self._records)
+                self._mtime = os.path.getmtime(self.path)
+                self._pending = {"summaries": set(), "metadata": set()}
+            return True
+        except Exception as e:
+            print(f"Summary store save error: {e}")
+            return False
+
+    # ------------------------------------------------------------------
+    # 1. SUMMARIES
+    # ------------------------------------------------------------------
+
+    def get_summary(self, doc_hash, model_name):
+        """Returns the stored summary for this exact content and model, or None."""
+        self._refresh()
+        with self._lock:
+            entry = self._records.get(doc_hash, {}).get("summaries", {}).get(model_name)
+        return entry["summary"] if entry else None
+
+    def put_summary(self, doc_hash, model_name, filename, summary):
+        """Records a freshly generated summary and persists the store."""
+        with self._lock:
+            record = self._records.setdefault(doc_hash, {"filename": filename, "metadata": {}, "summaries": {}})
+            record["filename"] = filename
+            record["summaries"][model_name] = {"summary": summary, "created": time.time()}
+            self._pending["summaries"].add((doc_hash, model_name))
+        self.save()
+
+    # ------------------------------------------------------------------
+    # 2. METADATA
+    # ------------------------------------------------------------------
+
+    def get_metadata(self, doc_hash):
+        self._refresh()
+        with self._lock:
+            return dict(self._records.get(doc_hash, {}).get("metadata", {}))
+
+    def update_metadata(self, records):
+        """
+        Upserts metadata for a batch of documents (called after each index build).
+
+        Args:
+            records (dict): {doc_hash: {"filename": ..., **metadata}}
+        """
+        with self._lock:
+            for doc_hash, meta in records.items():
+                record = self._records.setdefault(doc_hash, {"filename": meta.get("filename"), "metadata": {}, "summaries": {}})
+                record["filename"] = meta.get("filename", record.get("filename"))
+                record["metadata"] = {k: v for k, v in meta.items() if k != "filename"}
+                self._pending["metadata"].add(doc_hash)
+        self.save()
+
+    def __len__(self):
+        return len(self._records)
@@ -0,0 +1,188 @@
+"""
+Threshold Calibration — Relevance Cutoffs Measured From the Index
+=================================================================
+
+Architecture Rationale:
+-----------------------
+A cosine cutoff only means something relative to the embedding model that
+produced the vectors. Some models spread unrelated text around 0.0, others
+(nomic, mxbai) place *every* pair of chunks at 0.4 or more, so a fixed 0.30
+returns the whole index for one model and almost nothing for another.
+Guessing from the dimension count is a weak proxy for this.
+
+Instead, each index build samples its own similarity distribution:
+
+1. **Random pairs**: Cosine of a probe against randomly drawn other chunks.
+   This is the "unrelated text" noise level of this model on this corpus.
+2. **Nearest neighbours**: For each probe chunk, the cosine of the most
+   similar *other* chunk. This is what "related text" scores.
+
+The cutoff is the noise score that about one unrelated chunk per query
+exceeds: a normal tail fitted to the random pairs at probability 1/n (so a
+larger index gets a stricter cutoff), and never below their 99th
+percentile. It is capped at the 10th percentile of the related level, so
+90% of related text still clears it.
+
+Queries are a few words, and a few words score far below passage-to-passage
+pairs (a dense index probed with its own chunks came out at 0.78 for mxbai,
+where real questions score ~0.5). Both engines are therefore probed with
+pseudo-queries, and "related" is each query's own source chunk:
+- **TF-IDF**: a few terms of a chunk (`keyword_queries`).
+- **Dense**: a short excerpt of a chunk (`text_queries`), embedded by the
+  index's own model at build time, so the probe has a query's length.
+The profile (model, percentiles, threshold) is stored with the index and
+used whenever `threshold_mode` is 'auto'.
+
+However high the cutoff ends up, searches still return their best
+`min_results` hits with a positive score (`keep_min_results`), so a strict
+cutoff never turns into an empty RAG context.
+
+Performance Note:
+The random pairs cost one row-wise dot product per pair. Dense probes cost
+one batched embedding call of `QUERY_PROBES` short texts. The neighbour scan
+is `probes` x n x d (256 probes against 100k x 768 vectors is ~20 GFLOP,
+about a second), paid once per full build rather than per query.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+from core.quantization import normalize_rows
+
+RANDOM_PAIRS = 4096 # Random (probe, chunk) pairs sampled for the noise level
+NEIGHBOUR_PROBES = 256 # Chunks whose nearest neighbour is measured
+BLOCK_ROWS = 16384 # Rows scored per block in the neighbour scan
+QUERY_PROBES = 64 # Chunk excerpts embedded as pseudo-queries for dense calibration
+
+
+def fallback_threshold(dims):
+    """Dimension-based cutoff for indexes without a calibration profile."""
+    if dims <= 384: return 0.25 # Light (minilm)
+    if dims <= 768: return 0.30 # Standard (nomic)
+    return 0.35 # Dense (mxbai/gemma)
+
+
+def keyword_queries(matrix, terms=3, probes=NEIGHBOUR_PROBES, seed=0):
+    """
+    Pseudo-queries for TF-IDF calibration: `terms` random terms of each probe chunk.
+
+    Chunk-to-chunk TF-IDF similarities overstate what a few-word query scores.
+
+    Returns:
+        tuple: (probe rows, (probes, vocabulary) query vectors); rows without terms are skipped.
+    """
+    n = len(matrix) if matrix is not None else 0
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(n, min(probes, n), replace=False)) if n else np.empty(0, dtype=np.int64)
+    queries, kept = [], []
+    for row in rows:
+        vec = np.asarray(matrix[row], dtype=np.float32)
+        present = np.flatnonzero(vec)
+        if not len(present): continue
+        q = np.zeros_like(vec)
+        picked = rng.choice(present, min(terms, len(present)), replace=False)
+        q[picked] = vec[picked] # TF-IDF weights of the chosen terms
+        queries.append(q)
+        kept.append(row)
+    return np.array(kept, dtype=np.int64), np.array(queries, dtype=np.float32)
+
+
+def text_queries(texts, words=(4, 9), probes=QUERY_PROBES, seed=0):
+    """
+    Pseudo-queries for dense calibration: a short run of words from each probe chunk.
+
+    Args:
+        texts (list[str]): Chunk texts, row-aligned with the index.
+        words (tuple): Excerpt length range (in words) drawn per probe.
+
+    Returns:
+        tuple: (probe rows, excerpts); chunks with fewer words than the minimum are skipped.
+    """
+    n = len(texts)
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(n, min(probes, n), replace=False)) if n else np.empty(0, dtype=np.int64)
+    kept, excerpts = [], []
+    for row in rows:
+        tokens = str(texts[row]).split()
+        if len(tokens) < words[0]: continue
+        length = int(rng.integers(words[0], words[1] + 1))
+        start = int(rng.integers(0, max(1, len(tokens) - length + 1)))
+        excerpts.append(" ".join(tokens[start:start + length]))
+        kept.append(row)
+    return np.array(kept, dtype=np.int64), excerpts
+
+
+def keep_min_results(results, min_results, top_n=None):
+    """
+    Applies the cutoff with a floor: every result above it, topped up to `min_results`
+    with the best ones below it (flagged `below_threshold`, positive scores only).
+
+    Args:
+        results (list[dict]): Best-first results; those under the cutoff carry `below_threshold`.
+    """
+    above = [r for r in results if not r.get("below_threshold")]
+    room = max(0, int(min_results) - len(above))
+    below = [r for r in results if r.get("below_threshold") and r["score"] > 0][:room]
+    kept = sorted(above + below, key=lambda r: r["score"], reverse=True)
+    return kept[:top_n] if top_n else kept
+
+
+def calibrate(matrix, floor=0.0, queries=None, sources=None, pairs=RANDOM_PAIRS, probes=NEIGHBOUR_PROBES, seed=0):
+    """
+    Samples the similarity distribution of `matrix` and derives a relevance cutoff.
+
+    Args:
+        matrix: (n, d) stored vectors (dense embeddings or TF-IDF rows).
+        floor (float): Lowest cutoff returned (e.g. to ignore near-zero TF-IDF overlaps).
+        queries: Optional (m, d) pseudo-queries with their `sources` rows (see
+            `keyword_queries`). By default sampled chunks stand in for queries.
+        pairs (int): Random (query, chunk) pairs sampled for the noise level.
+        probes (int): Chunks sampled as queries when `queries` is None.
+        seed (int): Sampling seed (the same index always calibrates the same way).
+
+    Returns:
+        dict | None: {'threshold', 'noise_cutoff', 'random': {p50, p90, p99},
+        'neighbour': {p10, p25, p50}, 'samples'}, or None when the index is too small to sample.
+    """
+    n = len(matrix) if matrix is not None else 0
+    if n < 3: return None
+    rng = np.random.default_rng(seed)
+    pseudo = queries is not None
+    if not pseudo:
+        sources = np.sort(rng.choice(n, min(probes, n), replace=False))
+        queries = matrix[sources]
+    if not len(sources): return None
+    sources = np.asarray(sources)
+    unit_queries = normalize_rows(np.asarray(queries, dtype=np.float32))
+
+    # 1. Noise level: queries against random other chunks
+    pick = rng.integers(0, len(sources), pairs)
+    others = (sources[pick] + rng.integers(1, n, pairs)) % n
+    random_sims = np.einsum("ij,ij->i", unit_queries[pick], normalize_rows(np.asarray(matrix[others], dtype=np.float32)))
+
+    # 2. Related level: the most similar other chunk (chunk probes) or the source chunk (pseudo-queries)
+    if pseudo:
+        best = np.einsum("ij,ij->i", unit_queries, normalize_rows(np.asarray(matrix[sources], dtype=np.float32)))
+    else:
+        best = np.full(len(sources), -np.inf, dtype=np.float32)
+        for start in range(0, n, BLOCK_ROWS):
+            block = normalize_rows(np.asarray(matrix[start:start + BLOCK_ROWS], dtype=np.float32))
+            sims = unit_queries @ block.T
+            own = (sources >= start) & (sources < start + len(block))
+            sims[np.flatnonzero(own), sources[own] - start] = -np.inf # A chunk is not its own neighbour
+            np.maximum(best, sims.max(axis=1), out=best)
+
+    rand_p = np.percentile(random_sims, [50, 90, 99])
+    near_p = np.percentile(best, [10, 25, 50])
+    # Expect about one unrelated chunk above the cutoff per query, whatever the index size
+    tail = float(np.mean(random_sims) + NormalDist().inv_cdf(1.0 - 1.0 / n) * np.std(random_sims))
+    noise = max(float(rand_p[2]), tail)
+    threshold = max(float(floor), min(noise, float(near_p[0])))
+    return {
+        "threshold": round(threshold, 4),
+        "noise_cutoff": round(noise, 4),
+        "random": {"p50": round(float(rand_p[0]), 4), "p90": round(float(rand_p[1]), 4), "p99": round(float(rand_p[2]), 4)},
+        "neighbour": {"p10": round(float(near_p[0]), 4), "p25": round(float(near_p[1]), 4), "p50": round(float(near_p[2]), 4)},
+        "samples": {"pairs": int(pairs), "probes": int(len(sources)), "rows": int(n)},
+    }
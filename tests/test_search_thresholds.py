@@ -0,0 +1,77 @@
+"""Regression checks for the relevance floor and the quantized two-pass search."""
+
+import hashlib
+
+import numpy as np
+import pytest
+
+import core.knowledge_base as knowledge_base
+from core.document_store import DocumentStore
+from core.knowledge_base import KnowledgeBase
+
+
+class _IdentityLemmatizer:
+    def lemmatize(self, word, pos=None):
+        return word
+
+
+class _HashEmbedder:
+    """Deterministic stand-in for the Ollama embedding service."""
+    embedding_model = "hash-embed"
+    model_name = "hash-chat"
+
+    def __init__(self, dim=32):
+        self.dim = dim
+
+    def embed_text(self, text):
+        seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(self.dim).tolist()
+
+    def embed_batch(self, texts):
+        return [self.embed_text(t) for t in texts]
+
+
+@pytest.fixture(autouse=True)
+def _isolated(monkeypatch, tmp_path):
+    monkeypatch.setattr(knowledge_base, "WordNetLemmatizer", _IdentityLemmatizer)
+    monkeypatch.chdir(tmp_path) # Embedding caches are written under ./data
+
+
+def _kb(tmp_path, engine_mode):
+    return KnowledgeBase(chunk_size=200, overlap_size=40, engine_mode=engine_mode,
+                         doc_store=DocumentStore(str(tmp_path / "documents.sqlite")))
+
+
+@pytest.mark.parametrize("mmr_lambda", [1.0, 0.5])
+def test_keyword_search_keeps_min_results_below_cutoff(tmp_path, mmr_lambda):
+    kb = _kb(tmp_path, "Machine Learning")
+    texts = {"apples.md": "Apples grow on trees in orchards across the valley. ",
+             "pears.md": "Pears ripen slowly in the orchard beside the river. ",
+             "zebras.md": "Zebras roam the savanna in large herds. "}
+    for name, text in texts.items():
+        kb.process_text(name, text * 8, 1, f"/v/{name}") # Several chunks each (UMAP needs > 4 rows)
+    kb.build_index()
+    kb.threshold_mode, kb.keyword_threshold, kb.min_results = "manual", 0.99, 2
+
+    results = kb.search("apples orchards trees", top_n=5, mmr_lambda=mmr_lambda)
+
+    assert len(results) == 2
+    assert results[0]["file"] == "apples.md"
+    assert all(r["below_threshold"] for r in results)
+
+
+def test_quantized_rank_returns_top_k(tmp_path):
+    llm = _HashEmbedder()
+    kb = _kb(tmp_path, "Deep Learning")
+    for i in range(30):
+        kb.process_text(f"doc{i}.md", " ".join(f"topic{i % 5} word{j} x{i}" for j in range(60)), 1, f"/v/doc{i}.md")
+    kb.build_index(llm)
+    query = np.array(llm.embed_text("topic3 word1 x3"), dtype=np.float32)
+
+    kb.vector_quantization = "none"
+    exact_rows, _ = kb._rank_neural(query, 5)
+    kb.vector_quantization, kb._quantized = "int8", None
+    rows, scores = kb._rank_neural(query, 5)
+
+    assert len(rows) == len(scores) == 5
+    assert set(rows.tolist()) == set(exact_rows.tolist())
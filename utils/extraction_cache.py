@@ -0,0 +1,275 @@
+"""
+Extraction Cache — Reusing Parsed Page Text
+===========================================
+
+Architecture Rationale:
+-----------------------
+Parsing is the most expensive step of ingestion for binary formats: a
+500-page PDF can take minutes to extract, yet the resulting text is identical
+every time the file is re-indexed.
+
+This cache stores the extraction result of a file under its **content hash**
+(SHA-1 of the bytes), so the parse only ever happens once per version of a
+file. Entries are gzip-compressed JSON files under `data/.extract_cache/`.
+
+Lookup Tiers:
+1. **Stat Fast Path**: For files on disk, `index.json` remembers the
+   (size, mtime) each path had when it was last hashed. If both still match,
+   the stored hash is trusted and the file is never opened — an unchanged
+   file costs a single `os.stat()` call plus one small decompress.
+2. **Hash Path**: Uploads, and files whose size/mtime changed, are hashed.
+   A touched-but-identical file still hits the cache at this tier.
+3. **Miss**: The caller parses the file and stores the result.
+
+Eviction:
+Blobs are evicted least-recently-used first once their total on-disk size
+exceeds `max_mb`.
+
+Concurrency Note:
+Every Streamlit session (and the watch-mode indexer) holds its own cache
+object over the same directory. `flush()` therefore never overwrites
+`index.json` with its in-memory copy: under a lock file
+(`utils/file_lock.py`) it re-reads the on-disk index, applies only the
+records this object changed since its last flush, enforces the budget over
+the merged set, and writes that back atomically. Blobs
+written by other sessions stay tracked and count against `max_mb`.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import time
+
+from utils.file_lock import file_lock, write_json_atomic
+
+
+def hash_file(file_obj, block_size=1024 * 1024):
+    """
+    Streams a path or file-like object through SHA-1 in 1 MB blocks.
+    File-like objects are hashed from the start and rewound afterwards so they
+    can still be parsed.
+    """
+    h = hashlib.sha1()
+    if hasattr(file_obj, 'read'):
+        if hasattr(file_obj, 'seek'): file_obj.seek(0)
+        for block in iter(lambda: file_obj.read(block_size), b""):
+            h.update(block)
+        if hasattr(file_obj, 'seek'): file_obj.seek(0)
+    else:
+        with open(file_obj, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """Content-addressed, size-bounded store of extracted file content."""
+
+    def __init__(self, root="data/.extract_cache", max_mb=512):
+        """
+        Args:
+            root (str): Directory holding the blobs and `index.json`.
+            max_mb (float): Disk budget for compressed blobs before LRU eviction.
+        """
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._index_path = os.path.join(root, "index.json")
+        # files: abs path -> {size, mtime_ns, hash}; blobs: key -> {hash, bytes, used}
+        self._index = {"files": {}, "blobs": {}}
+        self._dirty = False
+        self._pending = {"files": set(), "blobs": set(), "removed": set()} # Changes not yet flushed
+        self.reset_stats()
+        self._load_index()
+
+    # ------------------------------------------------------------------
+    # 1. INDEX PERSISTENCE
+    # ------------------------------------------------------------------
+
+    def _read_index(self):
+        """The index as currently on disk (records of vanished blobs dropped)."""
+        if not os.path.exists(self._index_path): return {"files": {}, "blobs": {}}
+        with open(self._index_path, "r") as f:
+            loaded = json.load(f)
+        index = {"files": loaded.get("files", {}), "blobs": loaded.get("blobs", {})}
+        # Drop records whose blob was deleted behind our back
+        for key in [k for k in index["blobs"] if not os.path.exists(self._blob_path(k))]:
+            del index["blobs"][key]
+        return index
+
+    def _load_index(self):
+        try:
+            self._index = self._read_index()
+        except Exception as e:
+            print(f"Extraction cache index load error: {e}")
+            self._index = {"files": {}, "blobs": {}}
+
+    def _merge(self, disk):
+        """Applies this object's unflushed changes on top of the on-disk index."""
+        pending = self._pending
+        for key in pending["removed"]:
+            disk["blobs"].pop(key, None)
+        for key in pending["blobs"] - pending["removed"]:
+            mine, theirs = self._index["blobs"].get(key), disk["blobs"].get(key)
+            if mine is None: continue
+            disk["blobs"][key] = dict(mine, used=max(mine["used"], theirs["used"] if theirs else 0))
+        for path in pending["files"]:
+            if path in self._index["files"]: disk["files"][path] = self._index["files"][path]
+        return disk
+
+    def flush(self):
+        """Merges this object's changes into `index.json` (under the lock) and reloads the merged view."""
+        if not self._dirty: return
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with file_lock(self._index_path):
+                self._index = self._merge(self._read_index())
+                self._evict() # The budget covers every session's blobs
+                write_json_atomic(self._index_path, self._index)
+            self._pending = {"files": set(), "blobs": set(), "removed": set()}
+            self._dirty = False
+        except Exception as e:
+            print(f"Extraction cache index write error: {e}")
+
+    def reset_stats(self):
+        """Zeroes the per-run counters (called at the start of each ingestion)."""
+        self.stats = {"stat_hits": 0, "hash_hits": 0, "misses": 0, "writes": 0, "evicted": 0}
+
+    def set_budget(self, max_mb):
+        """Changes the disk budget and evicts immediately if it shrank."""
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._evict()
+
+    def disk_bytes(self):
+        return sum(b["bytes"] for b in self._index["blobs"].values())
+
+    def __len__(self):
+        return len(self._index["blobs"])
+
+    def clear(self):
+        """Deletes every blob and the index."""
+        self._load_index() # Include blobs other sessions have flushed
+        for key in list(self._index["blobs"]):
+            self._remove_blob(key)
+        self._index = {"files": {}, "blobs": {}}
+        if os.path.exists(self._index_path): os.remove(self._index_path)
+        self._pending = {"files": set(), "blobs": set(), "removed": set()}
+        self._dirty = False
+
+    # ------------------------------------------------------------------
+    # 2. FINGERPRINTING (stat fast path -> content hash)
+    # ------------------------------------------------------------------
+
+    def fingerprint(self, file_obj):
+        """
+        Returns (content_hash, via_stat) for a path or file-like object.
+
+        `via_stat` is True when the hash came from the stat index without
+        reading the file.
+        """
+        if hasattr(file_obj, 'read'):
+            return hash_file(file_obj), False
+
+        path = os.path.abspath(file_obj)
+        st = os.stat(path)
+        record = self._index["files"].get(path)
+        if record and record["size"] == st.st_size and record["mtime_ns"] == st.st_mtime_ns:
+            return record["hash"], True
+
+        content_hash = hash_file(path)
+        self._index["files"][path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": content_hash}
+        self._pending["files"].add(path)
+        self._dirty = True
+        return content_hash, False
+
+    # ------------------------------------------------------------------
+    # 3. BLOB STORAGE
+    # ------------------------------------------------------------------
+
+    def _blob_path(self, key):
+        return os.path.join(self.root, f"{key}.json.gz")
+
+    def get(self, key):
+        """Returns the cached payload (dict) for a key, or None."""
+        if key not in self._index["blobs"]:
+            path = self._blob_path(key)
+            if not os.path.exists(path): return None
+            # Written by another session since our last flush: adopt it
+            self._index["blobs"][key] = {"hash": key.split("_", 1)[0], "bytes": os.path.getsize(path), "used": 0}
+        try:
+            with gzip.open(self._blob_path(key), "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except Exception:
+            self._remove_blob(key)
+            return None
+        self._index["blobs"][key]["used"] = time.time()
+        self._pending["blobs"].add(key)
+        self._dirty = True
+        return payload
+
+    def put(self, key, content_hash, payload):
+        """Stores a payload under a key, then enforces the disk budget."""
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = self._blob_path(key) + ".tmp"
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump(payload, f)
+            os.replace(tmp, self._blob_path(key))
+            self._index["blobs"][key] = {"hash": content_hash, "bytes": os.path.getsize(self._blob_path(key)),
+                                         "used": time.time()}
+            self._pending["blobs"].add(key)
+            self._pending["removed"].discard(key)
+            self.stats["writes"] += 1
+            self._dirty = True
+            self._evict()
+        except Exception as e:
+            print(f"Extraction cache write error: {e}")
+
+    def _remove_blob(self, key):
+        self._index["blobs"].pop(key, None)
+        self._pending["removed"].add(key)
+        try:
+            os.remove(self._blob_path(key))
+        except OSError:
+            pass
+        self._dirty = True
+
+    def _evict(self):
+        """Removes least-recently-used blobs until the disk budget is met."""
+        blobs = self._index["blobs"]
+        total = self.disk_bytes()
+        for key in sorted(blobs, key=lambda k: blobs[k]["used"]):
+            if total <= self.max_bytes: break
+            total -= blobs[key]["bytes"]
+            self._remove_blob(key)
+            self.stats["evicted"] += 1
+        # Stat records are only useful while a blob for their hash survives
+        live = {b["hash"] for b in blobs.values()}
+        files = self._index["files"]
+        for path in [p for p, r in files.items() if r["hash"] not in live]:
+            del files[path]
+
+    # ------------------------------------------------------------------
+    # 4. HIGH-LEVEL LOOKUP
+    # ------------------------------------------------------------------
+
+    def lookup(self, file_obj, variant):
+        """
+        Resolves a file to its cache key and cached payload.
+
+        Args:
+            file_obj: Path string or file-like object.
+            variant (str): Extraction settings that change the output
+                (e.g. the PDF backend), so each variant gets its own entry.
+
+        Returns:
+            tuple: (key, content_hash, payload_or_None)
+        """
+        content_hash, via_stat = self.fingerprint(file_obj)
+        key = f"{content_hash}_{variant}"
+        payload = self.get(key)
+        if payload is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["stat_hits" if via_stat else "hash_hits"] += 1
+        return key, content_hash, payload
@@ -0,0 +1,78 @@
+"""
+File Lock — Safe Read-Merge-Write of Shared JSON Files
+======================================================
+
+Architecture Rationale:
+-----------------------
+Several JSON files under `data/` (the extraction cache index, the answer
+cache, the summary store) are shared by every Streamlit session and by
+background threads, while each writer only holds its own in-memory copy.
+Writing that copy over the file drops whatever the other writers added, and
+a plain `open(path, "w")` leaves truncated JSON behind if the process dies
+mid-write.
+
+1. **`file_lock`**: A cross-process lock taken by creating `<path>.lock`
+   with `O_EXCL` (atomic on every OS and on network shares, no extra
+   dependency). A lock left behind by a crashed writer is broken after
+   `stale` seconds.
+2. **`write_json_atomic`**: Writes to a temporary file and `os.replace`s it
+   over the target, so readers see either the old or the new file.
+
+Writers hold the lock while they re-read the file, merge their own changes
+into it and write it back.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(path, timeout=10.0, stale=60.0):
+    """
+    Holds the lock guarding `path` for the duration of the block.
+
+    Raises:
+        TimeoutError: Another writer held the lock for longer than `timeout`.
+    """
+    lock_path = path + ".lock"
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale:
+                    os.remove(lock_path) # Left behind by a crashed writer
+                    continue
+            except OSError:
+                continue # Released between the two calls
+            if time.time() > deadline: raise TimeoutError(f"{lock_path} is held by another writer")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def write_json_atomic(path, payload, **dump_kwargs):
+    """Writes `payload` as JSON via a temporary file and an atomic rename."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp" # Unique per writer thread
+    with open(tmp, "w") as f:
+        json.dump(payload, f, **dump_kwargs)
+    os.replace(tmp, path)
+
+
+def read_json(path, default=None):
+    """The parsed file, or `default` when it does not exist."""
+    if not os.path.exists(path): return default
+    with open(path, "r") as f:
+        return json.load(f)
@@ -13,108 +13,276 @@ to route different data formats (PDF, CSV, Office Docs) to their respective
 specialized libraries.
 
 Key Techniques:
-1. **Encoding Resilience**: Implements fallbacks (UTF-8 -> Latin1 -> CP1252) 
-   to handle common Windows/Excel encoding issues.
+1. **Encoding Resilience**: Detects the encoding (UTF-8 -> CP1252 -> Latin1)
+   from a sampled prefix of the file, so a fallback never re-reads the whole file.
 2. **Page-Awareness**: Preserves page numbers during PDF/PPTX extraction 
-   to allow for accurate citations in the RAG chat.
+   to allow for accurate citations in the RAG chat. PDF parsing itself lives
+   in `pdf_extractor.py` (pluggable backends, parallel page ranges).
+3. **Streaming Datasets**: CSV and Excel files are read in row batches, so
+   multi-GB exports are ingested with bounded memory.
+4. **Extraction Cache**: Parsed output is cached by content hash (see
+   `extraction_cache.py`); unchanged files skip parsing on re-index.
+5. **Upload Spooling**: Large in-memory uploads are copied to a temporary
+   file in 1 MB blocks, so parsers open a path instead of duplicating the
+   whole upload in memory (e.g. PyMuPDF's `stream=` open, process pools).
 """
 
+import codecs
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
 import pandas as pd
-from PyPDF2 import PdfReader
 from docx import Document
 from pptx import Presentation
+from openpyxl import load_workbook
+from utils.pdf_extractor import extract_pdf_pages, resolve_backend
+
+ENCODINGS = ['utf-8', 'cp1252', 'latin1']
+ENCODING_SAMPLE_BYTES = 64 * 1024
+READ_BLOCK_BYTES = 1024 * 1024
+SPOOL_THRESHOLD_BYTES = 32 * 1024 * 1024
+
+
+def _read_prefix(file_obj, size):
+    """Reads the first `size` bytes of a path or file-like object without consuming it."""
+    if hasattr(file_obj, 'read'):
+        pos = file_obj.tell() if hasattr(file_obj, 'tell') else 0
+        sample = file_obj.read(size)
+        if hasattr(file_obj, 'seek'): file_obj.seek(pos)
+        return sample
+    with open(file_obj, 'rb') as f:
+        return f.read(size)
+
+
+def detect_encoding(file_obj, sample_size=ENCODING_SAMPLE_BYTES):
+    """
+    Picks the first encoding in ENCODINGS that decodes a sampled prefix.
+
+    Developer Note:
+    The sample may end in the middle of a multi-byte UTF-8 character, so we
+    decode it with an incremental decoder (final=False), which tolerates a
+    truncated tail. Latin1 maps every byte and therefore never fails; it is
+    the last resort.
+    """
+    sample = _read_prefix(file_obj, sample_size)
+    if isinstance(sample, str): return None # Already text (e.g. StringIO)
+    if sample.startswith(codecs.BOM_UTF8): return 'utf-8-sig'
+    for enc in ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return 'latin1'
+
+
+def read_text(file_obj, block_size=READ_BLOCK_BYTES):
+    """
+    Decodes a text file in a single streaming pass.
+
+    The encoding is picked once from a sampled prefix (see `detect_encoding`);
+    blocks are then fed through an incremental decoder, so multi-byte
+    characters split across block boundaries decode correctly and the file is
+    never decoded more than once. Undecodable bytes become U+FFFD.
+    """
+    encoding = detect_encoding(file_obj)
+    if encoding is None: return file_obj.read() # Already text (e.g. StringIO)
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    parts = []
+    if hasattr(file_obj, 'read'):
+        if hasattr(file_obj, 'seek'): file_obj.seek(0)
+        for block in iter(lambda: file_obj.read(block_size), b""):
+            parts.append(decoder.decode(block))
+    else:
+        with open(file_obj, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                parts.append(decoder.decode(block))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+
+@contextmanager
+def spooled_upload(file_obj, threshold=SPOOL_THRESHOLD_BYTES):
+    """
+    Yields a temporary file path for large in-memory uploads, otherwise the
+    object unchanged. The temporary file is removed on exit.
+    """
+    size = getattr(file_obj, 'size', None) # Streamlit UploadedFile exposes its byte size
+    if not hasattr(file_obj, 'read') or size is None or size < threshold:
+        yield file_obj
+        return
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(getattr(file_obj, 'name', ''))[1])
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            if hasattr(file_obj, 'seek'): file_obj.seek(0)
+            shutil.copyfileobj(file_obj, tmp, READ_BLOCK_BYTES)
+        if hasattr(file_obj, 'seek'): file_obj.seek(0)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def iter_csv_batches(file_obj, batch_rows=5000):
+    """
+    Streams a CSV as DataFrame batches using a sampled encoding.
+    Bytes beyond the sample that don't fit the detected encoding are replaced
+    rather than triggering a full re-read.
+    """
+    encoding = detect_encoding(file_obj)
+    return pd.read_csv(file_obj, chunksize=batch_rows, encoding=encoding, encoding_errors='replace')
+
+
+def iter_excel_batches(file_obj, batch_rows=5000):
+    """
+    Streams the first worksheet of an .xlsx workbook as DataFrame batches.
+
+    openpyxl's read-only mode parses the sheet XML lazily, row by row, instead
+    of building the whole workbook object model in memory.
+    """
+    wb = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None: return
+        columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        batch = []
+        for row in rows:
+            batch.append(row[:len(columns)])
+            if len(batch) >= batch_rows:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        wb.close()
+
+
+TEXT_FORMATS = (".pdf", ".md", ".txt", ".docx", ".pptx")
+DATASET_FORMATS = (".csv", ".xlsx", ".xls")
+CACHE_SCHEMA = 1 # Bump when extraction or block serialization output changes
+
+
+def extract_pages(file_obj, fname, kb):
+    """
+    Converts a document into page-labelled raw text without touching the index.
 
-def process_single_file(file_obj, kb, filename=None, full_path=None):
+    Returns:
+        list[tuple]: [(page_number, text), ...]
+    """
+    # 1. PDF Handler: Extracts page text via the fastest installed backend.
+    if fname.endswith(".pdf"):
+        pages, report = extract_pdf_pages(file_obj,
+                                          backend=getattr(kb, 'pdf_backend', "auto"),
+                                          workers=getattr(kb, 'pdf_workers', 0))
+        if hasattr(kb, 'extraction_profile'): kb.extraction_profile[fname] = report
+        return pages
+
+    # 2. Text/Markdown Handler: Reads full content as a single semantic unit (initially).
+    if fname.endswith((".md", ".txt")):
+        return [(1, read_text(file_obj))]
+        
+    # 3. Microsoft Word Handler (.docx)
+    if fname.endswith(".docx"):
+        doc = Document(file_obj)
+        return [(1, "\n".join([para.text for para in doc.paragraphs]))]
+
+    # 4. Microsoft PowerPoint Handler (.pptx)
+    if fname.endswith(".pptx"):
+        prs = Presentation(file_obj)
+        pages = []
+        for i, slide in enumerate(prs.slides):
+            slide_text = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+            if slide_text:
+                pages.append((i + 1, "\n".join(slide_text)))
+        return pages
+
+    return []
+
+
+def stream_dataset(file_obj, fname, kb):
+    """Streams a tabular file into the KnowledgeBase as overlapping row blocks."""
+    batch_rows = getattr(kb, 'dataset_chunk_rows', 5000)
+    # CSV: streamed in row batches with a sampled encoding.
+    if fname.endswith(".csv"):
+        kb.process_dataset_stream(fname, iter_csv_batches(file_obj, batch_rows))
+    # Excel: .xlsx is streamed via openpyxl; legacy .xls is loaded whole.
+    elif fname.endswith(".xlsx"):
+        kb.process_dataset_stream(fname, iter_excel_batches(file_obj, batch_rows))
+    elif fname.endswith(".xls"):
+        kb.process_dataset(fname, pd.read_excel(file_obj))
+
+
+def _cache_variant(fname, kb):
+    """The extraction settings that shape the cached output for this file type."""
+    if fname.endswith(".pdf"):
+        return f"v{CACHE_SCHEMA}_pdf_{resolve_backend(getattr(kb, 'pdf_backend', 'auto'))}"
+    if fname.endswith(DATASET_FORMATS):
+        return f"v{CACHE_SCHEMA}_rows_o{kb.dataset_overlap}"
+    return f"v{CACHE_SCHEMA}_text"
+
+
+def process_single_file(file_obj, kb, filename=None, full_path=None, cache=None):
     """
     Orchestrates the ingestion of different file types into the KnowledgeBase.
     
     The Lifecycle:
-    1. **Format Detection**: Routes by extension.
-    2. **Extraction**: Converts binary/unstructured data to raw text.
-    3. **Handover**: Sends text to `kb.process_text` for chunking and vectorization.
+    1. **Cache Check**: If an ExtractionCache is given, an unchanged file is
+       replayed from its cached extraction and never parsed.
+    2. **Format Detection**: Routes by extension.
+    3. **Extraction**: Converts binary/unstructured data to raw text.
+    4. **Handover**: Sends text to `kb.process_text` for chunking and vectorization.
 
     Args:
         file_obj: The file-like object (UploadedFile) or a path string.
         kb: The KnowledgeBase instance where the results will be stored.
         filename (str): The display name used for future citations.
         full_path (str): The absolute disk path (crucial for local-file indexing).
+        cache: Optional ExtractionCache consulted before parsing.
         
     Returns:
         str: The name of the processed file for UI reporting.
     """
 
     fname = filename if filename else getattr(file_obj, 'name', 'unknown_file')
-    
-    # 1. PDF Handler: Iterates through pages and extracts raw text string.
-    if fname.endswith(".pdf"):
-        reader = PdfReader(file_obj)
-        for i, page in enumerate(reader.pages):
-            p_text = page.extract_text() or ""
-            # Handover to KB: Text is cleaned and chunked within the KnowledgeBase class.
-            kb.process_text(fname, p_text, i + 1, full_path=full_path)
-            
-    # 2. Tabular Handler (CSV): Converts rows to semantic strings.
-    elif fname.endswith(".csv"):
-        try:
-            df = pd.read_csv(file_obj)
-        except UnicodeDecodeError:
-            # Fallback for common Windows/European encodings
-            if hasattr(file_obj, 'seek'): file_obj.seek(0)
-            try:
-                df = pd.read_csv(file_obj, encoding='latin1')
-            except UnicodeDecodeError:
-                if hasattr(file_obj, 'seek'): file_obj.seek(0)
-                df = pd.read_csv(file_obj, encoding='cp1252')
-        kb.process_dataset(fname, df)
-        
-    # 3. Tabular Handler (Excel): Supports both .xls and .xlsx formats.
-    elif fname.endswith((".xls", ".xlsx")):
-        df = pd.read_excel(file_obj)
-        kb.process_dataset(fname, df)
-        
-    # 4. Text/Markdown Handler: Reads full content as a single semantic unit (initially).
-    elif fname.endswith((".md", ".txt")):
-        encodings = ['utf-8', 'latin1', 'cp1252']
-        content = None
-        
-        if hasattr(file_obj, 'read'):
-            raw_data = file_obj.read()
-            for enc in encodings:
-                try:
-                    content = raw_data.decode(enc)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            if content is None: raise UnicodeDecodeError("Unable to decode file with utf-8, latin1, or cp1252")
-        else:
-            for enc in encodings:
-                try:
-                    with open(file_obj, 'r', encoding=enc) as f:
-                        content = f.read()
-                    break
-                except UnicodeDecodeError:
-                    continue
-            if content is None: raise UnicodeDecodeError("Unable to decode file with utf-8, latin1, or cp1252")
-            
-        kb.process_text(fname, content, 1, full_path=full_path)
-        
-    # 5. Microsoft Word Handler (.docx)
-    elif fname.endswith(".docx"):
-        doc = Document(file_obj)
-        content = "\n".join([para.text for para in doc.paragraphs])
-        kb.process_text(fname, content, 1, full_path=full_path)
+    is_dataset = fname.endswith(DATASET_FORMATS)
+    if not is_dataset and not fname.endswith(TEXT_FORMATS): return fname
 
-    # 6. Microsoft PowerPoint Handler (.pptx)
-    elif fname.endswith(".pptx"):
-        prs = Presentation(file_obj)
-        text_runs = []
-        for i, slide in enumerate(prs.slides):
-            slide_text = []
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    slide_text.append(shape.text)
-            if slide_text:
-                full_slide_text = "\n".join(slide_text)
-                kb.process_text(fname, full_slide_text, i + 1, full_path=full_path)
+    key = content_hash = None
+    if cache is not None:
+        key, content_hash, payload = cache.lookup(file_obj, _cache_variant(fname, kb))
+        if payload is not None:
+            if is_dataset:
+                kb.restore_dataset_blocks(fname, payload["blocks"], payload["sample"], payload["fingerprint"])
+            else:
+                for page_no, p_text in payload["pages"]:
+                    kb.process_text(fname, p_text, page_no, full_path=full_path)
+                if hasattr(kb, 'finalize_document'): kb.finalize_document(fname)
+                if fname.endswith(".pdf") and hasattr(kb, 'extraction_profile'):
+                    kb.extraction_profile[fname] = {"backend": "cache", "pages": len(payload["pages"]), "seconds": 0.0,
+                                                    "workers": 0, "cached": True, "slowest": []}
+            return fname
+
+    if is_dataset:
+        first_block = len(kb.documents_metadata)
+        with spooled_upload(file_obj) as source:
+            stream_dataset(source, fname, kb)
+        if key:
+            blocks = [[m["page"], m["text"]] for m in kb.documents_metadata[first_block:]]
+            cache.put(key, content_hash, {"blocks": blocks, "sample": kb.file_contents.get(fname, ""),
+                                          "fingerprint": kb.file_hashes.get(fname)})
+    else:
+        with spooled_upload(file_obj) as source:
+            pages = extract_pages(source, fname, kb)
+        for page_no, p_text in pages:
+            # Handover to KB: Text is cleaned and chunked within the KnowledgeBase class.
+            kb.process_text(fname, p_text, page_no, full_path=full_path)
+        if hasattr(kb, 'finalize_document'): kb.finalize_document(fname)
+        if key:
+            cache.put(key, content_hash, {"pages": [list(p) for p in pages]})
         
     return fname
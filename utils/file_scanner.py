@@ -0,0 +1,247 @@
+"""
+File Scanner — Parallel, Incremental Directory Discovery
+========================================================
+
+Architecture Rationale:
+-----------------------
+Before any parsing starts, the indexer has to find the files. The original
+`gather_files` used `os.walk`, then called `os.path.getsize` and opened every
+matching file to read one byte, all serially. On network-mounted vaults with
+100k files each of those calls is a round-trip, so discovery alone took minutes.
+
+This scanner removes the extra round-trips:
+1. **`os.scandir` Stat Reuse**: Directory entries carry their stat data
+   (free on Windows, one call on POSIX), so size, mtime and the hydration
+   check come from the same result — no extra `getsize()` or `open()`.
+2. **Parallel Subdirectories**: Each directory is listed by a thread pool
+   worker. Listing is I/O-bound (the GIL is released while waiting on the
+   filesystem), so latency-heavy mounts are scanned many directories at a time.
+3. **Streaming**: `iter_files()` is a generator. Files are yielded as soon
+   as their directory is listed, so extraction starts while the scan continues.
+4. **Include/Exclude Globs**: Matched against the path relative to the scan
+   root and the bare name. Excluded directories are pruned, never descended.
+5. **Manifest Snapshot**: `ScanManifest` persists (size, mtime) per path in
+   `data/scan_manifest.json`, so each scan can be diffed against the
+   previous one (added / modified / removed / unchanged).
+
+Hydration Note:
+Cloud-sync clients (OneDrive, iCloud) leave 'online-only' placeholders that
+block or fail when read. They are detected from stat data alone: Windows
+flags them with the OFFLINE / RECALL_ON_DATA_ACCESS attributes. On POSIX
+a placeholder reports a non-zero size with zero allocated blocks, but so do
+real files on ext4 inline data, sparse files and many FUSE/SMB/NFS mounts,
+so zero blocks is only a hint: those few entries get the old 1-byte read to
+confirm, and every other file still needs no `open()`.
+"""
+
+import fnmatch
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+SUPPORTED_EXTENSIONS = (".pdf", ".md", ".txt", ".csv", ".xlsx", ".docx", ".pptx")
+
+FILE_ATTRIBUTE_OFFLINE = 0x1000
+FILE_ATTRIBUTE_RECALL_ON_OPEN = 0x40000
+FILE_ATTRIBUTE_RECALL_ON_DATA_ACCESS = 0x400000
+_DEHYDRATED_ATTRS = FILE_ATTRIBUTE_OFFLINE | FILE_ATTRIBUTE_RECALL_ON_OPEN | FILE_ATTRIBUTE_RECALL_ON_DATA_ACCESS
+
+
+def parse_globs(text):
+    """Turns a comma/newline separated settings string into a list of glob patterns."""
+    if not text: return []
+    return [p.strip() for p in str(text).replace("\n", ",").split(",") if p.strip()]
+
+
+def is_dehydrated(st, path=None):
+    """
+    True if the file is a cloud placeholder (contents not on disk).
+
+    Args:
+        st: `os.stat_result` of the file.
+        path (str): When given, a POSIX zero-block file is confirmed with a
+            1-byte read; without it the stat hint alone decides.
+    """
+    attrs = getattr(st, 'st_file_attributes', 0)
+    if attrs:
+        return bool(attrs & _DEHYDRATED_ATTRS)
+    if getattr(st, 'st_blocks', None) != 0 or st.st_size == 0: return False
+    if path is None: return True
+    try:
+        with open(path, 'rb') as f: f.read(1)
+        return False # Inline / sparse / network file with real contents
+    except OSError:
+        return True
+
+
+class DirectoryScanner:
+    """Lists supported files under one or more roots, in parallel, as a stream."""
+
+    def __init__(self, include=None, exclude=None, extensions=SUPPORTED_EXTENSIONS,
+                 size_limit_mb=None, max_workers=8):
+        """
+        Args:
+            include (list[str]): Globs a file must match (empty = everything).
+            exclude (list[str]): Globs for files or directories to skip.
+            extensions (tuple): Lower-case extensions considered indexable.
+            size_limit_mb (float): Files above this size are skipped (None = no limit).
+            max_workers (int): Directories listed concurrently.
+        """
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.extensions = tuple(extensions)
+        self.size_limit_mb = size_limit_mb
+        self.max_workers = max(1, int(max_workers))
+        self.stats = {"folders": 0, "total_files": 0, "supported_files": 0}
+        self.skipped = []      # Files over the size limit
+        self.unreachable = []  # Cloud placeholders and unreadable entries
+        self.snapshot = {}     # abs path -> [size, mtime_ns] for the manifest
+        self.finished = False
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 1. FILTERS
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _matches(patterns, rel_path, name):
+        return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+    def accept_dir(self, rel_path, name):
+        return not self._matches(self.exclude, rel_path, name)
+
+    def accept_file(self, rel_path, name):
+        if not name.lower().endswith(self.extensions): return False
+        if self._matches(self.exclude, rel_path, name): return False
+        return not self.include or self._matches(self.include, rel_path, name)
+
+    # ------------------------------------------------------------------
+    # 2. DIRECTORY LISTING (runs on worker threads)
+    # ------------------------------------------------------------------
+
+    def _list_dir(self, root, path):
+        """Lists one directory. Returns (file_records, subdirectories)."""
+        files, subdirs, seen = [], [], 0
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    rel = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.accept_dir(rel, entry.name): subdirs.append(entry.path)
+                            continue
+                        if not entry.is_file(): continue
+                    except OSError:
+                        continue
+                    seen += 1
+                    if not self.accept_file(rel, entry.name): continue
+                    try:
+                        st = entry.stat()
+                    except OSError as e:
+                        with self._lock: self.unreachable.append(f"{entry.name} (Stat Error: {e})")
+                        continue
+                    if self.size_limit_mb is not None and st.st_size / (1024 * 1024) > self.size_limit_mb:
+                        with self._lock: self.skipped.append(f"{entry.name} (Large: {st.st_size / (1024 * 1024):.1f}MB)")
+                        continue
+                    if is_dehydrated(st, entry.path):
+                        with self._lock: self.unreachable.append(f"{entry.name} (Cloud-Only Placeholder)")
+                        continue
+                    files.append({'obj': entry.path, 'name': entry.name, 'full_path': entry.path,
+                                  'size': st.st_size, 'mtime_ns': st.st_mtime_ns})
+        except OSError as e:
+            with self._lock: self.unreachable.append(f"{path} (Directory Error: {e})")
+        with self._lock:
+            self.stats["folders"] += 1
+            self.stats["total_files"] += seen
+            self.stats["supported_files"] += len(files)
+        return files, subdirs
+
+    # ------------------------------------------------------------------
+    # 3. STREAMING SCAN
+    # ------------------------------------------------------------------
+
+    def iter_files(self, roots):
+        """
+        Yields file records ({'obj', 'name', 'full_path', 'size', 'mtime_ns'})
+        as soon as their directory has been listed.
+
+        Args:
+            roots (list[str]): Directories to scan. Missing ones are ignored;
+                overlapping roots are de-duplicated by absolute path.
+        """
+        self.finished = False
+        emitted = set()
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            root_of = {} # future -> scan root (globs match paths relative to it)
+            for root in roots:
+                root = root.strip().strip('"').strip("'")
+                if os.path.isdir(root):
+                    root_of[pool.submit(self._list_dir, root, root)] = root
+            pending = set(root_of)
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    root = root_of.pop(fut)
+                    files, subdirs = fut.result()
+                    for sub in subdirs:
+                        child = pool.submit(self._list_dir, root, sub)
+                        root_of[child] = root
+                        pending.add(child)
+                    for rec in files:
+                        key = os.path.abspath(rec['full_path'])
+                        if key in emitted: continue
+                        emitted.add(key)
+                        self.snapshot[key] = [rec['size'], rec['mtime_ns']]
+                        yield rec
+        finally:
+            # Also runs when the consumer stops early (e.g. 'Stop Indexing')
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.finished = True
+
+    def scan(self, roots):
+        """Runs a full scan and returns every file record as a list."""
+        return list(self.iter_files(roots))
+
+
+class ScanManifest:
+    """Persists the last scan snapshot so consecutive scans can be diffed."""
+
+    def __init__(self, path="data/scan_manifest.json"):
+        self.path = path
+        self.previous = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.previous = json.load(f).get("files", {})
+            except Exception as e:
+                print(f"Scan manifest load error: {e}")
+
+    def diff(self, current):
+        """
+        Compares a fresh snapshot with the previous one.
+
+        Returns:
+            dict: {'added', 'modified', 'removed', 'unchanged'} lists of paths.
+        """
+        added = [p for p in current if p not in self.previous]
+        removed = [p for p in self.previous if p not in current]
+        modified = [p for p in current if p in self.previous and list(self.previous[p]) != list(current[p])]
+        unchanged = len(current) - len(added) - len(modified)
+        return {"added": added, "modified": modified, "removed": removed, "unchanged": unchanged}
+
+    def save(self, current):
+        """Writes the snapshot atomically and makes it the new baseline."""
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"files": current}, f)
+            os.replace(tmp, self.path)
+            self.previous = dict(current)
+            return True
+        except Exception as e:
+            print(f"Scan manifest save error: {e}")
+            return False
@@ -210,6 +210,31 @@ def render_token_report(input_tokens, eval_tokens, total_tokens):
         </div>
     """, unsafe_allow_html=True)
 
+def render_query_profile(profile):
+    """Renders where a query's time went (retrieval stages, prompt, generation) in a collapsible panel."""
+    def fmt(key, unit="ms"):
+        value = profile.get(key)
+        return "—" if value is None else f"{value:,.1f} {unit}" if isinstance(value, float) else f"{value:,} {unit}"
+
+    with st.expander(f"⏱️ Query Profile • {fmt('total_ms')}", expanded=False):
+        st.markdown("**Retrieval**")
+        r1, r2, r3, r4 = st.columns(4)
+        r1.metric("Embed", fmt("embed_ms"))
+        r2.metric("Score", fmt("score_ms"))
+        r3.metric("Select", fmt("select_ms"), help="MMR, thresholding, merging" + (" (expansion: " + fmt("expand_ms") + ")" if profile.get("expand_ms") is not None else ""))
+        r4.metric("Retrieval Total", fmt("retrieval_ms"))
+        if profile.get("cached"):
+            st.caption("⚡ Served from the answer cache — no generation.")
+        elif profile.get("ttft_ms") is not None or profile.get("generation_ms") is not None:
+            st.markdown("**Generation**")
+            g1, g2, g3, g4 = st.columns(4)
+            g1.metric("Prompt", fmt("input_tokens", "tok"), help=f"{profile.get('prompt_chars', 0):,} chars; prompt eval {fmt('prompt_eval_ms')}")
+            g2.metric("First Token", fmt("ttft_ms"), help=f"Includes model load ({fmt('load_ms')}) and prompt evaluation.")
+            g3.metric("Speed", fmt("tokens_per_s", "tok/s"), help=f"{profile.get('output_tokens', 0)} tokens in {fmt('eval_ms')} of decoding.")
+            g4.metric("Generation", fmt("generation_ms"))
+        details = [f"{k}: {v}" for k, v in profile.items() if k in ("retriever", "rows_scored", "shards_searched", "snippets", "roundtrip_ms")]
+        if details: st.caption(" • ".join(details))
+
 def get_plotly_template():
     """Returns a customized 'Dark Nebula' theme for Plotly 3D charts."""
     import plotly.graph_objects as go
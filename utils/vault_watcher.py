@@ -0,0 +1,351 @@
+"""
+Vault Watcher — Continuous Change Detection for Indexed Folders
+===============================================================
+
+Architecture Rationale:
+-----------------------
+The vault and user-mounted folders used to be indexed only when someone
+pressed the build button, so the KnowledgeBase drifted out of date between
+builds. This module watches those folders and reports *which* files changed,
+so only those need to be re-ingested.
+
+Backends:
+1. **inotify (Linux)**: Called directly through `ctypes` (no extra
+   dependency). The kernel pushes events, so idle cost is zero and latency is
+   bounded only by the debounce window.
+2. **Polling (everywhere else)**: Re-scans the roots with the parallel
+   `DirectoryScanner` every `poll_interval` seconds and diffs (size, mtime)
+   snapshots. Also used when inotify is unavailable or its watch limit
+   (`fs.inotify.max_user_watches`) is exhausted.
+
+Debouncing:
+Editors and sync clients emit bursts of events for one logical save (write,
+rename, chmod...). Changes are collected until the folder has been quiet for
+`debounce_s`, but never held longer than `max_delay_s`, then delivered to the
+callback as one batch: `on_batch(changed_paths, removed_paths)`.
+
+Failure Handling:
+A batch that raises (e.g. Ollama is down while embedding) is put back in
+the queue and retried with exponential backoff (`debounce_s` doubling, at
+most `max_retry_s`). The scan manifest only records batches that were
+applied, so a restart re-detects anything still undelivered.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+from utils.file_scanner import DirectoryScanner, ScanManifest
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ATTRIB)
+_EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, name length
+
+
+class _InotifyBackend:
+    """Minimal recursive inotify wrapper. Raises OSError if unsupported."""
+
+    def __init__(self, roots, accept_dir):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"): raise OSError("inotify is not available on this platform")
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0: raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {} # watch descriptor -> directory path
+        self._accept_dir = accept_dir
+        self.overflowed = False
+        for root in roots:
+            self.add_tree(root)
+
+    def add_tree(self, top):
+        """Watches a directory and every accepted subdirectory below it."""
+        for dirpath, dirnames, _ in os.walk(top):
+            dirnames[:] = [d for d in dirnames if self._accept_dir(os.path.join(dirpath, d))]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                # ENOSPC: the per-user watch limit is exhausted -> caller falls back to polling
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {dirpath}")
+            self._dirs[wd] = dirpath
+
+    def read(self, timeout):
+        """
+        Waits up to `timeout` seconds for events.
+
+        Returns:
+            list[tuple]: [(path, mask), ...]
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready: return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events, offset = [], 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "replace")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            base = self._dirs.get(wd)
+            if base is None: continue
+            events.append((os.path.join(base, name) if name else base, mask))
+        return events
+
+    def close(self):
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+
+class VaultWatcher:
+    """Watches folders on a background thread and reports debounced change batches."""
+
+    def __init__(self, roots, on_batch, scanner_factory=None, debounce_s=2.0, max_delay_s=10.0,
+                 poll_interval=5.0, use_inotify=True, manifest=None, max_retry_s=300.0):
+        """
+        Args:
+            roots (list[str]): Directories to watch.
+            on_batch (callable): Called as `on_batch(changed_paths, removed_paths)`.
+            scanner_factory (callable): Returns a configured DirectoryScanner
+                (include/exclude globs, size limit).
+            debounce_s (float): Quiet period that closes a batch.
+            max_delay_s (float): Upper bound on how long a change can wait.
+            poll_interval (float): Seconds between scans in polling mode.
+            use_inotify (bool): Try inotify before falling back to polling.
+            manifest (ScanManifest): Baseline snapshot; changes made while
+                nobody was watching are detected against it on start-up.
+            max_retry_s (float): Longest wait before a failed batch is retried.
+        """
+        self.roots = [r for r in roots if os.path.isdir(r)]
+        self.on_batch = on_batch
+        self.scanner_factory = scanner_factory or DirectoryScanner
+        self.debounce_s = debounce_s
+        self.max_delay_s = max_delay_s
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.manifest = manifest or ScanManifest()
+        self.max_retry_s = max_retry_s
+        self._filter = self.scanner_factory() # Only used for its include/exclude rules
+        self.backend = None     # 'inotify' or 'polling' once started
+        self.paused = False     # Batches are held (not dropped) while paused
+        self._holds = {}        # owner -> time of a `hold()` (e.g. a session running a full build)
+        self.last_error = None
+        self.failures = 0       # Consecutive failed batches
+        self._retry_at = 0.0    # Monotonic time before which a failed batch is not retried
+        self._known = {}        # abs path -> [size, mtime_ns] as last seen (delivered state: manifest)
+        self._changed, self._removed = set(), set()
+        self._first_event = self._last_event = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def hold(self, owner, held=True, expire_s=3600.0):
+        """
+        Holds (or releases) batches on behalf of `owner`; any live hold pauses delivery.
+
+        Used when several sessions share one watcher. A hold that is never
+        released (its session ended mid-build) lapses after `expire_s`.
+        """
+        now = time.monotonic()
+        if held: self._holds[owner] = now
+        else: self._holds.pop(owner, None)
+        for key in [k for k, t in list(self._holds.items()) if now - t > expire_s]:
+            self._holds.pop(key, None)
+
+    def held(self):
+        return self.paused or bool(self._holds)
+
+    def pending(self):
+        """Number of paths waiting in the current (not yet delivered) batch."""
+        return len(self._changed) + len(self._removed)
+
+    # ------------------------------------------------------------------
+    # 1. SNAPSHOTS & FILTERS
+    # ------------------------------------------------------------------
+
+    def _scan(self):
+        scanner = self.scanner_factory()
+        scanner.scan(self.roots)
+        return scanner.snapshot
+
+    def _queue(self, changed=(), removed=()):
+        if not changed and not removed: return
+        now = time.monotonic()
+        self._changed.update(changed)
+        self._removed.update(removed)
+        self._removed.difference_update(changed)
+        self._changed.difference_update(removed)
+        self._first_event = self._first_event or now
+        self._last_event = now
+
+    def _queue_diff(self, current):
+        """Queues the differences between the known state and a fresh snapshot."""
+        changed = [p for p, sig in current.items() if list(self._known.get(p, [])) != list(sig)]
+        removed = [p for p in self._known if p not in current]
+        self._queue(changed, removed)
+        self._known = dict(current)
+
+    def _accepts_file(self, path):
+        """Applies the scanner's extension/glob filters to a single event path."""
+        scanner = self._filter
+        for root in self.roots:
+            if os.path.abspath(path).startswith(os.path.abspath(root) + os.sep):
+                rel = os.path.relpath(path, root).replace(os.sep, "/")
+                parts = rel.split("/")
+                # Any excluded parent directory excludes the file as well
+                for i in range(1, len(parts)):
+                    if not scanner.accept_dir("/".join(parts[:i]), parts[i - 1]): return False
+                return scanner.accept_file(rel, os.path.basename(path))
+        return False
+
+    def _accepts_dir(self, path):
+        for root in self.roots:
+            if os.path.abspath(path).startswith(os.path.abspath(root) + os.sep):
+                rel = os.path.relpath(path, root).replace(os.sep, "/")
+                return self._filter.accept_dir(rel, os.path.basename(path))
+        return True
+
+    # ------------------------------------------------------------------
+    # 2. EVENT TRANSLATION (inotify)
+    # ------------------------------------------------------------------
+
+    def _handle_events(self, inotify, events):
+        changed, removed = set(), set()
+        for path, mask in events:
+            path = os.path.abspath(path)
+            if mask & IN_ISDIR or (mask & (IN_DELETE_SELF | IN_MOVE_SELF)):
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # New or moved-in folder: watch it and pick up whatever is already inside
+                    if self._accepts_dir(path):
+                        inotify.add_tree(path)
+                        scanner = self.scanner_factory()
+                        for rec in scanner.iter_files([path]):
+                            changed.add(os.path.abspath(rec['full_path']))
+                elif mask & (IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF | IN_MOVE_SELF):
+                    prefix = path + os.sep
+                    removed.update(p for p in self._known if p.startswith(prefix))
+                continue
+            if not self._accepts_file(path): continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                if path in self._known: removed.add(path)
+            elif os.path.isfile(path):
+                changed.add(path)
+        self._queue(changed, removed)
+
+    # ------------------------------------------------------------------
+    # 3. MAIN LOOP
+    # ------------------------------------------------------------------
+
+    def _flush_due(self):
+        if not self.pending() or self.held(): return False
+        now = time.monotonic()
+        if now < self._retry_at: return False
+        return now - self._last_event >= self.debounce_s or now - self._first_event >= self.max_delay_s
+
+    def _flush(self):
+        changed = sorted(p for p in self._changed if os.path.isfile(p))
+        removed = sorted(self._removed)
+        self._changed, self._removed = set(), set()
+        self._first_event = self._last_event = None
+        # The (size, mtime) signature of everything delivered, taken before the batch reads it
+        signatures = {}
+        for p in changed:
+            try:
+                st = os.stat(p)
+                signatures[p] = [st.st_size, st.st_mtime_ns]
+            except OSError:
+                pass
+        try:
+            self.on_batch(changed, removed)
+        except Exception as e:
+            # Requeue: neither the known state nor the manifest has seen these changes yet
+            self.failures += 1
+            self._retry_at = time.monotonic() + min(self.max_retry_s, self.debounce_s * 2 ** self.failures)
+            self._queue(changed, removed)
+            self.last_error = str(e)
+            print(f"Watch batch failed (retry {self.failures}): {e}")
+            return
+        self.failures, self._retry_at, self.last_error = 0, 0.0, None
+        delivered = dict(self.manifest.previous)
+        for p in changed:
+            if p in signatures: self._known[p] = delivered[p] = signatures[p]
+            else:
+                self._known.pop(p, None)
+                delivered.pop(p, None)
+        for p in removed:
+            self._known.pop(p, None)
+            delivered.pop(p, None)
+        self.manifest.save(delivered)
+
+    def _run(self):
+        # Catch up on anything that changed since the last build/scan
+        self._known = dict(self.manifest.previous)
+        self._queue_diff(self._scan())
+
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = _InotifyBackend(self.roots, self._accepts_dir)
+                self.backend = "inotify"
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable, polling instead: {e}")
+        if inotify is None: self.backend = "polling"
+
+        next_poll = time.monotonic() + self.poll_interval
+        try:
+            while not self._stop.is_set():
+                if inotify is not None:
+                    try:
+                        self._handle_events(inotify, inotify.read(timeout=0.5))
+                    except OSError as e:
+                        # e.g. watch limit reached while adding a new folder
+                        print(f"inotify failed, switching to polling: {e}")
+                        inotify.close()
+                        inotify, self.backend = None, "polling"
+                    if inotify is not None and inotify.overflowed:
+                        # Kernel queue overflowed: events were lost, so resync by scanning
+                        inotify.overflowed = False
+                        self._queue_diff(self._scan())
+                else:
+                    self._stop.wait(0.5)
+                    if time.monotonic() >= next_poll:
+                        self._queue_diff(self._scan())
+                        next_poll = time.monotonic() + self.poll_interval
+
+                if self._flush_due(): self._flush()
+        finally:
+            if inotify is not None: inotify.close()